@@ -9,8 +9,9 @@ https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
-
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Reporting.settings')
 
+# Django's ASGI handler, sending the files served from a thread pool (see reports/utils/asgi.py)
+from reports.utils.asgi import get_asgi_application  # noqa: E402
+
 application = get_asgi_application()
@@ -26,7 +26,8 @@ SECRET_KEY = 'django-insecure-8p275&ukq#==a_)$16fn8)-jsb4+7#yz%bge22onre8j1jo$z%
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# DEBUG=0 in docker-compose.yml (with DEBUG on, Django also keeps every SQL query of a request in memory)
+DEBUG = os.environ.get('DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = [
     '*',
@@ -47,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'reports.utils.metrics.MetricsMiddleware',
+    'reports.utils.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +58,12 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+if not DEBUG:
+    # the static files are only served by runserver in DEBUG: under gunicorn (docker-compose.yml) by WhiteNoise,
+    # from STATIC_ROOT (collectstatic)
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1, 'whitenoise.middleware.WhiteNoiseMiddleware',
+    )
 
 ROOT_URLCONF = 'Reporting.urls'
 
@@ -91,6 +100,13 @@ DATABASES = {
     },
 }
 
+# a local SQLite DB instead of MySQL, e.g. to run the benchmarks without the MySQL container
+if os.environ.get('SQLITE_PATH'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['SQLITE_PATH'],
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -132,9 +148,102 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
-# STATIC_ROOT = BASE_DIR / "static"
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+# Root of the uploaded report files (under Nuance/, see reports/utils/backend.py). Empty: the working
+# directory, the root of the repository with runserver and gunicorn (see docker-compose.yml, where
+# the uploads volume is mounted at /code/Nuance)
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', '')
+
+# Line-offset indexes of large text result files (see reports/utils/file_index.py)
+FILE_INDEX_CACHE_DIR = os.environ.get('FILE_INDEX_CACHE_DIR', BASE_DIR / 'cache' / 'file_index')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Parameter*.used files of the test runs (see reports/utils/param_harvest.py)
+DP_TEST_RESULTS_ROOT = os.environ.get('DP_TEST_RESULTS_ROOT', '/media/datapack/DP_Test_Results/')
+PARAMETERS_INI_DIR = os.environ.get('PARAMETERS_INI_DIR', '/usr/local/Reporting/upload/parameters_ini/')
+PARAMETERS_INI_URL = '/reports/media/parameters_ini/'
+PARAMETER_INDEX_DIR = os.environ.get('PARAMETER_INDEX_DIR', BASE_DIR / 'cache' / 'parameter_index')
+# seconds after which looking for the parameter file of a run is abandoned
+PARAMETER_HARVEST_TIME_BUDGET = 30
+
+# Unreferenced uploaded files are deleted by a background thread after commit (see reports/utils/file_gc.py)
+FILE_GC_ASYNC = True
+
+# Incremental backups of the uploaded reports and the DB (python manage.py backup / restore)
+BACKUP_ROOT = os.environ.get(
+    'BACKUP_ROOT', '/shared-drive/entrd_qa/LanguageQA/qa-web-framework-db_and_reports-backups'
+)
+
+# Uploaded report files are stored in UPLOAD_SHARD_LEVELS levels of directories named after
+# UPLOAD_SHARD_WIDTH hex characters of a hash (0: flat layout).
+# Existing files are moved with python manage.py shard_uploads
+UPLOAD_SHARD_LEVELS = int(os.environ.get('UPLOAD_SHARD_LEVELS', 2))
+UPLOAD_SHARD_WIDTH = 2
+
+# Large result files are uploaded in chunks smaller than the nginx client_max_body_size (10M)
+# to a staging directory of the storage, and moved into place when the report is submitted
+# (see reports/utils/chunked_upload.py). Inside the directory of the uploaded files (the uploads
+# volume in docker-compose.yml), so that the move is a rename; hidden from reconcile_files and backup
+CHUNKED_UPLOAD_DIR = 'Nuance/.chunked_uploads'
+CHUNKED_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+# seconds after which an upload that did not receive any chunk is deleted
+CHUNKED_UPLOAD_EXPIRY = 24 * 3600
+
+# Shared by the processes of the server: the rendered tables of the list pages are cached there,
+# under keys that change when reports or datapacks are saved (see reports/utils/cache.py)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / 'cache' / 'django'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    }
+}
+TABLE_CACHE_TIMEOUT = 24 * 3600
+# the results of the comparisons of reports
+COMPARISON_CACHE_TIMEOUT = 24 * 3600
+# memory of the comparisons (see reports/utils/memory.py): growth of a process above which
+# a comparison is aborted (0: no limit), and tracing of the allocations (slower)
+COMPARISON_MEMORY_BUDGET = int(os.environ.get('COMPARISON_MEMORY_BUDGET_MB', 0)) * 1024 * 1024
+COMPARISON_MEMORY_PROFILING = os.environ.get('COMPARISON_MEMORY_PROFILING', '') == '1'
+
+# Admission control of the expensive requests (see reports/utils/admission.py): slots of each pool
+# shared by all the server processes (0: no limit), seconds a request waits for a slot before
+# getting a 503, and seconds a comparison may take
+ADMISSION_SLOTS = {
+    'comparison': int(os.environ.get('COMPARISON_SLOTS', 4)),
+    'export': int(os.environ.get('EXPORT_SLOTS', 4)),
+}
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 10))
+ADMISSION_DIR = os.environ.get('ADMISSION_DIR', BASE_DIR / 'cache' / 'admission')
+COMPARISON_TIME_BUDGET = float(os.environ.get('COMPARISON_TIME_BUDGET', 60))
+# the requests for the same comparison at once wait for the first one (see reports/utils/single_flight.py):
+# seconds they wait at most before comparing the files themselves
+SINGLE_FLIGHT_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_TIMEOUT', 90))
+SINGLE_FLIGHT_DIR = os.environ.get('SINGLE_FLIGHT_DIR', BASE_DIR / 'cache' / 'single_flight')
+SINGLE_FLIGHT_STRIPES = 256
+# threads of the pools running the file reads and the comparisons of the async views (see reports/utils/executors.py)
+EXECUTOR_THREADS = {
+    'file_io': int(os.environ.get('FILE_IO_THREADS', 32)),
+    'comparison': int(os.environ.get('COMPARISON_THREADS', 4)),
+}
+
+# Profiling of the requests (see reports/utils/profiling.py): fraction of the requests profiled
+# (0: off), and the time above which a profiled request is kept for the /reports/profiling/ page
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_SLOW_MS = float(os.environ.get('PROFILING_SLOW_MS', 500))
+PROFILING_RING_SIZE = 100
+
+# Prometheus metrics on /metrics (see reports/utils/metrics.py), written by each server process
+# to METRICS_DIR and added up there
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', BASE_DIR / 'cache' / 'metrics')
+# addresses or networks (e.g. of the Prometheus server) allowed to read /metrics, besides the staff users
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1').split(',') if ip.strip()]
@@ -17,11 +17,13 @@ from django.contrib import admin
 from django.urls import include, path
 
 from Reporting.view import home, login_view, logout_view
+from reports.views import metrics_view
 
 urlpatterns = [
     path('', home),
     path('admin/', admin.site.urls),
     path('reports/', include('reports.urls')),
     path('login/', login_view, name="login"),
-    path('logout/', logout_view, name="logout")
+    path('logout/', logout_view, name="logout"),
+    path('metrics', metrics_view, name="metrics"),
 ]
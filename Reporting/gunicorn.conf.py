@@ -0,0 +1,54 @@
+# Configuration of gunicorn, the production server (see "Production server" in the README).
+# From the root of the repository, like runserver: the working directory is the root of the
+# uploaded files (MEDIA_ROOT, see settings.py):
+#   gunicorn -c Reporting/gunicorn.conf.py Reporting.wsgi:application
+#
+# The values can be changed with environment variables (GUNICORN_*).
+
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+# the project is imported from this directory, without changing the working directory
+pythonpath = os.path.dirname(os.path.abspath(__file__))
+
+
+def cpu_count():
+    # the CPUs the container may use, rather than those of the host
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# processes: the parsers of the comparisons are CPU bound (pandas), the rest waits on MySQL and NFS,
+# served by the threads of each process
+workers = int(os.environ.get("GUNICORN_WORKERS", 0)) or cpu_count() + 1
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# e.g. uvicorn.workers.UvicornWorker, with Reporting.asgi:application
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+
+# the app is loaded once in the master, which warms it up (see when_ready), then forked: the workers
+# share its memory copy-on-write. A reload with HUP starts new workers from this app: to load new
+# code, restart the server (or USR2, see the README)
+preload_app = True
+
+# a worker is replaced after this many requests (+ up to the jitter, so that they are not all replaced
+# at once): the memory kept by the allocator after the large comparisons (pandas) is given back
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# a comparison may take COMPARISON_TIME_BUDGET (60s) after waiting ADMISSION_QUEUE_TIMEOUT (10s) for a slot
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+# seconds the requests in progress have to finish on a reload or a stop
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# the heartbeat files of the workers in memory rather than on the (possibly slow) disk of the container
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+accesslog = "-"
+
+
+def when_ready(server):
+    # in the master, once the app is loaded and before the workers are forked
+    from reports.utils.warmup import warm_up
+    warm_up(server.log.info)
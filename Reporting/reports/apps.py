@@ -7,4 +7,10 @@ class ReportsConfig(AppConfig):
 
     def ready(self):
         # Implicitly connect signal handlers decorated with @receiver.
-        from . import signals
\ No newline at end of file
+        from . import signals
+        # system checks (manage.py check, run by migrate)
+        from . import checks
+        from django.db.backends.signals import connection_created
+        from reports.utils import queries
+        # the SQL queries of each request are observed on every connection (see utils/queries.py)
+        connection_created.connect(queries.install, dispatch_uid="reports.utils.queries.install")
\ No newline at end of file
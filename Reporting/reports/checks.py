@@ -0,0 +1,26 @@
+import os
+
+from django.conf import settings
+from django.core.checks import Error, register
+
+from reports.utils.backend import UPLOAD_ROOT
+
+
+@register("reports")
+def check_upload_storage(app_configs, **kwargs):
+    """
+    In production, the uploaded files must be found where the uploads volume is mounted: with the
+    default MEDIA_ROOT, the storage depends on the working directory of the server
+    """
+    if settings.BUILD_TYPE != "PROD":
+        return []
+    from reports.models import Report
+    path = Report._meta.get_field("file_report").storage.path(UPLOAD_ROOT)
+    if os.path.isdir(path):
+        return []
+    return [Error(
+        f"The directory of the uploaded files {path} does not exist",
+        hint="Set MEDIA_ROOT to the directory where the uploads volume (Nuance/) is mounted, "
+             "or start the server from there",
+        id="reports.E001",
+    )]
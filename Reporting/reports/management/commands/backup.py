@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from reports.models import Report
+from reports.utils.backend import UPLOAD_ROOT
+from reports.utils.backup import create_snapshot, default_workers, prune_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Takes an incremental snapshot of the uploaded report files (only new content is copied) "
+        "and a compressed dump of the DB."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backup-root", default=settings.BACKUP_ROOT, help="Directory of the backups")
+        parser.add_argument("--keep", type=int, default=5, help="Number of snapshots to keep (0: keep all)")
+        parser.add_argument("--workers", type=int, default=default_workers(), help="Number of files compressed in parallel")
+        parser.add_argument("--compresslevel", type=int, default=6, choices=range(1, 10))
+        parser.add_argument("--no-db", action="store_true", help="Do not dump the DB")
+
+    def handle(self, *args, **options):
+        storage = Report._meta.get_field("file_report").storage
+        snapshot = create_snapshot(
+            options["backup_root"],
+            root=storage.path(UPLOAD_ROOT),
+            storage_root=storage.path(""),
+            workers=options["workers"],
+            compresslevel=options["compresslevel"],
+            with_db=not options["no_db"],
+            log=self.stdout.write,
+        )
+        prune_snapshots(options["backup_root"], options["keep"], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Backup {snapshot} completed"))
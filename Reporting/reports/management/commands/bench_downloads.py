@@ -0,0 +1,210 @@
+import asyncio
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import reverse
+
+from reports.models import Report
+from reports.utils.asgi import ReportsASGIHandler
+from reports.utils.benchmark import percentile, save_results
+from reports.utils.seed import seed_database
+
+# bytes a client receives in `--client-delay` milliseconds
+CLIENT_CHUNK = 64 * 1024
+# the probes start once the downloads have taken the server
+PROBE_START = 0.1
+
+
+def client_delay(size, delay):
+    return delay * size / CLIENT_CHUNK
+
+
+def wsgi_request(handler, path, delay):
+    """
+    Sends GET `path` to the WSGI `handler`, receives the body at the pace of a slow client,
+    and returns the status code and the size of the body
+    """
+    environ = {
+        "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "", "SERVER_NAME": "testserver",
+        "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1", "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(), "wsgi.errors": io.StringIO(),
+    }
+    status = []
+    body = handler(environ, lambda status_line, headers, exc_info=None: status.append(int(status_line.split()[0])))
+    size = 0
+    try:
+        for chunk in body:
+            size += len(chunk)
+            time.sleep(client_delay(len(chunk), delay))
+    finally:
+        body.close()
+    return status[0], size
+
+
+async def asgi_request(application, path, delay):
+    """
+    wsgi_request() with the ASGI `application`
+    """
+    received = {"status": None, "size": 0}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            received["status"] = message["status"]
+        else:
+            received["size"] += len(message.get("body", b""))
+            await asyncio.sleep(client_delay(len(message.get("body", b"")), delay))
+
+    await application({
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "query_string": b"", "headers": [(b"host", b"testserver")],
+        "server": ("testserver", 80), "client": ("127.0.0.1", 50000),
+    }, receive, send)
+    return received["status"], received["size"]
+
+
+def summary(mode, workers, download_times, probe_times, seconds, total_bytes):
+    return {
+        "mode": mode,
+        "workers": workers,
+        "downloads": len(download_times),
+        "seconds": round(seconds, 2),
+        "throughput_mbps": round(total_bytes / 1024 / 1024 / seconds, 2),
+        "download_p50_ms": round(percentile(download_times, 50) * 1000, 1),
+        "download_p95_ms": round(percentile(download_times, 95) * 1000, 1),
+        "probe_p50_ms": round(percentile(probe_times, 50) * 1000, 1),
+        "probe_p95_ms": round(percentile(probe_times, 95) * 1000, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves many concurrent downloads of a result file to slow clients, with WSGI workers (like "
+        "runserver or gunicorn sync workers) and with the ASGI application, while measuring the latency "
+        "of the reports page requested meanwhile, in a test DB. Saves the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--downloads", type=int, default=100, help="Concurrent downloads")
+        parser.add_argument("--file-size", type=int, default=1024, help="Size of the file downloaded, in KB")
+        parser.add_argument(
+            "--client-delay", type=float, default=20,
+            help=f"Milliseconds the clients take to receive {CLIENT_CHUNK // 1024}KB",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=4,
+            help="Requests served at once in WSGI mode (worker processes x threads of the WSGI server)",
+        )
+        parser.add_argument("--probes", type=int, default=10, help="Requests of the reports page during the downloads")
+        parser.add_argument("--output", default="bench_downloads.json", help="JSON file of the results")
+
+    def handle(self, *args, **options):
+        if options["downloads"] < 1 or options["workers"] < 1:
+            raise CommandError("--downloads and --workers must be at least 1")
+        media_root = tempfile.TemporaryDirectory()
+        cache_dir = tempfile.TemporaryDirectory()
+        with media_root, cache_dir, override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            MEDIA_ROOT=media_root.name,
+            CACHES={"default": {
+                "BACKEND": settings.CACHES["default"]["BACKEND"], "LOCATION": cache_dir.name,
+                "OPTIONS": settings.CACHES["default"].get("OPTIONS", {}),
+            }},
+            # the requests of the benchmark are not those of the site
+            METRICS_ENABLED=False, PROFILING_SAMPLE_RATE=0,
+        ):
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+            try:
+                seed_database(reports=200, datapacks=10)
+                report = Report.objects.order_by("id").first()
+                with open(os.path.join(media_root.name, "bench.bin"), "wb") as f:
+                    f.write(os.urandom(options["file_size"] * 1024))
+                Report.objects.filter(id=report.id).update(file_report="bench.bin")
+                download_path = reverse("download_file", args=[report.id])
+                probe_path = reverse("reports")
+
+                results = [
+                    self.bench_wsgi(download_path, probe_path, options),
+                    asyncio.run(self.bench_asgi(download_path, probe_path, options)),
+                ]
+            finally:
+                teardown_databases(old_config, verbosity=0)
+
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:<5} {result['workers']:>3} workers  {result['downloads']} downloads in "
+                f"{result['seconds']:>7.2f}s ({result['throughput_mbps']:.1f}MB/s)  "
+                f"download p50 {result['download_p50_ms']:>8.1f}ms p95 {result['download_p95_ms']:>8.1f}ms  "
+                f"reports page p50 {result['probe_p50_ms']:>8.1f}ms p95 {result['probe_p95_ms']:>8.1f}ms"
+            )
+        save_results(
+            options["output"], results, file_size_kb=options["file_size"], client_delay_ms=options["client_delay"],
+            db=connection.vendor,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+    def check_response(self, path, status, size, expected_size=None):
+        if status != 200 or (expected_size is not None and size != expected_size):
+            raise CommandError(f"GET {path}: {status}, {size} bytes")
+
+    def bench_wsgi(self, download_path, probe_path, options):
+        handler = WSGIHandler()
+        delay = options["client_delay"] / 1000
+        file_size = options["file_size"] * 1024
+
+        def timed_request(path, sent, expected_size=None):
+            # the time of a request includes its wait for a free worker, like with a real server
+            status, size = wsgi_request(handler, path, delay)
+            self.check_response(path, status, size, expected_size)
+            return time.perf_counter() - sent, size
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options["workers"]) as workers:
+            downloads = [
+                workers.submit(timed_request, download_path, time.perf_counter(), file_size)
+                for _ in range(options["downloads"])
+            ]
+            time.sleep(PROBE_START)
+            probes = [workers.submit(timed_request, probe_path, time.perf_counter()) for _ in range(options["probes"])]
+            download_results = [download.result() for download in downloads]
+            probe_results = [probe.result() for probe in probes]
+        seconds = time.perf_counter() - start
+        return summary(
+            "wsgi", options["workers"], [seconds for seconds, _ in download_results],
+            [seconds for seconds, _ in probe_results], seconds, sum(size for _, size in download_results),
+        )
+
+    async def bench_asgi(self, download_path, probe_path, options):
+        application = ReportsASGIHandler()
+        delay = options["client_delay"] / 1000
+        file_size = options["file_size"] * 1024
+
+        async def timed_request(path, expected_size=None):
+            start = time.perf_counter()
+            status, size = await asgi_request(application, path, delay)
+            self.check_response(path, status, size, expected_size)
+            return time.perf_counter() - start, size
+
+        start = time.perf_counter()
+        downloads = [
+            asyncio.create_task(timed_request(download_path, file_size)) for _ in range(options["downloads"])
+        ]
+        await asyncio.sleep(PROBE_START)
+        probe_results = await asyncio.gather(*(timed_request(probe_path) for _ in range(options["probes"])))
+        download_results = await asyncio.gather(*downloads)
+        seconds = time.perf_counter() - start
+        return summary(
+            "asgi", 1, [seconds for seconds, _ in download_results], [seconds for seconds, _ in probe_results],
+            seconds, sum(size for _, size in download_results),
+        )
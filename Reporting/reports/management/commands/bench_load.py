@@ -0,0 +1,105 @@
+import asyncio
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.utils.benchmark import compare_results, load_results, save_results
+from reports.utils.loadgen import DEFAULT_MIX, FLOWS, LoadError, run_load
+
+
+def parse_mix(value):
+    """
+    list=40,filter=25,... -> {"list": 40, "filter": 25, ...}
+    """
+    mix = {}
+    for item in value.split(","):
+        flow, _, weight = item.partition("=")
+        if flow.strip() not in FLOWS:
+            raise CommandError(f"Unknown flow {flow.strip()!r}: the flows are {', '.join(FLOWS)}")
+        try:
+            mix[flow.strip()] = float(weight)
+        except ValueError:
+            raise CommandError(f"Invalid weight of {flow.strip()}: {weight!r}")
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs concurrent virtual users replaying a mix of flows (list, filter, compare, view_file, submit) "
+        "against a running server, and reports the throughput, latency percentiles and error rate "
+        "of each one. The submit flow creates reports: run it against a local DB, not production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="URL of the running server")
+        parser.add_argument("--users", type=int, default=10, help="Number of concurrent virtual users")
+        parser.add_argument("--duration", type=float, default=60, help="Seconds measured")
+        parser.add_argument("--requests", type=int, help="Stop after this number of requests")
+        parser.add_argument("--warmup", type=float, default=5, help="Seconds of load before the measures")
+        parser.add_argument(
+            "--mix", default=",".join(f"{flow}={weight}" for flow, weight in DEFAULT_MIX.items()),
+            help="Weights of the flows (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--think-time", type=float, default=0.5, help="Mean pause of a user between two requests, in seconds",
+        )
+        parser.add_argument("--timeout", type=float, default=30, help="Timeout of a request, in seconds")
+        parser.add_argument("--username", help="User the virtual users log in as (for the submit flow)")
+        parser.add_argument("--password", default=os.environ.get("BENCH_PASSWORD"), help="Default: $BENCH_PASSWORD")
+        parser.add_argument(
+            "--sample", type=int, default=5000, help="Number of the latest reports to view and compare",
+        )
+        parser.add_argument("--file-size", type=int, default=100, help="Size of the files submitted, in KB")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the flows drawn")
+        parser.add_argument("--output", default="bench_load.json", help="JSON file of the results")
+        parser.add_argument("--baseline", help="JSON file of previous results to compare with")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            if not os.path.exists(options["baseline"]):
+                raise CommandError(f"No baseline {options['baseline']}")
+            baseline = load_results(options["baseline"])
+        if options["username"] and options["password"] is None:
+            raise CommandError("--password (or $BENCH_PASSWORD) is required with --username")
+
+        try:
+            results, seconds = asyncio.run(run_load(
+                options["url"],
+                users=options["users"],
+                duration=options["duration"],
+                requests=options["requests"],
+                mix=parse_mix(options["mix"]),
+                think_time=options["think_time"],
+                warmup=options["warmup"],
+                timeout=options["timeout"],
+                username=options["username"],
+                password=options["password"],
+                sample=options["sample"],
+                file_size=options["file_size"] * 1024,
+                seed=options["seed"],
+                log=self.stderr.write,
+            ))
+        except (LoadError, OSError) as err:
+            raise CommandError(f"{options['url']}: {err}")
+
+        self.stdout.write(f"{options['users']} users, {seconds:.1f}s measured")
+        for result in results:
+            self.stdout.write(
+                f"{result['endpoint']:<10} {result['requests']:>7} requests {result['throughput_rps']:>8.1f}/s  "
+                f"p50 {result['p50_ms']:>8.1f}ms  p95 {result['p95_ms']:>8.1f}ms  p99 {result['p99_ms']:>8.1f}ms  "
+                f"errors {result['error_rate']:>7.2%}"
+                + (f"  {result['errors_by_kind']}" if result["errors"] else "")
+            )
+        save_results(
+            options["output"], results, url=options["url"], users=options["users"], seconds=round(seconds, 2),
+            mix=options["mix"], think_time=options["think_time"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+        if baseline is not None:
+            self.stdout.write(f"Compared with {options['baseline']}:")
+            for metric in ("throughput_rps", "p95_ms", "error_rate"):
+                for (endpoint,), old, new, change in compare_results(baseline, results, ("endpoint",), metric):
+                    change = f"{change:+.1f}%" if change is not None else "n/a"
+                    self.stdout.write(f"{endpoint:<10} {metric:<15} {old:>10} -> {new:>10}  {change}")
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.utils.benchmark import compare_results, load_results, measure, save_results
+from reports.utils.compare import (
+    compare_accuracy, compare_load, compare_load_advanced, compare_NTE5, compare_travel_corpus, parse_load_test_txt,
+)
+from reports.utils.synthetic import GENERATORS
+
+
+def fake_report(path):
+    # what the comparisons read from a report
+    return SimpleNamespace(file_report=SimpleNamespace(path=path), accuracy="n/a")
+
+
+def parse_load_txt(path):
+    with open(path) as f:
+        return parse_load_test_txt(f)
+
+
+# {name: (format of the file, function reading it)}
+PARSERS = {
+    "compare_accuracy": ("accuracy", lambda path: compare_accuracy([fake_report(path)])),
+    "compare_travel_corpus": ("travel_corpus", lambda path: compare_travel_corpus([fake_report(path)])),
+    "compare_NTE5": ("NTE5", lambda path: compare_NTE5([fake_report(path)])),
+    "compare_load": ("load_xlsx", lambda path: compare_load([fake_report(path)])),
+    "parse_load_test_txt": ("load_txt", parse_load_txt),
+    "compare_load_advanced": ("load_txt", lambda path: compare_load_advanced([fake_report(path)])),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the throughput (MB/s, rows/s) and the peak memory of the parsers of the result files "
+        "on synthetic files of several sizes, and saves the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=float, nargs="+", default=[1, 10, 50], help="Sizes of the files, in MB (of text)",
+        )
+        parser.add_argument(
+            "--parsers", nargs="+", choices=list(PARSERS), default=list(PARSERS), help="Parsers to measure",
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per measure (the best one is kept)")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the generated files")
+        parser.add_argument("--output", default="bench_parsers.json", help="JSON file of the results")
+        parser.add_argument("--baseline", help="JSON file of previous results to compare with")
+        parser.add_argument("--keep-files", help="Directory to generate the files in, and keep them")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            if not os.path.exists(options["baseline"]):
+                raise CommandError(f"No baseline {options['baseline']}")
+            baseline = load_results(options["baseline"])
+
+        directory = options["keep_files"] or tempfile.mkdtemp()
+        os.makedirs(directory, exist_ok=True)
+        results = []
+        try:
+            for size in options["sizes"]:
+                # each file is generated once for all the parsers reading its format
+                files = {}
+                for name in options["parsers"]:
+                    file_format, parse = PARSERS[name]
+                    if file_format not in files:
+                        generate, filename = GENERATORS[file_format]
+                        path = os.path.join(directory, f"{size:g}MB-{filename}")
+                        rows = generate(path, int(size * 1024 * 1024), seed=options["seed"])
+                        files[file_format] = (path, rows)
+                    path, rows = files[file_format]
+
+                    seconds, peak = measure(lambda: parse(path), repeat=options["repeat"])
+                    megabytes = os.path.getsize(path) / 1024 / 1024
+                    result = {
+                        "parser": name,
+                        "size": size,
+                        "file_mb": round(megabytes, 3),
+                        "rows": rows,
+                        "seconds": round(seconds, 4),
+                        "mb_per_s": round(megabytes / seconds, 2),
+                        "rows_per_s": round(rows / seconds),
+                        "peak_memory_mb": round(peak / 1024 / 1024, 2),
+                    }
+                    results.append(result)
+                    self.stdout.write(
+                        f"{name:<22} {size:>6g}MB  {result['file_mb']:>8.2f}MB {rows:>9} rows  "
+                        f"{result['seconds']:>8.3f}s {result['mb_per_s']:>8.2f}MB/s {result['rows_per_s']:>10} rows/s  "
+                        f"peak {result['peak_memory_mb']:>8.2f}MB"
+                    )
+        finally:
+            if not options["keep_files"]:
+                shutil.rmtree(directory)
+
+        save_results(options["output"], results, seed=options["seed"], repeat=options["repeat"])
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+        if baseline is not None:
+            self.stdout.write(f"Compared with {options['baseline']}:")
+            for metric in ("seconds", "peak_memory_mb"):
+                for (name, size), old, new, change in compare_results(baseline, results, ("parser", "size"), metric):
+                    change = f"{change:+.1f}%" if change is not None else "n/a"
+                    self.stdout.write(f"{name:<22} {size:>6g}MB  {metric:<15} {old:>10} -> {new:>10}  {change}")
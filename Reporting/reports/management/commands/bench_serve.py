@@ -0,0 +1,166 @@
+import asyncio
+import importlib.util
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.management.commands.bench_load import parse_mix
+from reports.utils.benchmark import save_results
+from reports.utils.loadgen import LoadError, run_load
+
+# the servers compared: the command of docker-compose.yml before the production server, and the production server,
+# both from the root of the repository as in docker-compose.yml
+SERVERS = {
+    "runserver": [sys.executable, "Reporting/manage.py", "runserver", "127.0.0.1:{port}"],
+    "gunicorn": [
+        sys.executable, "-m", "gunicorn", "-c", "Reporting/gunicorn.conf.py", "--bind", "127.0.0.1:{port}",
+        "Reporting.wsgi:application",
+    ],
+}
+STARTUP_TIMEOUT = 60
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url, process):
+    """
+    Returns the seconds the server took to answer its first request
+    """
+    start = time.monotonic()
+    while time.monotonic() - start < STARTUP_TIMEOUT:
+        if process.poll() is not None:
+            raise CommandError(f"The server stopped with the code {process.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=5):
+                return time.monotonic() - start
+        except (OSError, urllib.error.URLError):
+            time.sleep(0.2)
+    raise CommandError(f"The server did not answer within {STARTUP_TIMEOUT}s")
+
+
+def process_tree(pid):
+    """
+    `pid` and the pids of its descendants (the workers, or the process started by the autoreloader)
+    """
+    children = {}
+    for name in os.listdir("/proc"):
+        if name.isdigit():
+            try:
+                with open(f"/proc/{name}/stat") as f:
+                    # the command may contain spaces: the fields after it
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(name))
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        pending.extend(children.get(current, []))
+    return pids
+
+
+def memory_mb(pid):
+    """
+    Memory of the processes of the server, in MB: the sum of their proportional set sizes (PSS), where
+    the pages shared by several processes (copy-on-write after a fork) are only counted once in total
+    """
+    total = 0
+    for process in process_tree(pid):
+        try:
+            with open(f"/proc/{process}/smaps_rollup") as f:
+                total += sum(int(line.split()[1]) for line in f if line.startswith("Pss:"))
+        except (OSError, ValueError):
+            continue
+    return round(total / 1024, 1) if total else None
+
+
+class Command(BaseCommand):
+    help = (
+        "Starts each server (runserver as docker-compose.yml used to, gunicorn with gunicorn.conf.py) on "
+        "the configured DB, runs the load of bench_load against it, and compares their throughput, "
+        "latency percentiles, error rates and memory. Saves the results as JSON. Linux only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--servers", nargs="+", choices=list(SERVERS), default=list(SERVERS))
+        parser.add_argument("--users", type=int, default=20, help="Number of concurrent virtual users")
+        parser.add_argument("--duration", type=float, default=60, help="Seconds measured per server")
+        parser.add_argument("--warmup", type=float, default=5, help="Seconds of load before the measures")
+        parser.add_argument(
+            "--mix", default="list=40,filter=25,compare=20,view_file=15",
+            help="Weights of the flows of bench_load (default: %(default)s)",
+        )
+        parser.add_argument("--think-time", type=float, default=0.5, help="Mean pause of a user between two requests")
+        parser.add_argument("--username", help="User the virtual users log in as")
+        parser.add_argument("--password", default=os.environ.get("BENCH_PASSWORD"), help="Default: $BENCH_PASSWORD")
+        parser.add_argument("--workers", type=int, help="Worker processes of gunicorn (default: see gunicorn.conf.py)")
+        parser.add_argument("--output", default="bench_serve.json", help="JSON file of the results")
+
+    def handle(self, *args, **options):
+        if "gunicorn" in options["servers"] and importlib.util.find_spec("gunicorn") is None:
+            raise CommandError("gunicorn is not installed (pip install -r requirements.txt)")
+        if options["username"] and options["password"] is None:
+            raise CommandError("--password (or $BENCH_PASSWORD) is required with --username")
+        mix = parse_mix(options["mix"])
+
+        results = []
+        for server in options["servers"]:
+            port = free_port()
+            url = f"http://127.0.0.1:{port}"
+            env = dict(os.environ)
+            if options["workers"]:
+                env["GUNICORN_WORKERS"] = str(options["workers"])
+            self.stdout.write(f"Starting {server} on {url}...")
+            process = subprocess.Popen(
+                [part.format(port=port) for part in SERVERS[server]], cwd=settings.BASE_DIR.parent, env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                # in a group of its own: stopped with its workers
+                start_new_session=True,
+            )
+            try:
+                startup = wait_until_ready(f"{url}/reports/", process)
+                flows, seconds = asyncio.run(run_load(
+                    url, users=options["users"], duration=options["duration"], mix=mix,
+                    think_time=options["think_time"], warmup=options["warmup"],
+                    username=options["username"], password=options["password"], log=self.stderr.write,
+                ))
+                memory = memory_mb(process.pid)
+            except (LoadError, OSError) as err:
+                raise CommandError(f"{server}: {err}")
+            finally:
+                os.killpg(process.pid, signal.SIGTERM)
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    os.killpg(process.pid, signal.SIGKILL)
+                    process.wait()
+
+            for flow in flows:
+                results.append({
+                    "server": server, "startup_s": round(startup, 2), "memory_mb": memory,
+                    "seconds": round(seconds, 2), **flow,
+                })
+                self.stdout.write(
+                    f"{server:<10} {flow['endpoint']:<10} {flow['requests']:>7} requests "
+                    f"{flow['throughput_rps']:>8.1f}/s  p50 {flow['p50_ms']:>8.1f}ms  p95 {flow['p95_ms']:>8.1f}ms  "
+                    f"p99 {flow['p99_ms']:>8.1f}ms  errors {flow['error_rate']:>7.2%}"
+                )
+            self.stdout.write(f"{server:<10} started in {startup:.1f}s, memory (PSS) {memory}MB")
+
+        save_results(
+            options["output"], results, users=options["users"], mix=options["mix"], think_time=options["think_time"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
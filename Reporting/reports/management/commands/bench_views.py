@@ -0,0 +1,139 @@
+import tempfile
+import time
+from statistics import median
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import reverse
+
+from reports.models import DataPack, Report
+from reports.utils.benchmark import QueryTimer, compare_results, load_results, percentile, save_results
+from reports.utils.seed import seed_database
+
+
+def view_requests():
+    """
+    (name, method, URL, data) of the requests measured, on the data in the DB
+    """
+    datapack = DataPack.objects.filter(report__isnull=False).order_by("-id").first()
+    report = Report.objects.filter(datapack=datapack).first()
+    return [
+        ("ReportsView", "get", reverse("reports"), None),
+        ("ReportsView filter", "post", reverse("reports"), {"topic": datapack.topic_id, "test_type": report.testing_type_id}),
+        ("DatapacksView", "get", reverse("dptracking"), None),
+        ("DatapacksView filter", "post", reverse("dptracking"), {"topic": datapack.topic_id}),
+        ("DatapackHistoryView", "get", reverse("datapack_history", args=[datapack.name]), None),
+    ]
+
+
+def measure_view(client, method, url, data, requests, cold):
+    """
+    Sends the request `requests` times, with an empty cache if `cold`, and returns the latencies,
+    the numbers of queries and the SQL times (seconds)
+    """
+    latencies, queries, sql_times = [], [], []
+    for _ in range(requests):
+        if cold:
+            default_cache.clear()
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise CommandError(f"{method.upper()} {url}: {response.status_code}")
+        queries.append(timer.count)
+        sql_times.append(timer.seconds)
+    return latencies, queries, sql_times
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the latency (p50/p95), the number of queries and the SQL time of the list views "
+        "(ReportsView, DatapacksView, DatapackHistoryView) on synthetic datasets of several sizes, "
+        "in a test DB, and saves the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+            help="Numbers of reports (the datapacks are 1 for 20 reports)",
+        )
+        parser.add_argument("--requests", type=int, default=20, help="Requests per view and cache state")
+        parser.add_argument(
+            "--current-db", action="store_true",
+            help="Measure the views on the configured DB as it is, instead of seeding a test DB",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the datasets")
+        parser.add_argument("--output", default="bench_views.json", help="JSON file of the results")
+        parser.add_argument("--baseline", help="JSON file of previous results to compare with")
+        parser.add_argument(
+            "--max-regression", type=float,
+            help="Fail if the p95 latency of a view is this many %% above the baseline",
+        )
+
+    def handle(self, *args, **options):
+        baseline = load_results(options["baseline"]) if options["baseline"] else None
+        results = []
+        cache_dir = tempfile.TemporaryDirectory()
+        # a cache of its own: the tables of the test DB must not be served by the site
+        with cache_dir, override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            CACHES={"default": {
+                "BACKEND": settings.CACHES["default"]["BACKEND"], "LOCATION": cache_dir.name,
+                "OPTIONS": settings.CACHES["default"].get("OPTIONS", {}),
+            }},
+        ):
+            if options["current_db"]:
+                self.bench(Report.objects.count(), options["requests"], results)
+            else:
+                old_config = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+                try:
+                    for size in sorted(options["sizes"]):
+                        self.stdout.write(f"Seeding {size} reports...")
+                        seed_database(reports=size, datapacks=max(10, size // 20), seed=options["seed"])
+                        self.bench(size, options["requests"], results)
+                finally:
+                    teardown_databases(old_config, verbosity=0)
+
+        save_results(options["output"], results, requests=options["requests"], db=connection.vendor)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+        if baseline is not None:
+            self.stdout.write(f"Compared with {options['baseline']}:")
+            regressions = []
+            changes = compare_results(baseline, results, ("view", "cache", "reports"), "p95_ms")
+            for (view, cache_state, size), old, new, change in changes:
+                self.stdout.write(
+                    f"{view:<22} {cache_state:<5} {size:>7}  p95 {old:>9.1f}ms -> {new:>9.1f}ms  "
+                    f"{f'{change:+.1f}%' if change is not None else 'n/a'}"
+                )
+                if options["max_regression"] is not None and change is not None and change > options["max_regression"]:
+                    regressions.append(f"{view} ({cache_state} cache, {size} reports)")
+            if regressions:
+                raise CommandError(f"p95 latency regressed by more than {options['max_regression']}%: {', '.join(regressions)}")
+
+    def bench(self, size, requests, results):
+        client = Client()
+        for name, method, url, data in view_requests():
+            for cache_state in ("cold", "warm"):
+                latencies, queries, sql_times = measure_view(client, method, url, data, requests, cache_state == "cold")
+                result = {
+                    "view": name,
+                    "cache": cache_state,
+                    "reports": size,
+                    "requests": requests,
+                    "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                    "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                    "queries": median(queries),
+                    "sql_ms": round(median(sql_times) * 1000, 2),
+                }
+                results.append(result)
+                self.stdout.write(
+                    f"{name:<22} {cache_state:<5} {size:>7} reports  p50 {result['p50_ms']:>9.1f}ms  "
+                    f"p95 {result['p95_ms']:>9.1f}ms  {result['queries']:>5g} queries  SQL {result['sql_ms']:>8.1f}ms"
+                )
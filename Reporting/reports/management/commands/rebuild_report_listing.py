@@ -0,0 +1,22 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from reports.utils import cache
+from reports.utils.listing import refresh_listings
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the listing of the reports read by the list pages (ReportListing) from the reports."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=min(32, (os.cpu_count() or 1) * 4),
+            help="Number of threads reading the sizes of the files",
+        )
+
+    def handle(self, *args, **options):
+        written = refresh_listings(workers=options["workers"])
+        # the cached tables of the list pages are read from the listing
+        cache.bump_version(cache.REPORTS)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the listing of {written} reports"))
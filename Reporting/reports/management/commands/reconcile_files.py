@@ -0,0 +1,128 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reports.models import Report, ReportListing
+from reports.utils import cache
+from reports.utils.backend import UPLOAD_ROOT
+
+
+def scan_tree(top, storage_root):
+    """
+    Returns {name relative to the storage root: mtime} of every file under `top`
+    """
+    files = {}
+    for root, dirnames, filenames in os.walk(top):
+        # the hidden directories are not report files, e.g. the chunked uploads being received
+        dirnames[:] = [dirname for dirname in dirnames if not dirname.startswith(".")]
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            try:
+                mtime = os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            files[os.path.relpath(path, storage_root).replace(os.sep, "/")] = mtime
+    return files
+
+
+def referenced_files():
+    """
+    Returns {file name: [ids of the reports referencing it]}
+    """
+    referenced = {}
+    for report_id, name in (
+        Report.objects.exclude(file_report="").exclude(file_report__isnull=True)
+        .values_list("id", "file_report").iterator(chunk_size=2000)
+    ):
+        referenced.setdefault(name, []).append(report_id)
+    return referenced
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the uploaded files in storage with the file_report of every Report, "
+        "and reports (or cleans up) orphan files and reports pointing at missing files."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--root", default=UPLOAD_ROOT, help="Directory of the storage to scan")
+        parser.add_argument(
+            "--workers", type=int, default=min(32, (os.cpu_count() or 1) * 4),
+            help="Number of directories scanned in parallel",
+        )
+        parser.add_argument("--delete-orphans", action="store_true", help="Delete files no report references")
+        parser.add_argument(
+            "--clear-dangling", action="store_true",
+            help="Clear the file of reports whose file does not exist anymore",
+        )
+        parser.add_argument(
+            "--min-age", type=int, default=3600,
+            help="Orphan files modified less than this many seconds ago are kept (uploads in progress)",
+        )
+
+    def handle(self, *args, **options):
+        storage = Report._meta.get_field("file_report").storage
+        storage_root = storage.path("")
+        scan_root = storage.path(options["root"])
+
+        # scan every top-level directory in parallel, the DB is read meanwhile
+        stored = {}
+        subdirectories = []
+        if os.path.isdir(scan_root):
+            with os.scandir(scan_root) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        if not entry.name.startswith("."):
+                            subdirectories.append(entry.path)
+                    elif entry.is_file():
+                        stored[os.path.relpath(entry.path, storage_root).replace(os.sep, "/")] = entry.stat().st_mtime
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            scans = [executor.submit(scan_tree, top, storage_root) for top in subdirectories]
+            referenced = referenced_files()
+            for scan in scans:
+                stored.update(scan.result())
+
+        orphans = sorted(name for name in stored if name not in referenced)
+        # files outside of the scanned directory are checked one by one
+        dangling = sorted(
+            name for name in referenced
+            if name not in stored and not os.path.isfile(storage.path(name))
+        )
+
+        self.stdout.write(f"{len(stored)} files in storage, {len(referenced)} files referenced by reports")
+        self.stdout.write(f"{len(orphans)} orphan files (not referenced by any report)")
+        for name in orphans:
+            self.stdout.write(f"  orphan: {name}")
+        self.stdout.write(f"{len(dangling)} dangling references (file does not exist)")
+        for name in dangling:
+            self.stdout.write(f"  dangling: {name} (reports {', '.join(str(i) for i in referenced[name])})")
+
+        if options["delete_orphans"]:
+            cutoff = time.time() - options["min_age"]
+            deleted = 0
+            with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+                to_delete = [name for name in orphans if stored[name] < cutoff]
+                # a report may have been saved with one of these files since the scan
+                still_referenced = set()
+                for start in range(0, len(to_delete), 1000):
+                    still_referenced.update(
+                        Report.objects.filter(file_report__in=to_delete[start:start + 1000])
+                        .values_list("file_report", flat=True)
+                    )
+                to_delete = [name for name in to_delete if name not in still_referenced]
+                for _ in executor.map(storage.delete, to_delete):
+                    deleted += 1
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} orphan files"))
+
+        if options["clear_dangling"]:
+            report_ids = [report_id for name in dangling for report_id in referenced[name]]
+            with transaction.atomic():
+                cleared = Report.objects.filter(id__in=report_ids, file_report__in=dangling).update(file_report="")
+                ReportListing.objects.filter(report_id__in=report_ids, file_name__in=dangling).update(file_name="", file_size=None)
+                # update() does not send the signals that invalidate the cached tables
+                transaction.on_commit(lambda: cache.bump_version(cache.REPORTS))
+            self.stdout.write(self.style.SUCCESS(f"Cleared the file of {cleared} reports"))
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.models import Report
+from reports.utils import cache
+from reports.utils.backup import default_workers, list_snapshots, restore_db, restore_snapshot
+
+
+class Command(BaseCommand):
+    help = "Restores the uploaded report files (and optionally the DB) of a backup snapshot, and verifies them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("snapshot", nargs="?", default="latest", help="Name of the snapshot, or \"latest\"")
+        parser.add_argument("--backup-root", default=settings.BACKUP_ROOT, help="Directory of the backups")
+        parser.add_argument(
+            "--target", default=None,
+            help="Directory to restore the files to (default: the storage of the uploaded files)",
+        )
+        parser.add_argument("--workers", type=int, default=default_workers(), help="Number of files restored in parallel")
+        parser.add_argument("--db", action="store_true", help="Also restore the DB dump into the configured DB")
+        parser.add_argument("--no-files", action="store_true", help="Do not restore the files")
+        parser.add_argument("--list", action="store_true", help="List the available snapshots")
+
+    def handle(self, *args, **options):
+        snapshots = list_snapshots(options["backup_root"])
+        if options["list"]:
+            for snapshot in snapshots:
+                self.stdout.write(snapshot)
+            return
+        if not snapshots:
+            raise CommandError(f"No snapshots in {options['backup_root']}")
+
+        snapshot = snapshots[-1] if options["snapshot"] == "latest" else options["snapshot"]
+        if snapshot not in snapshots:
+            raise CommandError(f"Unknown snapshot {snapshot}, available: {', '.join(snapshots)}")
+
+        if not options["no_files"]:
+            target = options["target"] or Report._meta.get_field("file_report").storage.path("")
+            failed = restore_snapshot(
+                options["backup_root"], snapshot, target, workers=options["workers"], log=self.stdout.write,
+            )
+            if failed:
+                for name in failed:
+                    self.stderr.write(f"  failed verification: {name}")
+                raise CommandError(f"{len(failed)} files could not be restored")
+
+        if options["db"]:
+            restore_db(options["backup_root"], snapshot)
+            # the cached tables were rendered from the DB before the restore
+            cache.bump_version(cache.REPORTS, cache.DATAPACKS)
+            self.stdout.write(f"Restored the DB of snapshot {snapshot}")
+
+        self.stdout.write(self.style.SUCCESS(f"Restore of {snapshot} completed"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from reports.utils.seed import seed_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the DB with a synthetic dataset (reports, datapacks, testing types, topics, ...) to benchmark "
+        "the views on. Only what is missing to reach the numbers given is created. Not for the production DB."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reports", type=int, default=100000)
+        parser.add_argument("--datapacks", type=int, default=5000)
+        parser.add_argument("--testing-types", type=int, default=40)
+        parser.add_argument("--topics", type=int, default=30)
+        parser.add_argument("--languages", type=int, default=60)
+        parser.add_argument("--environments", type=int, default=8)
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the random choices")
+
+    def handle(self, *args, **options):
+        created = seed_database(
+            reports=options["reports"],
+            datapacks=options["datapacks"],
+            testing_types=options["testing_types"],
+            topics=options["topics"],
+            languages=options["languages"],
+            environments=options["environments"],
+            users=options["users"],
+            seed=options["seed"],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Created {created} reports"))
@@ -0,0 +1,138 @@
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, CharField, F, Value, When
+
+from reports.models import Report
+from reports.utils import cache
+from reports.utils.backend import is_sharded, shard_name
+from reports.utils.listing import refresh_listings
+
+
+def link_or_copy(src, dst) -> bool:
+    """
+    Makes the file `src` available at `dst` too. Returns False if `dst` already existed
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        return False
+    except OSError:
+        # hard links not supported by the file system
+        shutil.copy2(src, dst)
+    return True
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the uploaded report files stored in the flat layout to the sharded layout "
+        "(UPLOAD_SHARD_LEVELS), in batches, while the site stays up. Can be interrupted and run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--sleep", type=float, default=0, help="Seconds to wait between batches")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        if not settings.UPLOAD_SHARD_LEVELS:
+            self.stdout.write("UPLOAD_SHARD_LEVELS is 0: nothing to do")
+            return
+
+        field = Report._meta.get_field("file_report")
+        storage = field.storage
+        moved = missing = skipped = too_long = 0
+        last_id = 0
+        while True:
+            # keyset pagination: rows already sharded are skipped, so an interrupted run simply resumes
+            batch = list(
+                Report.objects.filter(id__gt=last_id).exclude(file_report="").exclude(file_report__isnull=True)
+                .order_by("id").values_list("id", "file_report")[:options["batch_size"]]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            # 1. make the file available at its new location too (hard link), so that
+            #    views and comparisons keep working with either path
+            renames = {}
+            # the links made by this batch, removed if it fails
+            created = []
+            for report_id, name in batch:
+                if is_sharded(name):
+                    continue
+                new_name = shard_name(name)
+                if len(new_name) > field.max_length:
+                    # the file stays where it is, still served from there
+                    self.stderr.write(
+                        f"Report {report_id}: {new_name} is longer than {field.max_length} characters, skipped"
+                    )
+                    too_long += 1
+                    continue
+                src, dst = storage.path(name), storage.path(new_name)
+                if os.path.exists(src):
+                    if not options["dry_run"] and link_or_copy(src, dst):
+                        created.append(new_name)
+                elif not os.path.exists(dst):
+                    # dangling reference, see reconcile_files
+                    missing += 1
+                    continue
+                renames[report_id] = (name, new_name)
+
+            if options["dry_run"]:
+                for old, new in renames.values():
+                    self.stdout.write(f"{old} -> {new}")
+                moved += len(renames)
+                continue
+            if not renames:
+                continue
+
+            # 2. point the reports to the new location
+            try:
+                updated = self.update_names(renames)
+            except Exception:
+                # the reports still point to the old files
+                for new_name in created:
+                    storage.delete(new_name)
+                raise
+
+            # 3. remove the link that is not used anymore
+            for report_id, (old, new) in renames.items():
+                if updated.get(report_id) == new:
+                    storage.delete(old)
+                    moved += 1
+                else:
+                    storage.delete(new)
+                    skipped += 1
+
+            self.stdout.write(f"Moved {moved} files (up to report {last_id})")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{moved} files moved, {skipped} skipped (changed during the move), {missing} missing, "
+            f"{too_long} skipped (name too long)"
+        ))
+
+    def update_names(self, renames):
+        """
+        Points the reports to the new location of their file, in a single UPDATE, unless the file
+        of a report was changed in the meantime. Returns the file name of each report afterwards
+        """
+        with transaction.atomic():
+            Report.objects.filter(id__in=renames.keys()).update(file_report=Case(
+                *[When(id=report_id, file_report=old, then=Value(new)) for report_id, (old, new) in renames.items()],
+                default=F("file_report"), output_field=CharField(),
+            ))
+            rows = list(Report.objects.filter(id__in=renames.keys()).values_list("id", "file_report", "datapack_id"))
+            updated = {report_id: name for report_id, name, _ in rows}
+            # update() does not send the signals that keep the listing and the cached pages in sync
+            refresh_listings(updated.keys())
+            names = [cache.REPORTS, *{cache.datapack(datapack_id) for _, _, datapack_id in rows}]
+            transaction.on_commit(lambda: cache.bump_version(*names))
+        return updated
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-19 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0015_alter_report_accuracy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='parameters',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 4.0.5 on 2026-10-19 18:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import os
+
+
+def populate_listing(apps, schema_editor):
+    # same as python manage.py rebuild_report_listing, with the models of this migration
+    Report = apps.get_model("reports", "Report")
+    ReportListing = apps.get_model("reports", "ReportListing")
+    listings = []
+    reports = Report.objects.select_related(
+        "datapack__topic", "datapack__language", "environment", "testing_type", "tester"
+    )
+    for report in reports.iterator(chunk_size=1000):
+        size = None
+        if report.file_report:
+            try:
+                size = os.path.getsize(report.file_report.path)
+            except OSError:
+                pass
+        tester = report.tester
+        listings.append(ReportListing(
+            report_id=report.id, name=report.name,
+            datapack_id=report.datapack_id, datapack_name=report.datapack.name,
+            topic_id=report.datapack.topic_id, topic_name=report.datapack.topic.name,
+            language_id=report.datapack.language_id, language_name=report.datapack.language.name,
+            environment_id=report.environment_id,
+            environment_name=report.environment.name if report.environment else None,
+            testing_type_id=report.testing_type_id, testing_type_name=report.testing_type.name,
+            tester_id=report.tester_id, tester_name=tester.email[:-11] if tester.email else tester.username,
+            status=report.status, accuracy=report.accuracy, date_submit=report.date_submit,
+            date_approve=report.date_approve, approvedBy=report.approvedBy, link_QAServer=report.link_QAServer,
+            notes=report.notes, jira=report.jira, file_name=report.file_report.name or "", file_size=size,
+        ))
+    ReportListing.objects.bulk_create(listings, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reports', '0017_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportListing',
+            fields=[
+                ('report', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='reports.report')),
+                ('name', models.CharField(max_length=200)),
+                ('datapack_name', models.CharField(blank=True, max_length=64, null=True)),
+                ('topic_name', models.CharField(max_length=64)),
+                ('language_name', models.CharField(max_length=64)),
+                ('environment_name', models.CharField(blank=True, max_length=64, null=True)),
+                ('testing_type_name', models.CharField(max_length=64)),
+                ('tester_name', models.CharField(max_length=254)),
+                ('status', models.TextField()),
+                ('accuracy', models.TextField()),
+                ('date_submit', models.DateField()),
+                ('date_approve', models.DateField(blank=True, null=True)),
+                ('approvedBy', models.CharField(blank=True, max_length=64, null=True)),
+                ('link_QAServer', models.TextField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('jira', models.TextField(blank=True, null=True)),
+                ('file_name', models.CharField(blank=True, max_length=100)),
+                ('file_size', models.BigIntegerField(blank=True, null=True)),
+                ('datapack', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='reports.datapack')),
+                ('environment', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='reports.environment')),
+                ('language', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='reports.language')),
+                ('tester', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('testing_type', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='reports.testingtype')),
+                ('topic', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='reports.topic')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='reportlisting',
+            index=models.Index(fields=['datapack', '-report'], name='listing_datapack_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reportlisting',
+            index=models.Index(fields=['language', '-report'], name='listing_language_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reportlisting',
+            index=models.Index(fields=['topic', '-report'], name='listing_topic_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reportlisting',
+            index=models.Index(fields=['testing_type', '-report'], name='listing_testing_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reportlisting',
+            index=models.Index(fields=['environment', '-report'], name='listing_environment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reportlisting',
+            index=models.Index(fields=['tester', '-report'], name='listing_tester_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reportlisting',
+            index=models.Index(fields=['datapack_name', 'report'], name='listing_datapack_name_idx'),
+        ),
+        migrations.RunPython(populate_listing, migrations.RunPython.noop),
+    ]
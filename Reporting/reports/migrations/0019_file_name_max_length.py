@@ -0,0 +1,24 @@
+# Generated by Django 4.0.5 on 2026-10-19 19:36
+
+from django.db import migrations, models
+import reports.utils.backend
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0018_reportlisting'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='file_report',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to=reports.utils.backend.get_upload_to),
+        ),
+        migrations.AlterField(
+            model_name='reportlisting',
+            name='file_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
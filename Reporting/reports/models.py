@@ -9,6 +9,7 @@ from django.db import models
 from reports.utils.backend import get_upload_to
 import re
 import os
+import uuid
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
@@ -108,7 +109,8 @@ class Report(models.Model):
     )
     date_submit = models.DateField(auto_now=True)
     date_approve = models.DateField(null=True, blank=True)
-    file_report = models.FileField(upload_to=get_upload_to, null=True, blank=True)
+    # the shard directories make the names longer than the default 100 characters
+    file_report = models.FileField(upload_to=get_upload_to, max_length=255, null=True, blank=True)
     link_QAServer = models.TextField(null=True, blank=True)
     notes = models.TextField(null=True, blank=True)
     jira = models.TextField(null=True, blank=True)
@@ -117,6 +119,8 @@ class Report(models.Model):
         default="n/a"
     )
     approvedBy = models.CharField(max_length=64, null=True, blank=True)
+    # URL of the Parameter*.used file of the run, harvested in the background from link_QAServer
+    parameters = models.CharField(max_length=200, null=True, blank=True)
 
     def __str__(self) -> str:
         return self.name
@@ -160,7 +164,7 @@ class Report(models.Model):
             link_QAServer = object.get(f"{prefix}link_QAServer", None)
             notes = object.get(f"{prefix}notes", None)
             jira = object.get(f"{prefix}jira", None)
-            accuracy = object.get(f"{prefix}accuracy", None)
+            accuracy = object.get(f"{prefix}accuracy") or "n/a"
             file_report = object.get(f"{prefix}file_report", None)
 
             report = Report(
@@ -183,3 +187,81 @@ class Report(models.Model):
     def extension(self):
         name, extension = os.path.splitext(self.file_report.name)
         return extension
+
+    def is_text_file(self) -> bool:
+        return self.extension().lower() == ".txt"
+
+
+class ReportListing(models.Model):
+    """
+    A report with the fields of its datapack, topic, language, environment, testing type and tester,
+    so that the list pages read a single table without joins
+
+    Kept in sync by signals (see signals.py), rebuilt with python manage.py rebuild_report_listing.
+    The foreign keys are only used to filter: they have no DB constraint and are never followed.
+    """
+    report = models.OneToOneField(Report, primary_key=True, on_delete=models.CASCADE, related_name="listing")
+    name = models.CharField(max_length=200)
+    datapack = models.ForeignKey(DataPack, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name="+")
+    datapack_name = models.CharField(max_length=64, null=True, blank=True)
+    topic = models.ForeignKey(Topic, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name="+")
+    topic_name = models.CharField(max_length=64)
+    language = models.ForeignKey(Language, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name="+")
+    language_name = models.CharField(max_length=64)
+    environment = models.ForeignKey(
+        Environment, null=True, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name="+"
+    )
+    environment_name = models.CharField(max_length=64, null=True, blank=True)
+    testing_type = models.ForeignKey(TestingType, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name="+")
+    testing_type_name = models.CharField(max_length=64)
+    tester = models.ForeignKey(get_user_model(), on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name="+")
+    tester_name = models.CharField(max_length=254)
+    status = models.TextField()
+    accuracy = models.TextField()
+    date_submit = models.DateField()
+    date_approve = models.DateField(null=True, blank=True)
+    approvedBy = models.CharField(max_length=64, null=True, blank=True)
+    link_QAServer = models.TextField(null=True, blank=True)
+    notes = models.TextField(null=True, blank=True)
+    jira = models.TextField(null=True, blank=True)
+    file_name = models.CharField(max_length=255, blank=True)
+    # None if the file does not exist
+    file_size = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        # every filter of ReportFiltersForm, with the newest reports first
+        indexes = [
+            models.Index(fields=["datapack", "-report"], name="listing_datapack_idx"),
+            models.Index(fields=["language", "-report"], name="listing_language_idx"),
+            models.Index(fields=["topic", "-report"], name="listing_topic_idx"),
+            models.Index(fields=["testing_type", "-report"], name="listing_testing_type_idx"),
+            models.Index(fields=["environment", "-report"], name="listing_environment_idx"),
+            models.Index(fields=["tester", "-report"], name="listing_tester_idx"),
+            # datapack history
+            models.Index(fields=["datapack_name", "report"], name="listing_datapack_name_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return self.name
+
+    def is_text_file(self) -> bool:
+        return os.path.splitext(self.file_name)[1].lower() == ".txt"
+
+
+class ChunkedUpload(models.Model):
+    """
+    A result file being uploaded in chunks, until it is attached to a report
+    (see reports/utils/chunked_upload.py)
+    """
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    filename = models.CharField(max_length=200)
+    size = models.BigIntegerField()
+    # number of bytes received so far
+    offset = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, null=True, blank=True)
+    completed = models.BooleanField(default=False)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self) -> str:
+        return f"{self.filename} ({self.offset}/{self.size})"
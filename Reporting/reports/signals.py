@@ -1,10 +1,44 @@
-import os
-from django.db import models
+from functools import wraps
+
+from django.db import models, transaction
 from django.dispatch import receiver
-from reports.models import Report
+from django.contrib.auth import get_user_model
+from reports.models import Report, ReportListing, DataPack, TestingType, Environment, Topic, Language
+from reports.utils import cache, file_gc, listing
+
+# These auto-delete files from filesystem when they are unneeded.
+# Deletion is deferred until the transaction is committed and done in batches
+# by a background thread (see utils/file_gc.py), so a request never waits on NFS.
+
+
+def not_raw(handler):
+    """
+    Skips the saves of loaddata (raw=True), e.g. a restore of the DB (see utils/backup.py): the rows
+    are saved as they are in the dump, listing included, while their files are being restored
+    """
+    @wraps(handler)
+    def wrapper(sender, **kwargs):
+        if kwargs.get("raw"):
+            return None
+        return handler(sender, **kwargs)
+    return wrapper
+
+
+def _file_name(instance):
+    # read the raw field value so that deferred fields are not loaded from the DB
+    value = instance.__dict__.get("file_report")
+    return getattr(value, "name", value) or ""
+
+
+@receiver(models.signals.post_init, sender=Report)
+def remember_initial_file(sender, instance, **kwargs):
+    """
+    Keeps track of the file of a `Report` as loaded from the DB,
+    so that a file change can be detected on save without another query
+    """
+    instance._initial_file_report = _file_name(instance)
+    instance._initial_datapack_id = instance.__dict__.get("datapack_id")
 
-# https://stackoverflow.com/a/16041527
-# These two auto-delete files from filesystem when they are unneeded:
 
 @receiver(models.signals.post_delete, sender=Report)
 def auto_delete_file_on_delete(sender, instance, **kwargs):
@@ -12,27 +46,117 @@ def auto_delete_file_on_delete(sender, instance, **kwargs):
     Deletes file from filesystem
     when corresponding `Report` object is deleted.
     """
-    if instance.file_report:
-        if os.path.isfile(instance.file_report.path):
-            os.remove(instance.file_report.path)
+    file_gc.schedule_delete(_file_name(instance))
+
 
-@receiver(models.signals.pre_save, sender=Report)
-def auto_delete_file_on_change(sender, instance, **kwargs):
+@receiver(models.signals.post_save, sender=Report)
+@not_raw
+def auto_delete_file_on_change(sender, instance, created, **kwargs):
     """
     Deletes old file from filesystem
     when corresponding `Report` object is updated
     with new file.
     """
-    # the instance does not already exist in the DB (object is being created)
-    if not instance.pk:
-        return False
+    initial = getattr(instance, "_initial_file_report", "")
+    current = _file_name(instance)
+    # the uploaded file is being replaced
+    if not created and initial and initial != current:
+        file_gc.schedule_delete(initial)
+    instance._initial_file_report = current
 
-    try:
-        old_file = Report.objects.get(pk=instance.pk).file_report
-    except Report.DoesNotExist:
-        return False
 
-    # the uploaded file is being replaced
-    if instance.file_report != old_file:
-        if os.path.isfile(old_file.path):
-            os.remove(old_file.path)
\ No newline at end of file
+# The cached tables of the list pages are invalidated by bumping the version of their data,
+# once the change is committed (a table rendered before the commit is cached under the old version)
+
+def _bump_on_commit(*names):
+    transaction.on_commit(lambda: cache.bump_version(*names))
+
+
+@receiver(models.signals.post_save, sender=Report)
+@receiver(models.signals.post_delete, sender=Report)
+def invalidate_reports(sender, instance, **kwargs):
+    # the row of the datapack of the report, and of its previous datapack if it was moved
+    datapack_ids = {instance.datapack_id, getattr(instance, "_initial_datapack_id", None)} - {None}
+    _bump_on_commit(cache.REPORTS, *[cache.datapack(datapack_id) for datapack_id in datapack_ids])
+    instance._initial_datapack_id = instance.datapack_id
+
+
+@receiver(models.signals.post_save, sender=DataPack)
+@receiver(models.signals.post_delete, sender=DataPack)
+def invalidate_datapacks(sender, instance, **kwargs):
+    _bump_on_commit(cache.DATAPACKS, cache.datapack(instance.pk))
+
+
+@receiver(models.signals.post_save, sender=TestingType)
+@receiver(models.signals.post_delete, sender=TestingType)
+@receiver(models.signals.post_save, sender=Environment)
+@receiver(models.signals.post_delete, sender=Environment)
+@receiver(models.signals.post_save, sender=Topic)
+@receiver(models.signals.post_delete, sender=Topic)
+@receiver(models.signals.post_save, sender=Language)
+@receiver(models.signals.post_delete, sender=Language)
+@receiver(models.signals.m2m_changed, sender=Topic.tests_run.through)
+def invalidate_all(sender, **kwargs):
+    # names shown in the tables and the filters, and the testing sets of the topics
+    _bump_on_commit(cache.REPORTS, cache.DATAPACKS)
+
+
+@receiver(models.signals.post_save, sender=get_user_model())
+@receiver(models.signals.post_delete, sender=get_user_model())
+def invalidate_testers(sender, update_fields=None, **kwargs):
+    # not when a user logs in
+    if update_fields and set(update_fields) == {"last_login"}:
+        return
+    _bump_on_commit(cache.REPORTS)
+
+
+# The listing of the reports (see utils/listing.py) is updated in the same transaction as the change
+
+@receiver(models.signals.post_save, sender=Report)
+@not_raw
+def update_listing(sender, instance, **kwargs):
+    listing.refresh_listings([instance.pk])
+
+
+@receiver(models.signals.post_save, sender=DataPack)
+@not_raw
+def update_listing_datapack(sender, instance, **kwargs):
+    ReportListing.objects.filter(datapack=instance).update(
+        datapack_name=instance.name,
+        topic_id=instance.topic_id,
+        topic_name=instance.topic.name,
+        language_id=instance.language_id,
+        language_name=instance.language.name,
+    )
+
+
+@receiver(models.signals.post_save, sender=Topic)
+@not_raw
+def update_listing_topic(sender, instance, **kwargs):
+    ReportListing.objects.filter(topic=instance).update(topic_name=instance.name)
+
+
+@receiver(models.signals.post_save, sender=Language)
+@not_raw
+def update_listing_language(sender, instance, **kwargs):
+    ReportListing.objects.filter(language=instance).update(language_name=instance.name)
+
+
+@receiver(models.signals.post_save, sender=Environment)
+@not_raw
+def update_listing_environment(sender, instance, **kwargs):
+    ReportListing.objects.filter(environment=instance).update(environment_name=instance.name)
+
+
+@receiver(models.signals.post_save, sender=TestingType)
+@not_raw
+def update_listing_testing_type(sender, instance, **kwargs):
+    ReportListing.objects.filter(testing_type=instance).update(testing_type_name=instance.name)
+
+
+@receiver(models.signals.post_save, sender=get_user_model())
+@not_raw
+def update_listing_tester(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {"last_login"}:
+        return
+    ReportListing.objects.filter(tester=instance).update(tester_name=listing.tester_name(instance))
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+
+from django import test
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+
+from reports.models import DataPack, Environment, Language, TestingType, Topic
+from reports.utils import metrics
+
+
+class IsolatedDirsMixin:
+    """
+    Points the file cache and the state shared by the processes of the server (metrics, single
+    flight locks, admission slots, file and parameter indexes) to a temporary directory of the test
+    class, instead of Reporting/cache
+    """
+    @classmethod
+    def setUpClass(cls):
+        root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings_override = override_settings(
+            CACHES={"default": {**settings.CACHES["default"], "LOCATION": os.path.join(root, "django")}},
+            METRICS_DIR=os.path.join(root, "metrics"),
+            SINGLE_FLIGHT_DIR=os.path.join(root, "single_flight"),
+            ADMISSION_DIR=os.path.join(root, "admission"),
+            FILE_INDEX_CACHE_DIR=os.path.join(root, "file_index"),
+            PARAMETER_INDEX_DIR=os.path.join(root, "parameter_index"),
+        )
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+        # the counts of the tests stay in the temporary directory, rather than being written to
+        # METRICS_DIR when the test run exits
+        cls.addClassCleanup(metrics._values.clear)
+        super().setUpClass()
+
+
+class TestCase(IsolatedDirsMixin, test.TestCase):
+    pass
+
+
+class TransactionTestCase(IsolatedDirsMixin, test.TransactionTestCase):
+    pass
+
+
+class LiveServerTestCase(IsolatedDirsMixin, test.LiveServerTestCase):
+    pass
+
+
+class MediaRootMixin:
+    """
+    Stores the files of each test in a temporary MEDIA_ROOT, with the settings of `media_settings`
+    """
+    media_settings = {}
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, **self.media_settings)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write_file(self, name, content):
+        with open(os.path.join(self.media_root, name), "wb" if isinstance(content, bytes) else "w") as f:
+            f.write(content)
+
+
+class ReportDataMixin:
+    """
+    Creates the objects a report needs: a user "test" (password "test"), a datapack "lan-COU-TOPIC-1.1.1"
+    and a testing type
+    """
+    @classmethod
+    def create_report_data(cls, testing_type="NTE5"):
+        cls.user = get_user_model().objects.create_user(username="test", password="test")
+        cls.topic = Topic.objects.create(name="TOPIC")
+        cls.language = Language.objects.create(name="lan-COU")
+        cls.datapack = DataPack.objects.create(
+            name="lan-COU-TOPIC-1.1.1", language=cls.language, topic=cls.topic, version="1.1.1",
+        )
+        cls.testing_type = TestingType.objects.create(name=testing_type)
+
+    @classmethod
+    def create_datapack(cls, version):
+        return DataPack.objects.create(
+            name=f"lan-COU-TOPIC-{version}", language=cls.language, topic=cls.topic, version=version,
+        )
+
+    @classmethod
+    def create_environment(cls, name="environment_1"):
+        return Environment.objects.create(name=name)
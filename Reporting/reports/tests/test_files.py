@@ -0,0 +1,438 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from reports.models import *
+from reports.tests.base import MediaRootMixin, ReportDataMixin, TestCase
+from reports.checks import check_upload_storage
+from reports.utils import cache as report_cache
+from reports.utils.backend import UPLOAD_ROOT, is_sharded, shard_name
+from reports.utils.backup import list_snapshots
+from reports.utils.param_harvest import HarvestTimeout, _harvest_for_report, harvest_parameter_file
+from reports.utils.compare import compare_load, compare_load_advanced, compare_NTE5, compare_travel_corpus
+from reports.utils.synthetic import (
+    write_load_test_txt, write_load_test_xlsx, write_NTE5_csv, write_travel_corpus_output,
+)
+
+
+class ReportFileTestCase(ReportDataMixin, MediaRootMixin, TestCase):
+    media_settings = {"FILE_GC_ASYNC": False}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_report_data()
+        cls.environment = cls.create_environment()
+
+    def create_report(self, filename="result.csv", content=b"TestCase,Verdict\n"):
+        report = Report(
+            name="a", datapack=self.datapack, testing_type=self.testing_type,
+            environment=self.environment, tester=self.user,
+        )
+        report.file_report.save(filename, ContentFile(content), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            report.save()
+        return report
+
+
+class FileGarbageCollectionTest(ReportFileTestCase):
+    def test_file_deleted_after_report_deleted(self):
+        report = self.create_report()
+        path = report.file_report.path
+        with self.captureOnCommitCallbacks(execute=True):
+            report.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_old_file_deleted_when_replaced(self):
+        report = Report.objects.get(pk=self.create_report().pk)
+        old_path = report.file_report.path
+        report.file_report.save("new.csv", ContentFile(b"TestCase,Verdict\n"), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            report.save()
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(report.file_report.path))
+
+    def test_file_kept_when_unchanged(self):
+        report = Report.objects.get(pk=self.create_report().pk)
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            report.notes = "notes"
+            report.save()
+        self.assertTrue(os.path.exists(report.file_report.path))
+        # no extra SELECT of the report to compare files (the listing of the report is read with its joins)
+        self.assertFalse([
+            query for query in queries
+            if query["sql"].startswith("SELECT") and 'FROM "reports_report"' in query["sql"] and "JOIN" not in query["sql"]
+        ])
+
+    def test_file_kept_when_not_committed(self):
+        report = self.create_report()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            report.delete()
+        self.assertTrue(callbacks)
+        self.assertTrue(os.path.exists(report.file_report.path))
+
+
+class ReconcileFilesCommandTest(ReportFileTestCase):
+    def test_orphans_and_dangling_references(self):
+        kept = self.create_report()
+        dangling = self.create_report(filename="dangling.csv")
+        os.remove(dangling.file_report.path)
+        orphan = os.path.join(os.path.dirname(kept.file_report.path), "orphan.csv")
+        with open(orphan, "w") as f:
+            f.write("orphan")
+
+        out = StringIO()
+        call_command("reconcile_files", "--delete-orphans", "--clear-dangling", "--min-age=0", stdout=out)
+        output = out.getvalue()
+        self.assertIn("1 orphan files", output)
+        self.assertIn("1 dangling references", output)
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(kept.file_report.path))
+        dangling.refresh_from_db()
+        self.assertFalse(dangling.file_report)
+
+
+class UploadStorageCheckTest(ReportFileTestCase):
+    def test_production_storage(self):
+        with self.settings(BUILD_TYPE="PROD"):
+            self.assertEqual([error.id for error in check_upload_storage(None)], ["reports.E001"])
+            os.makedirs(os.path.join(self.media_root, UPLOAD_ROOT))
+            self.assertEqual(check_upload_storage(None), [])
+        # MEDIA_ROOT of docker-compose.yml: the volume mounted at /code/Nuance, whatever the working directory
+        with self.settings(MEDIA_ROOT="/code"):
+            storage = Report._meta.get_field("file_report").storage
+            self.assertEqual(storage.path(f"{UPLOAD_ROOT}/a.txt"), "/code/Nuance/a.txt")
+
+
+class ShardUploadsCommandTest(ReportFileTestCase):
+    def test_uploads_are_sharded(self):
+        self.assertTrue(is_sharded(self.create_report().file_report.name))
+
+    def test_legacy_files_moved(self):
+        with self.settings(UPLOAD_SHARD_LEVELS=0):
+            legacy = self.create_report()
+        old_path = legacy.file_report.path
+        self.assertFalse(is_sharded(legacy.file_report.name, levels=2))
+
+        versions = report_cache.get_versions(report_cache.REPORTS, report_cache.datapack(self.datapack.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("shard_uploads", stdout=StringIO())
+        legacy.refresh_from_db()
+        self.assertTrue(is_sharded(legacy.file_report.name))
+        self.assertFalse(os.path.exists(old_path))
+        with legacy.file_report.open("rb") as f:
+            self.assertEqual(f.read(), b"TestCase,Verdict\n")
+        listing = ReportListing.objects.get(report=legacy)
+        self.assertEqual(listing.file_name, legacy.file_report.name)
+        self.assertEqual(listing.file_size, len(b"TestCase,Verdict\n"))
+        new_versions = report_cache.get_versions(report_cache.REPORTS, report_cache.datapack(self.datapack.id))
+        self.assertTrue(all(new != old for new, old in zip(new_versions, versions)))
+
+        # nothing left to do
+        out = StringIO()
+        call_command("shard_uploads", stdout=out)
+        self.assertIn("0 files moved", out.getvalue())
+
+    def test_names_too_long_skipped(self):
+        with self.settings(UPLOAD_SHARD_LEVELS=0):
+            legacy = self.create_report()
+        # 6 characters of shard directories would go over max_length
+        directory = os.path.dirname(legacy.file_report.name)
+        long_name = f"{directory}/{'r' * (250 - len(directory) - 5)}.csv"
+        os.rename(legacy.file_report.path, os.path.join(self.media_root, long_name))
+        Report.objects.filter(id=legacy.id).update(file_report=long_name)
+
+        out, err = StringIO(), StringIO()
+        call_command("shard_uploads", stdout=out, stderr=err)
+        self.assertIn("1 skipped (name too long)", out.getvalue())
+        self.assertIn(f"Report {legacy.id}", err.getvalue())
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.file_report.name, long_name)
+        self.assertTrue(os.path.exists(legacy.file_report.path))
+
+    def test_links_removed_when_batch_fails(self):
+        with self.settings(UPLOAD_SHARD_LEVELS=0):
+            legacy = self.create_report()
+        with mock.patch.object(ReportListing.objects, "filter", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                call_command("shard_uploads", stdout=StringIO())
+        legacy.refresh_from_db()
+        self.assertFalse(is_sharded(legacy.file_report.name, levels=2))
+        self.assertTrue(os.path.exists(legacy.file_report.path))
+        self.assertFalse(os.path.exists(legacy.file_report.storage.path(shard_name(legacy.file_report.name))))
+
+
+class ReportListingTest(ReportFileTestCase):
+    def test_listing_kept_in_sync(self):
+        report = self.create_report(filename="result.txt", content=b"line\n" * 10)
+        listing = ReportListing.objects.get(report=report)
+        self.assertEqual(listing.datapack_name, "lan-COU-TOPIC-1.1.1")
+        self.assertEqual(listing.tester_name, "test")
+        self.assertEqual(listing.file_size, 50)
+        self.assertTrue(listing.is_text_file())
+
+        self.environment.name = "environment_2"
+        self.environment.save()
+        report.status = "Pass"
+        report.save()
+        listing.refresh_from_db()
+        self.assertEqual((listing.environment_name, listing.status), ("environment_2", "Pass"))
+
+        report.delete()
+        self.assertFalse(ReportListing.objects.exists())
+
+    def test_rebuild(self):
+        report = self.create_report()
+        ReportListing.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_report_listing", stdout=out)
+        self.assertIn("1 reports", out.getvalue())
+        self.assertEqual(ReportListing.objects.get().report_id, report.id)
+
+    def test_list_pages_read_the_listing(self):
+        self.create_report()
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("reports"))
+            self.client.get(reverse("datapack_history", args=[self.datapack.name]))
+        listing_queries = [query["sql"] for query in queries if "reports_reportlisting" in query["sql"]]
+        self.assertEqual(len(listing_queries), 2)
+        self.assertFalse([sql for sql in listing_queries if "JOIN" in sql])
+
+
+class ChunkedUploadTest(ReportFileTestCase):
+    content = b"TestCase,Verdict\n" * 100
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(username="test", password="test")
+
+    def upload(self, chunk_size=1000):
+        response = self.client.post(reverse("upload_init"), {"filename": "C:\\logs\\result.csv", "size": len(self.content)})
+        self.assertEqual(response.status_code, 200)
+        upload = response.json()
+        self.assertEqual(upload["filename"], "result.csv")
+        for offset in range(0, len(self.content), chunk_size):
+            response = self.client.post(
+                reverse("upload_append", args=[upload["upload_id"]]) + f"?offset={offset}",
+                self.content[offset:offset + chunk_size], content_type="application/octet-stream",
+            )
+            self.assertEqual(response.status_code, 200)
+        return upload["upload_id"]
+
+    def test_resume_from_offset(self):
+        upload_id = self.upload()
+        # a chunk sent again is refused with the offset to resume from
+        response = self.client.post(
+            reverse("upload_append", args=[upload_id]) + "?offset=0", b"Test", content_type="application/octet-stream",
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.get(reverse("upload_status", args=[upload_id])).json()["offset"], len(self.content))
+
+    def test_finalize_and_submit(self):
+        upload_id = self.upload()
+        response = self.client.post(
+            reverse("upload_finalize", args=[upload_id]), {"sha256": hashlib.sha256(self.content).hexdigest()},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["completed"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("submit_report"), {
+                "form-TOTAL_FORMS": 1, "form-0-name": "report", "form-0-datapack": self.datapack.name,
+                "form-0-testing_type": self.testing_type.id, "form-0-environment": self.environment.id,
+                "form-0-upload_id": upload_id,
+            })
+        self.assertContains(response, "Success")
+        report = Report.objects.get(name="report")
+        with report.file_report.open("rb") as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(ReportListing.objects.get(report=report).file_size, len(self.content))
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "Nuance", ".chunked_uploads")), [])
+
+    def test_staging_files_not_orphans(self):
+        self.upload()
+        out = StringIO()
+        call_command("reconcile_files", "--delete-orphans", "--min-age=0", stdout=out)
+        self.assertIn("0 orphan files", out.getvalue())
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, "Nuance", ".chunked_uploads"))), 1)
+
+    def test_checksum_mismatch(self):
+        upload_id = self.upload()
+        response = self.client.post(reverse("upload_finalize", args=[upload_id]), {"sha256": "0" * 64})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse("upload_status", args=[upload_id])).status_code, 404)
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.post(reverse("upload_init"), {"filename": "a.csv", "size": 1}).status_code, 403)
+
+
+class ParameterHarvestTest(ReportDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_report_data()
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings_override = override_settings(
+            DP_TEST_RESULTS_ROOT=os.path.join(self.root, "share"),
+            PARAMETERS_INI_DIR=os.path.join(self.root, "parameters_ini"),
+            PARAMETER_INDEX_DIR=os.path.join(self.root, "index"),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.link = "\\\\mt-nas02.nuance.com\\DP_Test_Results\\EMEA\\run_1"
+        run_folder = os.path.join(self.root, "share", "EMEA", "run_1", "logs")
+        os.makedirs(run_folder)
+        with open(os.path.join(run_folder, "Parameter_1.used"), "w") as f:
+            f.write("param=1\n")
+
+    def test_harvest_copies_once(self):
+        url = harvest_parameter_file(self.link)
+        self.assertTrue(url.startswith("/reports/media/parameters_ini/"))
+        self.assertEqual(harvest_parameter_file(self.link), url)
+        self.assertEqual(os.listdir(os.path.join(self.root, "parameters_ini")), [os.path.basename(url)])
+
+    def test_no_parameter_file(self):
+        self.assertIsNone(harvest_parameter_file("\\\\mt-nas02.nuance.com\\EMEA\\run_2"))
+        self.assertIsNone(harvest_parameter_file("not a link"))
+
+    def test_time_budget(self):
+        with self.assertRaises(HarvestTimeout):
+            harvest_parameter_file(self.link, time_budget=-1)
+
+    def test_report_detail_links_parameter_file(self):
+        report = Report.objects.create(
+            name="a", datapack=self.datapack, testing_type=self.testing_type, tester=self.user,
+            link_QAServer=self.link,
+        )
+        # closing the connection would end the transaction of the test
+        with mock.patch("reports.utils.param_harvest.close_old_connections"):
+            _harvest_for_report(report.pk, self.link)
+        url = Report.objects.get(pk=report.pk).parameters
+        self.assertTrue(url.startswith("/reports/media/parameters_ini/"))
+        response = self.client.get(reverse("report_detail", args=[report.pk]))
+        self.assertContains(response, f'<a href="{url}">')
+
+
+class BackupRestoreCommandTest(ReportFileTestCase):
+    def test_incremental_backup_and_restore(self):
+        report = self.create_report(content=b"TestCase,Verdict\n" * 1000)
+        backup_root = os.path.join(self.media_root, "backups")
+
+        out = StringIO()
+        call_command("backup", f"--backup-root={backup_root}", stdout=out)
+        self.assertIn("1 files", out.getvalue())
+        self.assertIn("DB dump: db.json.gz", out.getvalue())
+
+        # nothing changed: no new blob
+        out = StringIO()
+        call_command("backup", f"--backup-root={backup_root}", "--no-db", stdout=out)
+        self.assertIn("0 new compressed bytes", out.getvalue())
+
+        target = os.path.join(self.media_root, "restored")
+        call_command("restore", f"--backup-root={backup_root}", f"--target={target}", stdout=StringIO())
+        with open(os.path.join(target, report.file_report.name), "rb") as f:
+            self.assertEqual(f.read(), b"TestCase,Verdict\n" * 1000)
+
+    def test_incomplete_snapshots_ignored(self):
+        backup_root = os.path.join(self.media_root, "backups")
+        call_command("backup", f"--backup-root={backup_root}", "--no-db", stdout=StringIO())
+        [complete] = list_snapshots(backup_root)
+        snapshots_dir = os.path.join(backup_root, "snapshots")
+        # left by an interrupted backup, and a manifest cut short
+        shutil.copytree(os.path.join(snapshots_dir, complete), os.path.join(snapshots_dir, "9999-01-01T00-00-00.tmp"))
+        os.makedirs(os.path.join(snapshots_dir, "9999-01-01T00-00-01"))
+        with open(os.path.join(snapshots_dir, "9999-01-01T00-00-01", "manifest.json"), "w") as f:
+            f.write('{"created": "9999-01-01T00-00-01", "files": {')
+
+        out = StringIO()
+        call_command("restore", f"--backup-root={backup_root}", "--list", stdout=out)
+        self.assertEqual(out.getvalue().split(), [complete])
+        out = StringIO()
+        call_command("restore", f"--backup-root={backup_root}", f"--target={self.media_root}/restored", stdout=out)
+        self.assertIn(f"Restore of {complete} completed", out.getvalue())
+
+    def test_restore_db_does_not_delete_files(self):
+        report = self.create_report()
+        backup_root = os.path.join(self.media_root, "backups")
+        call_command("backup", f"--backup-root={backup_root}", stdout=StringIO())
+        with mock.patch("reports.utils.file_gc.schedule_delete") as schedule_delete, \
+                mock.patch("reports.utils.listing.refresh_listings") as refresh_listings:
+            call_command("restore", f"--backup-root={backup_root}", "--db", "--no-files", stdout=StringIO())
+        schedule_delete.assert_not_called()
+        refresh_listings.assert_not_called()
+        self.assertTrue(ReportListing.objects.filter(report=report).exists())
+
+
+class SyntheticFilesTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def report(self, filename):
+        return Report(file_report=filename, accuracy="n/a")
+
+    def generate(self, generate, filename, size=20000, seed=0):
+        path = os.path.join(self.directory, filename)
+        rows = generate(path, size, seed=seed)
+        return path, rows
+
+    def test_read_by_the_parsers(self):
+        with override_settings(MEDIA_ROOT=self.directory):
+            _, rows = self.generate(write_travel_corpus_output, "console.txt")
+            self.assertEqual(compare_travel_corpus([self.report("console.txt")])[0]["n_test_cases"], rows)
+
+            _, rows = self.generate(write_NTE5_csv, "result.csv")
+            result = compare_NTE5([self.report("result.csv")])
+            self.assertEqual(len(result["common_passed_test_cases"]) + len(result["common_failed_test_cases"]), rows)
+
+            self.generate(write_load_test_txt, "load.txt")
+            result = compare_load_advanced([self.report("load.txt")])
+            # every subtest, with numbers
+            self.assertTrue(all(result["calls"].values()))
+            self.assertIsInstance(result["stats"]["no_dlm"][0]["avg_latency"], float)
+
+            self.generate(write_load_test_xlsx, "load.xlsx")
+            self.assertIsInstance(compare_load([self.report("load.xlsx")])["no_dlm"][0], int)
+
+    def test_seeded(self):
+        first, _ = self.generate(write_NTE5_csv, "first.csv")
+        second, _ = self.generate(write_NTE5_csv, "second.csv")
+        other, _ = self.generate(write_NTE5_csv, "other.csv", seed=1)
+        with open(first) as f1, open(second) as f2, open(other) as f3:
+            content = f1.read()
+            self.assertEqual(content, f2.read())
+            self.assertNotEqual(content, f3.read())
+        self.assertGreaterEqual(os.path.getsize(first), 20000)
+
+    def test_bench_parsers_command(self):
+        output = os.path.join(self.directory, "bench.json")
+        call_command(
+            "bench_parsers", sizes=[0.01], repeat=1, output=output, parsers=["compare_NTE5", "parse_load_test_txt"],
+            stdout=StringIO(),
+        )
+        with open(output) as f:
+            results = json.load(f)["results"]
+        self.assertEqual([result["parser"] for result in results], ["compare_NTE5", "parse_load_test_txt"])
+        self.assertTrue(all(result["rows_per_s"] > 0 and result["peak_memory_mb"] > 0 for result in results))
+
+        out = StringIO()
+        call_command(
+            "bench_parsers", sizes=[0.01], repeat=1, output=output, baseline=output, parsers=["compare_NTE5"], stdout=out,
+        )
+        self.assertIn("Compared with", out.getvalue())
@@ -1,7 +1,35 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from unittest import mock
+
+import openpyxl
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from asgiref.testing import ApplicationCommunicator
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from reports.models import *
+from reports.tests.base import (
+    LiveServerTestCase, MediaRootMixin, ReportDataMixin, TestCase, TransactionTestCase,
+)
+from reports.utils import admission, metrics, profiling
+from reports.utils.asgi import ReportsASGIHandler
+from reports.utils.cache import cached
+from reports.utils.seed import seed_database
+from reports.utils.warmup import warm_up
 
 class ReportCreateViewTest(TestCase):
     @classmethod
@@ -30,6 +58,9 @@ class ReportCreateViewTest(TestCase):
         pass
 
 class ReportsViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
     @classmethod
     def setUpTestData(cls):
         user = get_user_model().objects.create_user(username="test", password="test")
@@ -294,6 +325,9 @@ class ReportsViewTest(TestCase):
         # all selected reports have a file
 
 class DatapacksViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
     def test_view_accessible_by_name(self):
         response = self.client.get(reverse("dptracking"))
         self.assertEqual(response.status_code, 200)
@@ -309,6 +343,738 @@ class DatapacksViewTest(TestCase):
     def test_post(self):
         pass
 
+class ListCacheTest(ReportDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_report_data()
+
+    def setUp(self):
+        cache.clear()
+
+    def create_report(self, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Report.objects.create(name=name, datapack=self.datapack, testing_type=self.testing_type, tester=self.user)
+
+    def test_cached_until_report_saved(self):
+        report = self.create_report("first report")
+        for url in (reverse("reports"), reverse("dptracking"), reverse("datapack_history", args=[self.datapack.name])):
+            self.assertContains(self.client.get(url), f"Report ID: {report.id}" if "dptracking" in url else "first report")
+            # the table is not queried again
+            with self.assertNumQueries(0):
+                self.client.get(url)
+
+        report = self.create_report("second report")
+        self.assertContains(self.client.get(reverse("reports")), "second report")
+        self.assertContains(self.client.get(reverse("dptracking")), f"Report ID: {report.id}")
+        self.assertContains(self.client.get(reverse("datapack_history", args=[self.datapack.name])), "second report")
+
+    def test_only_changed_tracking_row_rendered(self):
+        # a row that stays cached
+        DataPack.objects.create(
+            name="lan-COU-TOPIC-1.1.2", language=self.datapack.language, topic=self.datapack.topic, version="1.1.2"
+        )
+        self.create_report("report")
+        self.client.get(reverse("dptracking"))
+
+        report = self.create_report("new report")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("dptracking"))
+        self.assertContains(response, f"Report ID: {report.id}")
+        report_queries = [query["sql"] for query in queries if 'FROM "reports_report"' in query["sql"]]
+        # only the reports of the datapack of the new report
+        self.assertEqual(len(report_queries), 1)
+        self.assertIn(f'"datapack_id" = {self.datapack.id}', report_queries[0])
+
+    def test_not_modified(self):
+        self.create_report("report")
+        # gets the CSRF cookie
+        self.client.get(reverse("reports"))
+        for url in (reverse("reports"), reverse("dptracking"), reverse("datapack_history", args=[self.datapack.name])):
+            response = self.client.get(url)
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304
+                )
+
+        etag = self.client.get(reverse("reports"))["ETag"]
+        self.create_report("new report")
+        self.assertEqual(self.client.get(reverse("reports"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        # not the page of an anonymous user
+        self.client.login(username="test", password="test")
+        etag = self.client.get(reverse("reports"))["ETag"]
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("reports"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_edit_links_only_for_logged_in_users(self):
+        report = self.create_report("report")
+        edit_url = reverse("update_report", args=[report.id])
+        self.assertNotContains(self.client.get(reverse("reports")), edit_url)
+        self.client.login(username="test", password="test")
+        self.assertContains(self.client.get(reverse("reports")), edit_url)
+        self.client.logout()
+        self.assertNotContains(self.client.get(reverse("reports")), edit_url)
+
+
+class ExportReportsViewTest(ReportDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_report_data()
+        cls.nte5 = cls.testing_type
+        load = TestingType.objects.create(name="Load")
+        cls.reports = [
+            Report.objects.create(
+                name=f"report {i}", datapack=cls.datapack, testing_type=cls.nte5 if i % 2 else load, tester=cls.user
+            )
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def export(self, **params):
+        response = self.client.get(reverse("export_reports"), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content).decode("utf-8")
+
+    def test_busy(self):
+        admission_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, admission_dir)
+        with override_settings(ADMISSION_SLOTS={"export": 1}, ADMISSION_QUEUE_TIMEOUT=0, ADMISSION_DIR=admission_dir):
+            response = self.client.get(reverse("export_reports"))
+            # the slot is held until the export is sent
+            self.assertEqual(self.client.get(reverse("export_reports")).status_code, 503)
+            b"".join(response.streaming_content)
+            response.close()
+            self.export()
+
+    def test_ndjson(self):
+        response, content = self.export()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row["id"] for row in rows], [report.id for report in self.reports])
+        self.assertEqual(rows[0]["name"], "report 0")
+        self.assertEqual(rows[0]["datapack"], "lan-COU-TOPIC-1.1.1")
+        self.assertEqual(rows[0]["testing_type"], "Load")
+
+    def test_csv(self):
+        response, content = self.export(format="csv")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = content.splitlines()
+        self.assertTrue(lines[0].startswith("id,name,datapack,"))
+        self.assertEqual(len(lines), 6)
+
+    def test_filters_and_cursor(self):
+        nte5_ids = [report.id for report in self.reports if report.testing_type == self.nte5]
+        _, content = self.export(test_type=self.nte5.id)
+        self.assertEqual([json.loads(line)["id"] for line in content.splitlines()], nte5_ids)
+
+        _, content = self.export(after=self.reports[1].id, limit=2)
+        self.assertEqual([json.loads(line)["id"] for line in content.splitlines()], [r.id for r in self.reports[2:4]])
+
+    def test_bad_parameters(self):
+        for params in ({"format": "xml"}, {"topic": "not a topic"}, {"after": "x"}):
+            self.assertEqual(self.client.get(reverse("export_reports"), params).status_code, 400)
+
+
+LOAD_TEST = """loadTest100_oov-20221129-221043-19ch:
+ {calls} calls
+ 98 recognitions:
+ 97 Success
+ 1 NO_MATCH
+ stats:
+ audio 12.5
+ latency {latency}, 95% 0.6
+ cpl 1.5, 95% 2
+ monitors:
+ cpu mem host
+ 45.5 30 host1
+"""
+
+
+class CompareReportsApiTest(ReportDataMixin, MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_report_data("load_test")
+        cls.reports = [
+            Report.objects.create(
+                name=f"load {i}", datapack=dp, testing_type=cls.testing_type, tester=cls.user,
+                accuracy="12.5", file_report=f"load_{i}.txt",
+            )
+            for i, dp in enumerate((cls.datapack, cls.create_datapack("1.2.0")))
+        ]
+        cls.nte5_report = Report.objects.create(
+            name="nte5", datapack=cls.datapack, testing_type=TestingType.objects.create(name="NTE5"), tester=cls.user,
+            file_report="result.csv",
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        for i, (calls, latency) in enumerate(((100, "0.35"), (200, "0.25"))):
+            self.write_file(f"load_{i}.txt", LOAD_TEST.format(calls=calls, latency=latency))
+
+    def compare(self, **params):
+        params["reports"] = ",".join(str(report.id) for report in self.reports)
+        return self.client.get(reverse("compare_reports_api"), params)
+
+    def test_numbers(self):
+        response = self.compare()
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["testing_type"], "load_test")
+        self.assertEqual([report["name"] for report in data["reports"]], ["load 0", "load 1"])
+        result = data["result"]
+        self.assertEqual(result["calls"]["preloaded_dlm_100_oovs"], [100, 200])
+        self.assertEqual(result["stats"]["preloaded_dlm_100_oovs"][0]["avg_latency"], 0.35)
+        self.assertEqual(result["monitors"]["preloaded_dlm_100_oovs"][1], [{"host": "host1", "cpu": 45.5, "mem": 30}])
+        self.assertEqual(result["errors"]["preloaded_dlm_100_oovs"][0], ["1 NO_MATCH"])
+        self.assertEqual(result["accuracy"], [12.5, 12.5])
+
+    def test_field_selection(self):
+        result = self.compare(stats="avg_latency,95%_cpl", fields="stats,calls").json()["result"]
+        self.assertEqual(set(result), {"stats", "calls"})
+        self.assertEqual(result["stats"]["preloaded_dlm_100_oovs"][1], {"avg_latency": 0.25, "95%_cpl": 2})
+
+    def test_formatted_by_the_reports_page(self):
+        response = self.client.post(reverse("reports"), {f"compare-{report.id}": "on" for report in self.reports})
+        self.assertContains(response, "avg_latency: 0.35<br>")
+        self.assertContains(response, "host: host1<br>cpu: 45.5<br>")
+
+    def test_filter_stats_without_reading_the_files(self):
+        self.client.post(reverse("reports"), {f"compare-{report.id}": "on" for report in self.reports})
+        for report in self.reports:
+            os.remove(os.path.join(self.media_root, report.file_report.name))
+
+        data = {"reports": ",".join(str(report.id) for report in self.reports), "choice": ["choice_5", "choice_7"]}
+        response = self.client.post(reverse("filter_stats"), data, HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertTemplateUsed(response, "reports/compare/load_table.html")
+        self.assertTemplateNotUsed(response, "reports/compare/compare_filtered.html")
+        self.assertContains(response, "avg_latency: 0.35<br>avg_cpl: 1.5<br>")
+        self.assertNotContains(response, "audio:")
+        # without the script of the page
+        response = self.client.post(reverse("filter_stats"), data)
+        self.assertTemplateUsed(response, "reports/compare/compare_filtered.html")
+        self.assertContains(response, "avg_latency: 0.25<br>avg_cpl: 1.5<br>")
+
+    def test_export_csv(self):
+        response = self.client.get(
+            reverse("export_comparison"), {"reports": ",".join(str(report.id) for report in self.reports)}
+        )
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode("utf-8"))))
+        self.assertEqual(rows[1], ["Report", "", "", "load 0", "load 1"])
+        self.assertIn(["stats", "Preloaded DLM (100 oovs)", "avg_latency", "0.35", "0.25"], rows)
+        self.assertIn(["calls", "Preloaded DLM (100 oovs)", "", "100", "200"], rows)
+
+    def test_export_xlsx(self):
+        response = self.client.get(reverse("export_comparison"), {
+            "reports": ",".join(str(report.id) for report in self.reports), "format": "xlsx",
+        })
+        self.assertEqual(response.status_code, 200)
+        workbook = openpyxl.load_workbook(io.BytesIO(b"".join(response.streaming_content)))
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertIn(("monitors", "Preloaded DLM (100 oovs)", "cpu 1", 45.5, 45.5), rows)
+
+    def test_export_xlsx_busy(self):
+        params = {"reports": ",".join(str(report.id) for report in self.reports), "format": "xlsx"}
+        with override_settings(ADMISSION_SLOTS={"export": 1}, ADMISSION_QUEUE_TIMEOUT=0):
+            slot = admission.acquire("export")
+            response = self.client.get(reverse("export_comparison"), params)
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response["Retry-After"], "1")
+            # the slot is released once the workbook is written
+            admission.release(slot)
+            self.assertEqual(self.client.get(reverse("export_comparison"), params).status_code, 200)
+            admission.release(admission.acquire("export"))
+
+    def test_errors(self):
+        url = reverse("compare_reports_api")
+        self.assertEqual(self.client.get(url, {"reports": "a,b"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"reports": "0"}).status_code, 404)
+        self.assertEqual(
+            self.client.get(url, {"reports": f"{self.reports[0].id},{self.nte5_report.id}"}).status_code, 400
+        )
+        self.assertEqual(self.compare(stats="unknown").status_code, 400)
+
+    def test_missing_file(self):
+        os.remove(os.path.join(self.media_root, self.reports[1].file_report.name))
+        response = self.compare()
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("load_1.txt", response.json()["error"])
+
+    def test_not_finite_numbers(self):
+        Report.objects.filter(pk=self.reports[0].pk).update(accuracy="nan")
+        Report.objects.filter(pk=self.reports[1].pk).update(accuracy="inf")
+        response = self.compare()
+        self.assertNotIn(b"NaN", response.content)
+        self.assertNotIn(b"Infinity", response.content)
+        self.assertEqual(response.json()["result"]["accuracy"], [None, None])
+
+    def test_memory_profiling(self):
+        settings_override = override_settings(COMPARISON_MEMORY_PROFILING=True)
+        with settings_override, self.assertLogs("reports.utils.memory", "INFO") as logs:
+            self.assertEqual(self.compare().status_code, 200)
+        self.assertIn("Comparison of load_test reports: peak", logs.output[0])
+        self.assertIn("compare.py:", logs.output[0])
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertIn('reports_comparison_peak_memory_bytes_count{testing_type="load_test"}', metrics.render_metrics())
+
+    def test_memory_profiling_without_reset_peak(self):
+        # Python 3.8 (the Docker image) has no tracemalloc.reset_peak()
+        reset_peak = getattr(tracemalloc, "reset_peak", None)
+        if reset_peak is not None:
+            del tracemalloc.reset_peak
+            self.addCleanup(setattr, tracemalloc, "reset_peak", reset_peak)
+        # tracing already started by someone else: the peak is that of the checkpoints
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        settings_override = override_settings(COMPARISON_MEMORY_PROFILING=True)
+        with settings_override, self.assertLogs("reports.utils.memory", "INFO") as logs:
+            self.assertEqual(self.compare().status_code, 200)
+        self.assertRegex(logs.output[0], r"peak \d+\.\dMB traced")
+        self.assertTrue(tracemalloc.is_tracing())
+
+    def test_memory_budget(self):
+        settings_override = override_settings(COMPARISON_MEMORY_PROFILING=True, COMPARISON_MEMORY_BUDGET=1)
+        with settings_override, self.assertLogs("reports.utils.memory", "WARNING"):
+            response = self.compare()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("too much memory", response.json()["error"])
+        self.assertFalse(tracemalloc.is_tracing())
+
+        # not cached: compared again without the budget
+        self.assertEqual(self.compare().status_code, 200)
+
+    def test_admission(self):
+        admission_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, admission_dir)
+        with override_settings(ADMISSION_SLOTS={"comparison": 1}, ADMISSION_QUEUE_TIMEOUT=0, ADMISSION_DIR=admission_dir):
+            # e.g. held by another worker
+            slot = admission.acquire("comparison")
+            response = self.compare()
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response["Retry-After"], "1")
+            self.assertIn("busy", response.json()["error"])
+
+            admission.release(slot)
+            self.assertEqual(self.compare().status_code, 200)
+            # a cached comparison takes no slot
+            slot = admission.acquire("comparison")
+            self.assertEqual(self.compare().status_code, 200)
+            admission.release(slot)
+
+    def test_time_budget(self):
+        with override_settings(COMPARISON_TIME_BUDGET=1e-9):
+            response = self.compare()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response)
+        self.assertIn("the comparison was stopped", response.json()["error"])
+        # not cached
+        self.assertEqual(self.compare().status_code, 200)
+
+    def test_single_flight(self):
+        # several users opening the same comparison at once
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.3)
+            return {"result": 1}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cached("comparison", [], compute, 60, "same", coalesce=True)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"result": 1}] * 4)
+
+    def test_profiling(self):
+        self.assertNotIn("Server-Timing", self.compare())
+        cache.clear()
+
+        with override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_SLOW_MS=0):
+            # the middlewares are loaded by the first request of a client
+            self.client = self.client_class()
+            response = self.compare()
+            self.assertEqual(response.status_code, 200)
+            timing = response["Server-Timing"]
+            self.assertIn("total;dur=", timing)
+            self.assertIn("db;dur=", timing)
+            self.assertIn('parse_compare_load_advanced;dur=', timing)
+
+            # the slow requests, for the admins only
+            self.client.login(username="test", password="test")
+            self.assertEqual(self.client.get(reverse("profiling")).status_code, 302)
+            get_user_model().objects.filter(username="test").update(is_staff=True)
+            response = self.client.get(reverse("profiling"))
+            self.assertContains(response, "GET /reports/api/compare/?reports=")
+            self.assertContains(response, "parse_compare_load_advanced")
+            self.assertContains(response, "SELECT")
+
+            self.client.post(reverse("profiling"))
+            # only the request clearing them, recorded once it is done
+            self.assertEqual(len(profiling.slow_requests()), 1)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir)
+        settings_override = override_settings(METRICS_DIR=metrics_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        metrics._values.clear()
+        metrics._last_archive = 0.0
+        self.metrics_dir = metrics_dir
+
+    def write_process(self, pid, start, values):
+        name = metrics.file_name(pid, start)
+        with open(os.path.join(self.metrics_dir, name), "w") as f:
+            json.dump(metrics._dump(values), f)
+        return name
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("reports"))
+        self.client.get(reverse("reports"))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn("# TYPE reports_request_duration_seconds histogram", text)
+        self.assertIn('reports_request_duration_seconds_bucket{view="reports",method="GET",le="+Inf"} 2', text)
+        self.assertIn('reports_request_duration_seconds_count{view="reports",method="GET"} 2', text)
+        self.assertIn('reports_requests_total{view="reports",status="200"} 2', text)
+        self.assertIn('reports_cache_requests_total{prefix="table:latest_reports",result="miss"} 1', text)
+        self.assertIn('reports_cache_requests_total{prefix="table:latest_reports",result="hit"} 1', text)
+        self.assertRegex(text, r'reports_db_queries_total\{view="reports"\} \d+')
+
+    def test_histogram(self):
+        histogram = metrics.Histogram("test_seconds", "Test", ("kind",), buckets=(1, 5))
+        self.addCleanup(metrics.REGISTRY.pop, "test_seconds")
+        for value in (0.5, 2, 3, 10):
+            histogram.observe(value, kind="a")
+        text = metrics.render_metrics()
+        self.assertIn('test_seconds_bucket{kind="a",le="1"} 1', text)
+        self.assertIn('test_seconds_bucket{kind="a",le="5"} 3', text)
+        self.assertIn('test_seconds_bucket{kind="a",le="+Inf"} 4', text)
+        self.assertIn('test_seconds_sum{kind="a"} 15.5', text)
+
+    def test_processes_added_up(self):
+        # a process that is gone, one still running, and one gone whose pid was given to another process
+        key = ("reports_file_served_bytes_total", ("view_file",))
+        dead = self.write_process(os.getpid() + 1000000, 1, {key: 100})
+        parent_start = metrics._process_start(os.getppid())
+        running = self.write_process(os.getppid(), parent_start, {key: 20})
+        reused = self.write_process(os.getppid(), parent_start + 1, {key: 1000})
+        metrics.FILE_SERVED_BYTES.inc(3, view="view_file")
+
+        for _ in range(2):
+            # the files of the processes gone are archived: counted once
+            self.assertIn('reports_file_served_bytes_total{view="view_file"} 1123', metrics.render_metrics())
+        self.assertFalse(os.path.exists(os.path.join(self.metrics_dir, dead)))
+        self.assertFalse(os.path.exists(os.path.join(self.metrics_dir, reused)))
+        self.assertTrue(os.path.exists(os.path.join(self.metrics_dir, running)))
+        self.assertTrue(os.path.exists(os.path.join(self.metrics_dir, metrics.ARCHIVE)))
+
+    def test_access_restricted(self):
+        self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="10.1.2.3").status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=["10.1.0.0/16"]):
+            self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="10.1.2.3").status_code, 200)
+        get_user_model().objects.create_user(username="staff", password="staff", is_staff=True)
+        self.client.login(username="staff", password="staff")
+        self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="10.1.2.3").status_code, 200)
+
+
+class BenchmarkCommandsTest(TestCase):
+    def test_seed_database(self):
+        created = seed_database(reports=300, datapacks=20, testing_types=5, topics=3, languages=4, users=3)
+        self.assertEqual(created, 300)
+        self.assertEqual(DataPack.objects.count(), 20)
+        self.assertEqual(ReportListing.objects.count(), 300)
+        self.assertTrue(all(DataPack.is_valid_name(name) for name in DataPack.objects.values_list("name", flat=True)))
+        # only what is missing
+        self.assertEqual(seed_database(reports=350, datapacks=20, testing_types=5, topics=3, languages=4, users=3), 50)
+        self.assertEqual(Report.objects.count(), 350)
+        self.assertEqual(ReportListing.objects.count(), 350)
+
+    def test_bench_views_command(self):
+        seed_database(reports=100, datapacks=10, testing_types=5, topics=3, languages=4, users=3)
+        output = os.path.join(tempfile.mkdtemp(), "bench.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        call_command("bench_views", current_db=True, requests=2, output=output, stdout=io.StringIO())
+        with open(output) as f:
+            results = json.load(f)["results"]
+        self.assertEqual({result["view"] for result in results}, {
+            "ReportsView", "ReportsView filter", "DatapacksView", "DatapacksView filter", "DatapackHistoryView",
+        })
+        cold = next(result for result in results if result["view"] == "ReportsView" and result["cache"] == "cold")
+        warm = next(result for result in results if result["view"] == "ReportsView" and result["cache"] == "warm")
+        self.assertGreater(cold["queries"], warm["queries"])
+
+        with self.assertRaises(CommandError):
+            call_command(
+                "bench_views", current_db=True, requests=2, output=output, baseline=output, max_regression=-100,
+                stdout=io.StringIO(),
+            )
+
+
+class LoadGeneratorTest(ReportDataMixin, MediaRootMixin, LiveServerTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.create_report_data("MIX_accuracy_test_8k")
+        self.create_environment("Mix")
+
+    def bench_load(self, **options):
+        output = os.path.join(self.media_root, "bench.json")
+        call_command(
+            "bench_load", url=self.live_server_url, requests=20, duration=60, warmup=0, think_time=0,
+            file_size=2, output=output, stdout=io.StringIO(), stderr=io.StringIO(), **options,
+        )
+        with open(output) as f:
+            return {result["endpoint"]: result for result in json.load(f)["results"]}
+
+    def test_all_flows(self):
+        # 1 user: the live server shares its in-memory SQLite DB between the requests, and the writes
+        # of concurrent submits fail with "database table is locked"
+        results = self.bench_load(
+            users=1, username="test", password="test", mix="list=1,filter=1,compare=1,view_file=1,submit=1",
+        )
+        self.assertEqual(results["total"]["requests"], 20)
+        self.assertEqual(results["total"]["errors"], 0, results)
+        self.assertEqual(set(results) - {"total"}, {"list", "filter", "compare", "view_file", "submit"})
+        # the 2 reports submitted to be compared, and those of the submit flow
+        self.assertEqual(Report.objects.count(), 2 + results["submit"]["requests"])
+        self.assertLessEqual(results["total"]["p50_ms"], results["total"]["p99_ms"])
+
+    def test_anonymous(self):
+        # nothing to compare or view, no submit without login
+        results = self.bench_load(users=3)
+        self.assertEqual(set(results), {"list", "filter", "total"})
+        self.assertEqual(results["total"]["errors"], 0)
+
+    def test_unknown_flow(self):
+        with self.assertRaises(CommandError):
+            self.bench_load(users=1, mix="list=1,upload=1")
+
+
+class AsgiTest(ReportDataMixin, MediaRootMixin, TransactionTestCase):
+    # the requests run in threads of their own, which only see the data committed
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.create_report_data("load_test")
+        self.reports = []
+        for i, (calls, latency) in enumerate(((100, "0.35"), (200, "0.25"))):
+            self.reports.append(Report.objects.create(
+                name=f"load {i}", datapack=self.datapack if i == 0 else self.create_datapack("1.2.0"),
+                testing_type=self.testing_type, tester=self.user, accuracy="12.5", file_report=f"load_{i}.txt",
+            ))
+            self.write_file(f"load_{i}.txt", LOAD_TEST.format(calls=calls, latency=latency))
+
+    async def get(self, path, query_string=b""):
+        communicator = ApplicationCommunicator(ReportsASGIHandler(), {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": path, "query_string": query_string, "headers": [(b"host", b"testserver")],
+            "server": ("testserver", 80), "client": ("127.0.0.1", 50000),
+        })
+        await communicator.send_input({"type": "http.request", "body": b""})
+        start = await communicator.receive_output(10)
+        body = b""
+        while True:
+            message = await communicator.receive_output(10)
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        return start["status"], dict(start["headers"]), body
+
+    async def test_download_file(self):
+        # several reads of the file
+        with open(os.path.join(self.media_root, "load_0.txt"), "ab") as f:
+            f.write(os.urandom(600 * 1024))
+        status, headers, body = await self.get(reverse("download_file", args=[self.reports[0].id]))
+        self.assertEqual(status, 200)
+        with open(os.path.join(self.media_root, "load_0.txt"), "rb") as f:
+            self.assertEqual(body, f.read())
+        self.assertEqual(int(headers[b"Content-Length"]), len(body))
+        self.assertTrue(headers[b"Content-Disposition"].startswith(b"attachment"))
+
+        status, _, _ = await self.get(reverse("view_file", args=[0]))
+        self.assertEqual(status, 404)
+
+    async def test_view_file_window(self):
+        status, _, body = await self.get(
+            reverse("view_file_window", args=[self.reports[1].id]), b"q=preloaded_dlm_100_oovs",
+        )
+        self.assertEqual(status, 200)
+        self.assertIn(b"preloaded_dlm_100_oovs", body)
+
+    async def test_metrics_flushed_in_a_thread(self):
+        threads = []
+        metrics._last_flush = 0.0
+        with mock.patch.object(metrics, "flush", side_effect=lambda: threads.append(threading.current_thread().name)):
+            status, _, _ = await self.get(reverse("reports"))
+        self.assertEqual(status, 200)
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith("reports-file_io"))
+
+    async def test_compare(self):
+        query_string = f"reports={self.reports[0].id},{self.reports[1].id}".encode()
+        status, _, body = await self.get(reverse("compare_reports_api"), query_string)
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["result"]["calls"]["preloaded_dlm_100_oovs"], [100, 200])
+
+        status, _, body = await self.get(reverse("export_comparison"), query_string)
+        self.assertEqual(status, 200)
+        self.assertIn(b"load 0", body)
+
+    async def test_export(self):
+        # a stream running SQL queries, in the thread of its request
+        status, _, body = await self.get(reverse("export_reports"))
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body.splitlines()), 2)
+
+
+class WarmUpTest(TransactionTestCase):
+    # warm_up() closes the DB connections: not in the transaction of a TestCase
+    def test_warm_up(self):
+        cache.clear()
+        seed_database(reports=50, datapacks=5, testing_types=3, topics=2, languages=2, users=2)
+        messages = []
+        warm_up(messages.append)
+        self.assertRegex(messages[0], r"Warmed up: \d+ templates")
+        # the tables of the list pages are in the cache
+        key = ("reports_cache_requests_total", ("table:latest_reports", "hit"))
+        hits = metrics._values.get(key, 0)
+        self.assertEqual(self.client.get(reverse("reports")).status_code, 200)
+        self.assertEqual(metrics._values.get(key, 0), hits + 1)
+
+
+class FileViewerViewTest(ReportDataMixin, MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_report_data("DNN_TravelCorpus")
+        cls.report = Report.objects.create(
+            name="a", datapack=cls.datapack, testing_type=cls.testing_type, tester=cls.user,
+            file_report="console_output_Obfuscated.txt",
+        )
+
+    def setUp(self):
+        super().setUp()
+        # 2500 lines, every 1000th one is a failure
+        with open(os.path.join(self.media_root, "console_output_Obfuscated.txt"), "w") as f:
+            for i in range(1, 2501):
+                if i % 1000 == 0:
+                    f.write(f"mine : failure {i}\n")
+                else:
+                    f.write(f"response: line {i}\n")
+
+    def test_first_window(self):
+        response = self.client.get(reverse("view_file_window", args=[self.report.pk]), {"count": 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "reports/file_viewer.html")
+        self.assertEqual(response.context["n_lines"], 2500)
+        self.assertEqual(response.context["lines"][0], (1, "response: line 1"))
+        self.assertEqual(len(response.context["lines"]), 10)
+
+    def test_jump_to_line(self):
+        response = self.client.get(reverse("view_file_window", args=[self.report.pk]), {"line": 2499, "count": 10})
+        self.assertEqual(response.context["lines"], [(2499, "response: line 2499"), (2500, "response: line 2500")])
+
+    def test_find_next(self):
+        url = reverse("view_file_window", args=[self.report.pk])
+        response = self.client.get(url, {"q": "mine :"})
+        self.assertEqual(response.context["hit"], 1000)
+        response = self.client.get(url, {"q": "mine :", "line": 1000, "last_q": "mine :"})
+        self.assertEqual(response.context["hit"], 2000)
+        self.assertEqual(response.context["lines"][0], (2000, "mine : failure 2000"))
+        response = self.client.get(url, {"q": "mine :", "line": 2000, "last_q": "mine :"})
+        self.assertTrue(response.context["not_found"])
+
+    def test_find_on_first_line(self):
+        url = reverse("view_file_window", args=[self.report.pk])
+        # the form always sends the first line of the window
+        response = self.client.get(url, {"q": "response: line 1", "line": 1})
+        self.assertEqual(response.context["hit"], 1)
+        response = self.client.get(url, {"q": "mine :", "line": 1000})
+        self.assertEqual(response.context["hit"], 1000)
+        # a new query is searched from the first line of the window too
+        response = self.client.get(url, {"q": "failure", "line": 1000, "last_q": "mine :"})
+        self.assertEqual(response.context["hit"], 1000)
+
+    def test_search_is_literal(self):
+        url = reverse("view_file_window", args=[self.report.pk])
+        response = self.client.get(url, {"q": "(a+)+$"})
+        self.assertTrue(response.context["not_found"])
+        with open(os.path.join(self.media_root, "console_output_Obfuscated.txt"), "a") as f:
+            f.write("(a+)+$\n")
+        response = self.client.get(url, {"q": "(a+)+$"})
+        self.assertEqual(response.context["hit"], 2501)
+
+    def test_binary_file_refused(self):
+        with open(os.path.join(self.media_root, "console_output_Obfuscated.txt"), "wb") as f:
+            f.write(b"PK\x03\x04\x14\x00\x00\x00" + b"\n" * 100)
+        response = self.client.get(reverse("view_file_window", args=[self.report.pk]))
+        self.assertEqual(response.status_code, 415)
+
+    def test_missing_file(self):
+        os.remove(os.path.join(self.media_root, "console_output_Obfuscated.txt"))
+        response = self.client.get(reverse("view_file_window", args=[self.report.pk]))
+        self.assertEqual(response.status_code, 404)
+
+class DownloadFilesViewTest(ReportDataMixin, MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_report_data()
+        cls.with_file = Report.objects.create(
+            name="a", datapack=cls.datapack, testing_type=cls.testing_type, tester=cls.user, file_report="result.csv",
+        )
+        cls.without_file = Report.objects.create(
+            name="b", datapack=cls.datapack, testing_type=cls.testing_type, tester=cls.user,
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.write_file("result.csv", "TestCase,Verdict\ntest001_2_formatting_scheme_date,Pass\n" * 1000)
+
+    def open_zip(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+
+    def test_datapack_zip(self):
+        archive = self.open_zip(self.client.get(reverse("download_datapack_files", args=["lan-COU-TOPIC-1.1.1"])))
+        self.assertIsNone(archive.testzip())
+        manifest = json.loads(archive.read("manifest.json"))
+        self.assertEqual([entry["id"] for entry in manifest], [self.with_file.id, self.without_file.id])
+        arcname = f"NTE5/{self.with_file.id}_result.csv"
+        self.assertEqual(manifest[0]["file"], arcname)
+        with open(os.path.join(self.media_root, "result.csv"), "rb") as f:
+            self.assertEqual(archive.read(arcname), f.read())
+
+    def test_manifest_without_email(self):
+        self.user.email = "first.last@nuance.com"
+        self.user.save()
+        archive = self.open_zip(self.client.get(reverse("download_datapack_files", args=["lan-COU-TOPIC-1.1.1"])))
+        manifest = archive.read("manifest.json")
+        self.assertEqual(json.loads(manifest)[0]["tester"], "first.last")
+        self.assertNotIn(b"@nuance.com", manifest)
+
+    def test_selected_reports_zip(self):
+        response = self.client.post(reverse("download_report_files"), {f"compare-{self.with_file.id}": "on"})
+        archive = self.open_zip(response)
+        self.assertEqual(len(archive.namelist()), 2)
+
+    def test_unknown_datapack(self):
+        response = self.client.get(reverse("download_datapack_files", args=["abc-ABC-TOPIC-1.1.1"]))
+        self.assertEqual(response.status_code, 404)
+
 class LoginViewTest(TestCase):
     @classmethod
     def setUpTestData(cls):
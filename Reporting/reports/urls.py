@@ -3,19 +3,30 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 from . import views
-from reports.views import ReportsView, ReportCreateView, ReportDetailView, UpdateReportView, DeleteReportView, DatapacksView, UpdateDatapackView, view_file, download_file, DatapackHistoryView, filter_stats
+from reports.views import ReportsView, ReportCreateView, ReportDetailView, UpdateReportView, DeleteReportView, DatapacksView, UpdateDatapackView, view_file, view_file_window, download_file, download_datapack_files, download_report_files, DatapackHistoryView, filter_stats
 
 urlpatterns = [
     path("", ReportsView.as_view(), name="reports"),
     path("report/<pk>/", ReportDetailView.as_view(), name="report_detail"),
     path("submit_report/", ReportCreateView.as_view(), name="submit_report"),
     path("api/submit_report/", views.submit_report_api, name="submit_report_api"),
+    path("api/reports/", views.export_reports, name="export_reports"),
+    path("api/compare/", views.compare_reports_api, name="compare_reports_api"),
+    path("api/compare/export/", views.export_comparison, name="export_comparison"),
+    path("uploads/", views.upload_init, name="upload_init"),
+    path("uploads/<uuid:upload_id>/", views.upload_status, name="upload_status"),
+    path("uploads/<uuid:upload_id>/append/", views.upload_append, name="upload_append"),
+    path("uploads/<uuid:upload_id>/finalize/", views.upload_finalize, name="upload_finalize"),
     path("update_report/<pk>/", UpdateReportView.as_view(), name="update_report"),
     path("delete_report/<pk>/", DeleteReportView.as_view(), name="delete_report"),
     path("dptracking/", DatapacksView.as_view(), name="dptracking"),
     path("update_datapack/<pk>/", UpdateDatapackView.as_view(), name="update_datapack"),
     path('view_file/<int:report_id>/', view_file, name='view_file'),
+    path('view_file/<int:report_id>/lines/', view_file_window, name='view_file_window'),
     path('download_file/<int:report_id>/', download_file, name='download_file'),
+    path('download_files/', download_report_files, name='download_report_files'),
+    path('download_files/<str:datapack_name>/', download_datapack_files, name='download_datapack_files'),
     path('datapack_history/<str:datapack_name>/', DatapackHistoryView.as_view(), name='datapack_history'),
-    path('filter_stats/', filter_stats, name='filter_stats')
+    path('filter_stats/', filter_stats, name='filter_stats'),
+    path('profiling/', views.profiling_view, name='profiling'),
 ]
@@ -0,0 +1,149 @@
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from reports.utils.metrics import Counter, Histogram
+
+# Admission control of the expensive requests (comparisons of result files, exports), so that a few
+# of them cannot take all the workers and leave none to display the reports list.
+#
+# A pool (e.g. "comparison") has ADMISSION_SLOTS[pool] slots, shared by all the processes of the
+# server: a slot is a lock (flock) on the file ADMISSION_DIR/<pool>.<i>. A request waits at most
+# ADMISSION_QUEUE_TIMEOUT seconds for a free slot, then gets Busy. The locks of a process that dies
+# are released by the system: a slot is never lost.
+#
+# The comparisons also get a time budget (COMPARISON_TIME_BUDGET seconds): the parsers check it
+# between two files and regularly while reading one (check_deadline) and stop with TimeBudgetExceeded,
+# freeing the worker, instead of running for as long as the files take.
+
+POLL_INTERVAL = 0.05
+
+_deadline = ContextVar("deadline", default=None)
+
+WAIT = Histogram(
+    "reports_admission_wait_seconds", "Time waited for a slot of an admission pool", ("pool",),
+)
+REJECTED = Counter(
+    "reports_admission_rejected_total", "Requests rejected (no slot, time budget exceeded), by pool and reason",
+    ("pool", "reason"),
+)
+
+
+class Busy(Exception):
+    status = 503
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TimeBudgetExceeded(Exception):
+    pass
+
+
+def _try_slots(pool, slots):
+    """
+    Returns the open file of a free slot of `pool`, locked, or None if all the slots are taken
+    """
+    os.makedirs(settings.ADMISSION_DIR, exist_ok=True)
+    for i in range(slots):
+        slot = open(os.path.join(settings.ADMISSION_DIR, f"{pool}.{i}"), "a")
+        try:
+            fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return slot
+        except BlockingIOError:
+            slot.close()
+    return None
+
+
+def acquire(pool):
+    """
+    Waits for a slot of `pool` and returns it (to release()), None if the pool is unlimited,
+    raises Busy after ADMISSION_QUEUE_TIMEOUT seconds
+    """
+    slots = settings.ADMISSION_SLOTS.get(pool)
+    if not slots:
+        return None
+    start = time.monotonic()
+    deadline = start + settings.ADMISSION_QUEUE_TIMEOUT
+    while True:
+        slot = _try_slots(pool, slots)
+        if slot is not None:
+            WAIT.observe(time.monotonic() - start, pool=pool)
+            return slot
+        if time.monotonic() >= deadline:
+            REJECTED.inc(pool=pool, reason="queue_timeout")
+            raise Busy(
+                f"The server is busy with other {pool}s: please try again in a moment",
+                retry_after=max(1, round(settings.ADMISSION_QUEUE_TIMEOUT)),
+            )
+        time.sleep(POLL_INTERVAL)
+
+
+def release(slot):
+    if slot is not None:
+        # closing the file releases the lock
+        slot.close()
+
+
+@contextmanager
+def admitted(pool):
+    """
+    Runs the block in a slot of `pool`
+    """
+    slot = acquire(pool)
+    try:
+        yield
+    finally:
+        release(slot)
+
+
+class AdmittedStream:
+    """
+    Iterates over `chunks`, in the `slot` held until they are all sent or the response is closed
+    (the client is gone): the slot of a streamed response is held until its end
+    """
+    def __init__(self, slot, chunks):
+        self.slot = slot
+        self.chunks = chunks
+
+    def __iter__(self):
+        try:
+            yield from self.chunks
+        finally:
+            self.close()
+
+    def close(self):
+        release(self.slot)
+        self.slot = None
+
+
+@contextmanager
+def time_budget(seconds, pool):
+    """
+    Gives the block `seconds` (no limit if 0), checked by check_deadline()
+    """
+    if not seconds:
+        yield
+        return
+    token = _deadline.set((time.monotonic() + seconds, seconds, pool))
+    try:
+        yield
+    except TimeBudgetExceeded:
+        REJECTED.inc(pool=pool, reason="time_budget")
+        raise
+    finally:
+        _deadline.reset(token)
+
+
+def check_deadline():
+    """
+    Raises TimeBudgetExceeded if the time budget of the block running is exceeded
+    """
+    deadline = _deadline.get()
+    if deadline is not None and time.monotonic() > deadline[0]:
+        raise TimeBudgetExceeded(f"it took more than {deadline[1]:g}s")
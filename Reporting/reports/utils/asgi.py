@@ -0,0 +1,63 @@
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.http import FileResponse
+
+from reports.utils.executors import run_in
+
+# The ASGI application of the site (see Reporting/asgi.py).
+#
+# Django 4.0 sends the body of a streaming response by iterating over it in the event loop: each
+# read of a file served (FileResponse) would block the loop while the NFS share answers, and the
+# generators of the exports and zips run SQL queries, which is not allowed there. ReportsASGIHandler
+# gets each part of the body in a thread instead: the files in the "file_io" pool (see executors.py),
+# the other streams in the thread of their request, where its DB connection is.
+#
+# Django's own send_response() still sends the response, with an empty body: the parts are sent
+# through the ASGI `send` it is given, just before the end of the body. Only the ASGI protocol is
+# relied upon, not the way Django builds the messages.
+
+# bytes read per trip to the "file_io" pool (Django reads 4KB at a time)
+FILE_BLOCK_SIZE = 256 * 1024
+
+
+def _next_part(iterator):
+    return next(iterator, None)
+
+
+class ReportsASGIHandler(ASGIHandler):
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        iterator = iter(response)
+        if isinstance(response, FileResponse):
+            response.block_size = max(response.block_size, FILE_BLOCK_SIZE)
+            next_part = lambda: run_in("file_io", _next_part, iterator)
+        else:
+            next_part = lambda: sync_to_async(_next_part, thread_sensitive=True)(iterator)
+        # the body is iterated above: Django finds nothing left to send, and still closes the response
+        response.streaming_content = []
+
+        async def send_parts(message):
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                while True:
+                    part = await next_part()
+                    if part is None:
+                        break
+                    for start in range(0, len(part), self.chunk_size):
+                        await send({
+                            "type": "http.response.body", "body": part[start:start + self.chunk_size],
+                            "more_body": True,
+                        })
+            await send(message)
+
+        await super().send_response(response, send_parts)
+
+
+def get_asgi_application():
+    """
+    django.core.asgi.get_asgi_application() with ReportsASGIHandler
+    """
+    django.setup(set_prefix=False)
+    return ReportsASGIHandler()
@@ -1,39 +1,46 @@
+import hashlib
 import re
-import os
-import fnmatch
-import string, random
-from shutil import copy2
+import uuid
 
+from django.conf import settings
 
-def id_generator(size=6, chars=string.ascii_uppercase + string.digits):
-    return "".join(random.choice(chars) for _ in range(size))
+# all the uploaded report files are stored under this directory of the storage
+UPLOAD_ROOT = "Nuance"
 
 
-def getParameterINI(PathToSearch):
-    print(PathToSearch)
+def get_shard(key: str, levels: int = None, width: int = None) -> str:
+    """
+    Returns the shard directories for `key`, e.g. "3f/a2/" for 2 levels of 2 hex characters
+    """
+    levels = settings.UPLOAD_SHARD_LEVELS if levels is None else levels
+    width = settings.UPLOAD_SHARD_WIDTH if width is None else width
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return "".join(f"{digest[i * width:(i + 1) * width]}/" for i in range(levels))
 
-    PathToSearch = PathToSearch.replace("\\", "/")
 
-    # remove mt-nas02.nuance.com from link
-    end_path = re.search(r"EMEA.*$", PathToSearch)
+def is_sharded(name: str, levels: int = None, width: int = None) -> bool:
+    """
+    Returns True if the file `name` is already stored in shard directories
+    """
+    levels = settings.UPLOAD_SHARD_LEVELS if levels is None else levels
+    width = settings.UPLOAD_SHARD_WIDTH if width is None else width
+    directories = name.split("/")[:-1]
+    if len(directories) < levels:
+        return False
+    shard_regex = re.compile(rf"^[0-9a-f]{{{width}}}$")
+    return all(shard_regex.match(directory) for directory in directories[len(directories) - levels:])
 
-    # add mounted drive to link
-    path_folder = "/media/datapack/DP_Test_Results/" + str(end_path.group())
-    print(path_folder)
 
-    # find Parameter*.used in the path
-    for root, dirnames, filenames in os.walk(path_folder):
-        for filename in fnmatch.filter(filenames, "Parameter*.used"):
-            param_file_on_media = os.path.join(root, filename)
-
-    print(param_file_on_media)
-    filename = id_generator() + ".txt"
-    dst = "/usr/local/Reporting/upload/parameters_ini/" + filename
-    copy2(param_file_on_media, dst)
-    url = "/reports/media/parameters_ini/" + filename
-    print(url)
-    return url
+def shard_name(name: str) -> str:
+    """
+    Returns the sharded location of a file stored at `name` in the flat layout
+    """
+    directory, _, filename = name.rpartition("/")
+    return f"{directory}/{get_shard(name)}{filename}"
 
 
 def get_upload_to(instance, filename) -> str:
-    return f"Nuance/{instance.environment}/core/languages/{instance.datapack.topic}/{instance.datapack.language}/{instance.datapack.version}/{instance.testing_type.name}/{filename}"
+    # files are spread over UPLOAD_SHARD_LEVELS levels of directories, so that topics with
+    # many reruns do not pile up thousands of files in a single directory
+    shard = get_shard(f"{uuid.uuid4().hex}/{filename}")
+    return f"{UPLOAD_ROOT}/{instance.environment}/core/languages/{instance.datapack.topic}/{instance.datapack.language}/{instance.datapack.version}/{instance.testing_type.name}/{shard}{filename}"
@@ -0,0 +1,320 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+
+# Incremental, content-addressed backups of the uploaded report files and the DB.
+#
+# <BACKUP_ROOT>/
+#   blobs/ab/ab12...ef.gz            gzipped content of an uploaded file, named after the
+#                                    SHA-256 of the (uncompressed) content
+#   snapshots/2023-03-10T12-00-00/
+#     manifest.json                  {"files": {name: {"sha256", "size", "mtime"}}, "db": ...}
+#     db.sql.gz / db.json.gz         DB dump
+#
+# A snapshot only stores the blobs that no previous snapshot already has, and files whose
+# size and mtime are unchanged since the previous snapshot are not even read again.
+# A snapshot is written to snapshots/<name>.tmp/ and renamed once complete: the .tmp directories
+# left by an interrupted backup are never listed.
+# zlib and hashlib release the GIL, so blobs are hashed and compressed on all cores with threads.
+
+READ_CHUNK_SIZE = 1024 * 1024
+SNAPSHOT_FORMAT = "%Y-%m-%dT%H-%M-%S"
+
+
+class BackupError(Exception):
+    pass
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def blob_path(backup_root, sha256):
+    return os.path.join(backup_root, "blobs", sha256[:2], f"{sha256}.gz")
+
+
+def list_snapshots(backup_root):
+    """
+    Returns the names of the snapshots with a complete manifest, oldest first
+    """
+    snapshots_dir = os.path.join(backup_root, "snapshots")
+    if not os.path.isdir(snapshots_dir):
+        return []
+    names = sorted(name for name in os.listdir(snapshots_dir) if not name.endswith(".tmp"))
+    return [name for name in names if is_complete(backup_root, name)]
+
+
+def load_manifest(backup_root, snapshot):
+    with open(os.path.join(backup_root, "snapshots", snapshot, "manifest.json")) as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("files"), dict) or "db" not in manifest:
+        raise BackupError(f"The manifest of snapshot {snapshot} is incomplete")
+    return manifest
+
+
+def is_complete(backup_root, snapshot):
+    """
+    Whether the manifest of `snapshot` can be read, and the DB dump it names exists
+    """
+    try:
+        manifest = load_manifest(backup_root, snapshot)
+    except (OSError, ValueError, BackupError):
+        return False
+    return not manifest["db"] or os.path.isfile(os.path.join(backup_root, "snapshots", snapshot, manifest["db"]))
+
+
+def hash_file(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def store_blob(backup_root, path, compresslevel, sha256=None):
+    """
+    Stores the content of `path` as a blob, unless it is already stored
+
+    If the hash of the content is not known, it is computed while compressing,
+    so that the file is read only once.
+    Returns (hash of the content, number of bytes written to the backup).
+    """
+    if sha256 and os.path.exists(blob_path(backup_root, sha256)):
+        return sha256, 0
+    blobs_dir = os.path.join(backup_root, "blobs")
+    os.makedirs(blobs_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=blobs_dir, suffix=".tmp")
+    try:
+        with open(path, "rb") as src, os.fdopen(fd, "wb") as raw, \
+                gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=compresslevel, mtime=0) as dst:
+            while True:
+                chunk = src.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                dst.write(chunk)
+        sha256 = digest.hexdigest()
+        destination = blob_path(backup_root, sha256)
+        if os.path.exists(destination):
+            os.remove(tmp_path)
+            return sha256, 0
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return sha256, os.path.getsize(destination)
+
+
+def scan_files(root, storage_root):
+    """
+    Returns {name relative to the storage root: os.stat_result} of every file under `root`
+    """
+    files = {}
+    for directory, dirnames, filenames in os.walk(root):
+        # the hidden directories are not report files, e.g. the chunked uploads being received
+        dirnames[:] = [dirname for dirname in dirnames if not dirname.startswith(".")]
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            try:
+                files[os.path.relpath(path, storage_root).replace(os.sep, "/")] = os.stat(path)
+            except FileNotFoundError:
+                # deleted while scanning
+                continue
+    return files
+
+
+def dump_db(destination):
+    """
+    Writes a consistent, gzipped dump of the DB to `destination` (without the extension),
+    and returns the name of the dump file
+    """
+    db = settings.DATABASES["default"]
+    if connection.vendor == "mysql" and shutil.which("mysqldump"):
+        filename = "db.sql.gz"
+        command = [
+            "mysqldump", "--single-transaction", "--quick", "--routines",
+            f"--host={db['HOST']}", f"--port={db['PORT']}", f"--user={db['USER']}", db["NAME"],
+        ]
+        env = {**os.environ, "MYSQL_PWD": str(db["PASSWORD"])}
+        with gzip.open(f"{destination}.sql.gz", "wb") as dst:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, env=env)
+            shutil.copyfileobj(process.stdout, dst, READ_CHUNK_SIZE)
+            if process.wait() != 0:
+                raise BackupError(f"mysqldump exited with code {process.returncode}")
+        return filename
+
+    # no mysqldump available: dump through the ORM, in a transaction for a consistent view
+    filename = "db.json.gz"
+    with gzip.open(f"{destination}.json.gz", "wt", encoding="utf-8") as dst, transaction.atomic():
+        call_command(
+            "dumpdata", natural_foreign=True, exclude=["contenttypes", "auth.permission", "sessions"],
+            stdout=dst,
+        )
+    return filename
+
+
+def create_snapshot(backup_root, root, storage_root, workers=None, compresslevel=6, with_db=True, log=print):
+    """
+    Backs up the files under `root` and the DB, and returns the name of the new snapshot
+    """
+    workers = workers or default_workers()
+    snapshots = list_snapshots(backup_root)
+    previous = load_manifest(backup_root, snapshots[-1])["files"] if snapshots else {}
+
+    name = datetime.now().strftime(SNAPSHOT_FORMAT)
+    snapshot_dir = os.path.join(backup_root, "snapshots", name)
+    # more than one snapshot in the same second
+    suffix = 0
+    while os.path.exists(snapshot_dir):
+        suffix += 1
+        snapshot_dir = os.path.join(backup_root, "snapshots", f"{name}-{suffix}")
+    name = os.path.basename(snapshot_dir)
+    tmp_dir = f"{snapshot_dir}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    files = scan_files(root, storage_root)
+    manifest = {"created": name, "files": {}, "db": None}
+
+    def backup_file(item):
+        relative_name, stat = item
+        path = os.path.join(storage_root, relative_name)
+        known = previous.get(relative_name)
+        sha256 = None
+        if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+            sha256 = known["sha256"]
+        sha256, written = store_blob(backup_root, path, compresslevel, sha256)
+        return relative_name, {"sha256": sha256, "size": stat.st_size, "mtime": stat.st_mtime}, written
+
+    new_bytes = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(backup_file, files.items())
+        # the DB is dumped while the files are being compressed
+        if with_db:
+            manifest["db"] = dump_db(os.path.join(tmp_dir, "db"))
+        for relative_name, entry, written in results:
+            manifest["files"][relative_name] = entry
+            new_bytes += written
+
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+        # on the disk before the snapshot is listed
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_dir, snapshot_dir)
+    log(f"Snapshot {name}: {len(files)} files, {new_bytes} new compressed bytes, DB dump: {manifest['db']}")
+    return name
+
+
+def prune_snapshots(backup_root, keep, log=print):
+    """
+    Deletes all but the `keep` latest snapshots, and the blobs no remaining snapshot uses
+    """
+    snapshots = list_snapshots(backup_root)
+    if keep <= 0 or len(snapshots) <= keep:
+        return
+    for snapshot in snapshots[:-keep]:
+        shutil.rmtree(os.path.join(backup_root, "snapshots", snapshot))
+        log(f"Deleted snapshot {snapshot}")
+
+    used = set()
+    for snapshot in snapshots[-keep:]:
+        used.update(entry["sha256"] for entry in load_manifest(backup_root, snapshot)["files"].values())
+    blobs_dir = os.path.join(backup_root, "blobs")
+    deleted = 0
+    for directory, dirnames, filenames in os.walk(blobs_dir):
+        for filename in filenames:
+            if filename.endswith(".gz") and filename[:-len(".gz")] not in used:
+                os.remove(os.path.join(directory, filename))
+                deleted += 1
+    log(f"Deleted {deleted} unused blobs")
+
+
+def restore_file(backup_root, sha256, destination, mtime):
+    """
+    Decompresses a blob to `destination`, and returns True if the restored content has the expected hash
+    """
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    digest = hashlib.sha256()
+    tmp_path = f"{destination}.restoring"
+    try:
+        with gzip.open(blob_path(backup_root, sha256), "rb") as src, open(tmp_path, "wb") as dst:
+            while True:
+                chunk = src.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                dst.write(chunk)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if digest.hexdigest() != sha256:
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, destination)
+    os.utime(destination, (mtime, mtime))
+    return True
+
+
+def restore_snapshot(backup_root, snapshot, target, workers=None, log=print):
+    """
+    Rebuilds the files of `snapshot` under `target`, and returns the names of the files that failed verification
+    """
+    workers = workers or default_workers()
+    files = load_manifest(backup_root, snapshot)["files"]
+
+    def restore(item):
+        relative_name, entry = item
+        destination = os.path.join(target, relative_name)
+        # already restored (e.g. a resumed restore)
+        if os.path.exists(destination) and os.path.getsize(destination) == entry["size"] \
+                and hash_file(destination) == entry["sha256"]:
+            return relative_name, True
+        try:
+            return relative_name, restore_file(backup_root, entry["sha256"], destination, entry["mtime"])
+        except (OSError, EOFError):
+            return relative_name, False
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for relative_name, ok in executor.map(restore, files.items()):
+            if not ok:
+                failed.append(relative_name)
+    log(f"Restored {len(files) - len(failed)} of {len(files)} files of snapshot {snapshot}")
+    return failed
+
+
+def restore_db(backup_root, snapshot):
+    dump = load_manifest(backup_root, snapshot)["db"]
+    if not dump:
+        raise BackupError(f"Snapshot {snapshot} has no DB dump")
+    path = os.path.join(backup_root, "snapshots", snapshot, dump)
+    if dump.endswith(".json.gz"):
+        call_command("loaddata", path)
+        return
+
+    db = settings.DATABASES["default"]
+    command = ["mysql", f"--host={db['HOST']}", f"--port={db['PORT']}", f"--user={db['USER']}", db["NAME"]]
+    env = {**os.environ, "MYSQL_PWD": str(db["PASSWORD"])}
+    with gzip.open(path, "rb") as src:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, env=env)
+        shutil.copyfileobj(src, process.stdin, READ_CHUNK_SIZE)
+        process.stdin.close()
+        if process.wait() != 0:
+            raise BackupError(f"mysql exited with code {process.returncode}")
@@ -0,0 +1,106 @@
+import json
+import math
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+# Helpers of the benchmark commands (bench_parsers, bench_views): measurements, and results saved
+# as JSON so that the runs before and after a change can be compared (--baseline).
+
+
+def measure(func, repeat=3):
+    """
+    Calls `func` `repeat` times, and returns the best time (seconds), and the peak memory allocated
+    (bytes, traced by tracemalloc) during one more call
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    # traced separately: tracemalloc slows down the allocations
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+class QueryTimer:
+    """
+    DB execute wrapper (connection.execute_wrapper) counting the queries and their time
+    """
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+def percentile(values, p):
+    """
+    The `p`th percentile of `values` (nearest rank)
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(path, results, **meta):
+    """
+    Saves `results` (a list of dictionaries), with the machine and the commit they were measured on
+    """
+    data = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            **meta,
+        },
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def compare_results(baseline, results, key_fields, metric):
+    """
+    Returns (key, baseline value, value, change in %) of the `metric` of the `results` also in `baseline`,
+    results being matched on their `key_fields`
+    """
+    def key(result):
+        return tuple(result.get(field) for field in key_fields)
+
+    before = {key(result): result[metric] for result in baseline}
+    changes = []
+    for result in results:
+        old = before.get(key(result))
+        if old is not None:
+            changes.append((key(result), old, result[metric], (result[metric] - old) / old * 100 if old else None))
+    return changes
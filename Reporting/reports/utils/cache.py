@@ -0,0 +1,118 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from reports.utils.metrics import CACHE_REQUESTS
+from reports.utils.single_flight import single_flight
+
+# Server-side cache of the rendered tables of the list pages (reports, datapack tracking,
+# datapack history), shared by all the processes (see CACHES in settings.py).
+#
+# The keys contain the current version of the data the table is made of, e.g.
+#   table:reports:<reports version>-<datapacks version>:<hash of the filters>
+# A version is bumped (see signals.py) once a transaction that saved or deleted a Report or a
+# DataPack is committed, so the entries of the previous version are never read again (they
+# expire on their own). Nothing has to know which pages a change affects.
+#
+# The rows of the tracking table are also cached one by one, under the version of their datapack,
+# so that when a report changes only the row of its datapack is rendered again.
+#
+# The tables are cached separately for anonymous and logged in users, who see the Edit/Delete
+# links. Only the tables are cached: the rest of the page has the CSRF token and the user's name.
+#
+# The results of the comparisons of reports are cached the same way, under the versions of the
+# datapacks of the reports (see compare.compare_reports). The requests opening the same comparison
+# at once share the result of the first one (coalesce, see single_flight.py).
+
+REPORTS = "reports"
+DATAPACKS = "datapacks"
+
+
+def datapack(datapack_id):
+    """
+    Name of the version of one datapack and its reports (see the rows of dptracking/body.html)
+    """
+    return f"datapack:{datapack_id}"
+
+
+def _version_key(name):
+    return f"version:{name}"
+
+
+def get_versions(*names):
+    """
+    Returns the current versions of `names`
+    """
+    versions = cache.get_many([_version_key(name) for name in names])
+    result = []
+    for name in names:
+        version = versions.get(_version_key(name))
+        if version is None:
+            # first use, or the entry was culled: start a new version
+            version = time.time_ns()
+            if not cache.add(_version_key(name), version, timeout=None):
+                # set by another process meanwhile
+                version = cache.get(_version_key(name), version)
+        result.append(version)
+    return result
+
+
+def bump_version(*names):
+    """
+    Invalidates everything cached from the data of `names`
+    """
+    # a timestamp rather than an increment: no read-modify-write race between processes
+    cache.set_many({_version_key(name): time.time_ns() for name in names}, timeout=None)
+
+
+def make_key(prefix, versions, *parts):
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return f"{prefix}:{'-'.join(str(version) for version in get_versions(*versions))}:{digest}"
+
+
+def cached(prefix, versions, compute, timeout, *parts, coalesce=False):
+    """
+    Returns the value cached for `parts` and the data of `versions`, or the one returned by `compute()`
+
+    With `coalesce`, the requests missing the same entry at once compute it only once (see single_flight.py).
+    """
+    key = make_key(prefix, versions, *parts)
+    value = cache.get(key)
+    if value is not None:
+        CACHE_REQUESTS.inc(prefix=prefix, result="hit")
+        return value
+    if not coalesce:
+        return _compute(prefix, key, compute, timeout)
+    with single_flight(key):
+        # computed meanwhile by the request that held the lock?
+        value = cache.get(key)
+        if value is not None:
+            CACHE_REQUESTS.inc(prefix=prefix, result="coalesced")
+            return value
+        return _compute(prefix, key, compute, timeout)
+
+
+def _compute(prefix, key, compute, timeout):
+    CACHE_REQUESTS.inc(prefix=prefix, result="miss")
+    value = compute()
+    cache.set(key, value, timeout)
+    return value
+
+
+def cached_render(request, template_name, get_context, prefix, versions, *parts):
+    """
+    Renders `template_name` with the context returned by `get_context()`, unless it is cached
+
+    `parts` are what the rendering depends on besides the data of `versions` (e.g. filters).
+    `get_context` is only called on a cache miss, so the queries it runs are skipped on a hit.
+    """
+    html = cached(
+        f"table:{prefix}", versions, lambda: str(render_to_string(template_name, get_context(), request=request)),
+        settings.TABLE_CACHE_TIMEOUT, request.user.is_authenticated, *parts,
+    )
+    return mark_safe(html)
@@ -0,0 +1,234 @@
+import errno
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from reports.utils.profiling import profiled
+
+# Result files bigger than the nginx client_max_body_size are uploaded in chunks:
+#   1. init      creates a ChunkedUpload and an empty staging file
+#   2. append    writes a chunk at the given offset of the staging file; a client whose
+#                connection dropped asks for the current offset and resumes from there
+#   3. finalize  checks that every byte was received (and the checksum, if the client sent one)
+#   4. the upload is attached to a report when the submission form is saved: the staging file
+#      is renamed to its place in the storage. It is staged in the directory of the uploaded files
+#      (CHUNKED_UPLOAD_DIR), so it is on the same file system and never copied, unless
+#      CHUNKED_UPLOAD_DIR is set to another file system
+#
+# The SHA-256 is computed while the chunks are written. The hash object of an upload is kept in
+# memory by the process that received the last chunk; another process (or a restarted one)
+# hashes the bytes already received once, then continues incrementally.
+
+READ_CHUNK_SIZE = 64 * 1024
+MAX_CACHED_HASHES = 64
+
+_hashes = OrderedDict()
+_hashes_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _storage():
+    # imported here: reports.models imports this package
+    from reports.models import Report
+
+    return Report._meta.get_field("file_report").storage
+
+
+def staging_path(upload):
+    return _storage().path(f"{settings.CHUNKED_UPLOAD_DIR}/{upload.upload_id}.part")
+
+
+def _cached_hash(upload):
+    with _hashes_lock:
+        cached = _hashes.pop(upload.upload_id, None)
+    if cached and cached[0] == upload.offset:
+        return cached[1]
+    sha256 = hashlib.sha256()
+    remaining = upload.offset
+    with open(staging_path(upload), "rb") as f:
+        while remaining:
+            chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise UploadError("The staging file of this upload is truncated", status=410)
+            sha256.update(chunk)
+            remaining -= len(chunk)
+    return sha256
+
+
+def _cache_hash(upload, sha256):
+    with _hashes_lock:
+        _hashes[upload.upload_id] = (upload.offset, sha256)
+        while len(_hashes) > MAX_CACHED_HASHES:
+            _hashes.popitem(last=False)
+
+
+def _forget(upload):
+    with _hashes_lock:
+        _hashes.pop(upload.upload_id, None)
+    try:
+        os.remove(staging_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def get_upload(upload_id, user, lock=False):
+    from reports.models import ChunkedUpload
+
+    uploads = ChunkedUpload.objects.select_for_update() if lock else ChunkedUpload.objects
+    try:
+        return uploads.get(upload_id=upload_id, user=user)
+    except (ChunkedUpload.DoesNotExist, ValueError):
+        raise UploadError("Unknown upload", status=404)
+
+
+def create_upload(user, filename, size):
+    from reports.models import ChunkedUpload
+
+    filename = os.path.basename(str(filename).replace("\\", "/"))
+    if not filename:
+        raise UploadError("Missing file name")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("Missing file size")
+    if size < 0:
+        raise UploadError("Invalid file size")
+
+    purge_expired_uploads()
+    upload = ChunkedUpload.objects.create(user=user, filename=filename[:200], size=size)
+    path = staging_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+    return upload
+
+
+@profiled("file")
+def append_chunk(upload_id, user, offset, stream, length):
+    """
+    Writes `length` bytes read from `stream` at `offset` of the upload
+
+    The offset must be the number of bytes received so far, otherwise UploadError (409) is raised
+    and the client resumes from the offset of the upload. If the stream ends early, the bytes
+    received are kept.
+    """
+    if length > settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadError("Chunk too large", status=413)
+    with transaction.atomic():
+        upload = get_upload(upload_id, user, lock=True)
+        if upload.completed:
+            raise UploadError("This upload is already finalized", status=409)
+        if offset != upload.offset:
+            raise UploadError(f"Expected offset {upload.offset}", status=409)
+        if offset + length > upload.size:
+            raise UploadError("Chunk beyond the end of the file")
+
+        sha256 = _cached_hash(upload)
+        received = 0
+        with open(staging_path(upload), "r+b") as f:
+            f.seek(offset)
+            while received < length:
+                try:
+                    chunk = stream.read(min(READ_CHUNK_SIZE, length - received))
+                except OSError:
+                    # connection dropped
+                    break
+                if not chunk:
+                    break
+                f.write(chunk)
+                sha256.update(chunk)
+                received += len(chunk)
+            # bytes written by an append that was not committed
+            f.truncate()
+        upload.offset += received
+        upload.save(update_fields=["offset", "updated"])
+    _cache_hash(upload, sha256)
+    return upload
+
+
+def finalize_upload(upload_id, user, sha256=None):
+    """
+    Marks the upload as complete, once every byte was received
+
+    If the client sent the SHA-256 of the file and it does not match, the upload is deleted.
+    """
+    with transaction.atomic():
+        upload = get_upload(upload_id, user, lock=True)
+        if upload.completed:
+            return upload
+        if upload.offset != upload.size:
+            raise UploadError(f"Only {upload.offset} of {upload.size} bytes received", status=409)
+        digest = _cached_hash(upload).hexdigest()
+        if not sha256 or sha256.lower() == digest:
+            upload.sha256 = digest
+            upload.completed = True
+            upload.save(update_fields=["sha256", "completed", "updated"])
+    if not upload.completed:
+        upload.delete()
+        _forget(upload)
+        raise UploadError("Checksum mismatch, please upload the file again")
+    with _hashes_lock:
+        _hashes.pop(upload.upload_id, None)
+    return upload
+
+
+@profiled("file")
+def attach_upload(report, upload_id, user):
+    """
+    Saves `report` with the finalized upload as its file
+
+    The staging file is renamed to the location the report's file would have been uploaded to.
+    """
+    storage = _storage()
+    field = report._meta.get_field("file_report")
+    with transaction.atomic():
+        upload = get_upload(upload_id, user, lock=True)
+        if not upload.completed:
+            raise UploadError("The upload of this file is not finished", status=409)
+        name = storage.get_available_name(
+            field.generate_filename(report, upload.filename), max_length=field.max_length
+        )
+        report.file_report.name = name
+        destination = storage.path(name)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        # moved before the report is saved: its listing has the size of the file
+        _move(staging_path(upload), destination)
+        try:
+            report.save()
+            upload.delete()
+        except BaseException:
+            _move(destination, staging_path(upload))
+            raise
+    return report
+
+
+def _move(src, dst):
+    try:
+        os.replace(src, dst)
+    except OSError as err:
+        if err.errno != errno.EXDEV:
+            raise
+        # CHUNKED_UPLOAD_DIR on another file system: copied
+        shutil.move(src, dst)
+
+
+def purge_expired_uploads():
+    from reports.models import ChunkedUpload
+
+    expired = ChunkedUpload.objects.filter(
+        updated__lt=timezone.now() - timedelta(seconds=settings.CHUNKED_UPLOAD_EXPIRY)
+    )
+    for upload in expired:
+        upload.delete()
+        _forget(upload)
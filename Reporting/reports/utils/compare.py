@@ -1,5 +1,14 @@
+import math
+import os
 import re
 import pandas as pd
+from django.conf import settings
+
+from reports.utils import cache
+from reports.utils.admission import Busy, TimeBudgetExceeded, admitted, check_deadline, time_budget
+from reports.utils.memory import MemoryBudgetExceeded, comparison_memory, memory_checkpoint
+from reports.utils.metrics import COMPARISON_BYTES, COMPARISON_DURATION, Timer
+from reports.utils.profiling import profiled, timed
 
 # all the comparison handlers below accept a list of reports as input
 # by the time that these functions are called in ReportsView,
@@ -7,7 +16,61 @@ import pandas as pd
 # 1. all belong to the same datapack type (e.g. eng-USA-GEN)
 # 2. all belong to the same testing type (e.g. accuracy 8k)
 # 3. all have a test result file that was uploaded during submission
-
+#
+# they return numbers (and lists/dictionaries of them), never formatted strings:
+# the same results are displayed by the compare templates and returned by the comparison API
+
+ACCURACY_TYPES = ("MIX_accuracy_test_8k", "MIX_accuracy_test_16k", "NES_accuracy_test_8k")
+TRAVEL_CORPUS_TYPES = (
+    "FAST_DNN_TravelCorpus",
+    "DNN_TravelCorpus",
+    "MIX_TravelCorpus_2.15",
+    "MIX_TravelCorpus_2.22",
+    "NLE_NES_TravelCorpus",
+)
+# test cases of a travel corpus output read between two checks of the memory and time budgets
+CHECK_EVERY = 10000
+# the statistics of a load test, in the order of the checkboxes of compare_load_advanced.html
+LOAD_STATS = ("audio", "audiotx", "lag", "rec", "conf", "avg_latency", "95%_latency", "avg_cpl", "95%_cpl")
+
+
+class ComparisonError(Exception):
+    def __init__(self, message, status=400, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        # seconds, for the Retry-After header of a 503
+        self.retry_after = retry_after
+
+
+def checkpoint():
+    """
+    Called by the parsers between two files and regularly while reading one:
+    stops the comparison if it is over its memory or time budget
+    """
+    memory_checkpoint()
+    check_deadline()
+
+
+def to_number(value):
+    """
+    Returns `value` (a string read from a result file) as an int or a float, or unchanged if it is not a number
+
+    "nan" and "inf" are returned as None: they cannot be written in JSON.
+    """
+    if not isinstance(value, str):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return number if math.isfinite(number) else None
+
+
+@profiled("parse_compare_accuracy")
 def compare_accuracy(reports):
     res = []
     report_files = [report.file_report.path for report in reports]
@@ -18,14 +81,16 @@ def compare_accuracy(reports):
     # therefore, we go through the uploaded files one by one and get the WER difference
 
     for report_file in report_files:
-        with open(report_file, "r") as f:
+        with open(report_file, "r") as f, timed("file"):
             content = f.readlines()
-            result_line = content[2]
-            WER_diff = result_line.split(" ")[-1].replace("\n", "")
-            res.append(WER_diff)
+        checkpoint()
+        result_line = content[2]
+        WER_diff = result_line.split(" ")[-1].replace("\n", "")
+        res.append(to_number(WER_diff))
 
     return res
 
+@profiled("parse_compare_travel_corpus")
 def compare_travel_corpus(reports):
     report_files = [report.file_report.path for report in reports]
 
@@ -65,6 +130,8 @@ def compare_travel_corpus(reports):
 
                 if re.search("^response:", line):
                     n_test_cases += 1
+                    if n_test_cases % CHECK_EVERY == 0:
+                        checkpoint()
                 elif re.search("mine :", line):
                     n_fails += 1
                     fails.append(line.strip())
@@ -79,11 +146,13 @@ def compare_travel_corpus(reports):
                 "n_intent_fails": n_intent_fails,
                 "fail_rate": n_fails/n_test_cases if n_test_cases else 0,
                 "intent_fail_rate": n_intent_fails/n_test_cases if n_test_cases else 0,
-                "fails_and_expected": zip(fails, expected),
+                "fails_and_expected": list(zip(fails, expected)),
             })
+        checkpoint()
 
     return results_of_reports
 
+@profiled("parse_compare_NTE5")
 def compare_NTE5(reports):
     # NTE5 testing type tests various "features" for their functionality (to see if they work)
     # there will be multiple test cases for each feature
@@ -107,6 +176,7 @@ def compare_NTE5(reports):
     for report_file in report_files:
         df = pd.read_csv(report_file)
         dataframes.append(df)
+        checkpoint()
 
     # for each csv file, get all the test cases and their verdicts
     results_per_report = []
@@ -233,6 +303,7 @@ def compare_NTE5(reports):
         "features_and_results": features_and_results,
     }
 
+@profiled("parse_compare_load")
 def compare_load(reports):
     report_files = [report.file_report.path for report in reports]
 
@@ -245,6 +316,7 @@ def compare_load(reports):
     }
     for report_file in report_files:
         df = pd.read_excel(report_file)
+        checkpoint()
         ##############################################
         # a string of the following format is expected:
         #    krypton distribution:   sequential preloaded (18 kryptons) - parallel noDLM/dynamic  (15 kryptons - i.e. 2/4/5/4 kr)
@@ -257,11 +329,11 @@ def compare_load(reports):
         dynamic_dlm_1000_oovs = re.findall('\d+', substrings_bw_brackets[1])[3]
         dynamic_dlm_10000_oovs = re.findall('\d+', substrings_bw_brackets[1])[4]
 
-        res["preloaded_dlm"].append(preloaded_dlm)
-        res["no_dlm"].append(no_dlm)
-        res["dynamic_dlm_100_oovs"].append(dynamic_dlm_100_oovs)
-        res["dynamic_dlm_1000_oovs"].append(dynamic_dlm_1000_oovs)
-        res["dynamic_dlm_10000_oovs"].append(dynamic_dlm_10000_oovs)
+        res["preloaded_dlm"].append(int(preloaded_dlm))
+        res["no_dlm"].append(int(no_dlm))
+        res["dynamic_dlm_100_oovs"].append(int(dynamic_dlm_100_oovs))
+        res["dynamic_dlm_1000_oovs"].append(int(dynamic_dlm_1000_oovs))
+        res["dynamic_dlm_10000_oovs"].append(int(dynamic_dlm_10000_oovs))
 
     return res
 
@@ -271,7 +343,7 @@ def compare_load(reports):
 # Returns: a dictionary with the following format:
 # {
 # "loadTest100_oov-20221129-221043-19ch": {
-#     "kryptons": "19",
+#     "kryptons": 19,
 #     "stats": {
 #         "audio": result,
 #         "audiotx": result,
@@ -290,8 +362,10 @@ def compare_load(reports):
 #     ],
 #     "calls": result,
 #     "recognitions": result,
-#     "success": result
+#     "success": result,
+#     "errors": [line, ...]
 # }, ...
+# where the results are numbers (see to_number)
 def parse_load_test_txt(load_test):
     testHeader = re.compile("^loadTest.*ch:")
     testNameIndexMap = {}
@@ -322,23 +396,23 @@ def parse_load_test_txt(load_test):
             if str(i) in testNameIndexMap:
                 testNameKey = testNameIndexMap[str(i)]
                 testMap[testNameKey] = {}
-                testMap[testNameKey]["kryptons"] = loadTestLines[i].split(
-                    "-")[-1].split("ch")[0]
+                testMap[testNameKey]["kryptons"] = to_number(loadTestLines[i].split(
+                    "-")[-1].split("ch")[0])
                 testMap[testNameKey]["stats"] = {}
                 testMap[testNameKey]["monitors"] = []
                 testMap[testNameKey]["errors"] = []
                 continue
             if " calls" in loadTestLines[i]:
                 numCalls = loadTestLines[i].split()[0]
-                testMap[testNameKey]["calls"] = numCalls
+                testMap[testNameKey]["calls"] = to_number(numCalls)
                 continue
             if " recognitions:" in loadTestLines[i]:
                 numRecognitions = loadTestLines[i].split()[0]
-                testMap[testNameKey]["recognitions"] = numRecognitions
+                testMap[testNameKey]["recognitions"] = to_number(numRecognitions)
                 continue
             if " Success" in loadTestLines[i]:
                 numSuccess = loadTestLines[i].split()[0]
-                testMap[testNameKey]["success"] = numSuccess
+                testMap[testNameKey]["success"] = to_number(numSuccess)
 
                 # parse errors below success until stats
                 errInd = i +1
@@ -351,24 +425,25 @@ def parse_load_test_txt(load_test):
                 while "monitors" not in loadTestLines[j]:
                     if "latency " in loadTestLines[j]:
                         latency = loadTestLines[j].split()
-                        testMap[testNameKey]["stats"]["avg_latency"] = latency[1][:-1]
-                        testMap[testNameKey]["stats"]["95%_latency"] = latency[-1]
+                        testMap[testNameKey]["stats"]["avg_latency"] = to_number(latency[1][:-1])
+                        testMap[testNameKey]["stats"]["95%_latency"] = to_number(latency[-1])
                     elif "cpl " in loadTestLines[j]:
                         cpl = loadTestLines[j].split()
-                        testMap[testNameKey]["stats"]["avg_cpl"] = cpl[1][:-1]
-                        testMap[testNameKey]["stats"]["95%_cpl"] = cpl[-1]
+                        testMap[testNameKey]["stats"]["avg_cpl"] = to_number(cpl[1][:-1])
+                        testMap[testNameKey]["stats"]["95%_cpl"] = to_number(cpl[-1])
                     else:
                         statLineArr = loadTestLines[j].split()
                         testMap[testNameKey]["stats"][statLineArr[0]
-                                                        ] = statLineArr[1]
+                                                        ] = to_number(statLineArr[1])
                     j += 1
                 continue
             if "monitors:" in loadTestLines[i]:
                 j = i+2
-                while "loadTest" not in loadTestLines[j]:
+                # the monitors of the last test end with the file
+                while j < n and "loadTest" not in loadTestLines[j]:
                     monitorData = loadTestLines[j].split()
                     testMap[testNameKey]["monitors"].append(
-                        {"host": monitorData[2], "cpu": monitorData[0], "mem": monitorData[1]})
+                        {"host": monitorData[2], "cpu": to_number(monitorData[0]), "mem": to_number(monitorData[1])})
                     j += 1
                 continue
 
@@ -397,39 +472,11 @@ def get_subtest_type(test_header):
         return ""
 
 
-# Input: a single level dictionary
-# Returns: a string separating the dictionary elements by newline characters
-def dict_to_str(data_dict):
-    res = ""
-    for key in data_dict:
-        res += f"{key}: {data_dict[key]}\n"
-    return res
-
-def str_to_dict(dict_str):
-    res = {}
-    newlines_removed = dict_str.split("\n")
-    for keyval in newlines_removed:
-        tmp = keyval.split(":")
-        res[tmp[0]] = tmp[1].strip()
-    return res
-
-
-# Input: the parsed test data from a load test file, and the stats which are
-#        not to be discarded during filtering
-# Returns: the parsed test data with the stats filtered
-def filter_stats_func(parsed_data, checked_stats):
-    for test in parsed_data:
-        stats_filtered = {}
-        for stat in parsed_data[test]["stats"]:
-            if stat in checked_stats:
-                stats_filtered[stat] = parsed_data[test]["stats"][stat]
-        parsed_data[test]["stats"] = stats_filtered
-    return parsed_data
-
-
-# Input: an array of 2 report models (corresponding to load tests) to be compared
+# Input: an array of 2 report models (corresponding to load tests) to be compared,
+#        and the statistics to keep (all of them if None)
 # Returns: a dictionary of compared data between 2 reports
-def compare_load_advanced(reports, discard_singleton=False, convert_dict=True):
+@profiled("parse_compare_load_advanced")
+def compare_load_advanced(reports, discard_singleton=False, stats=None):
     report_files = [report.file_report.path for report in reports]
 
     compared_data = ["stats", "monitors", "calls",
@@ -447,8 +494,9 @@ def compare_load_advanced(reports, discard_singleton=False, convert_dict=True):
         }
 
     for report_file in report_files:
-        fp = open(report_file)
-        parsed_test_data = parse_load_test_txt(fp)
+        with open(report_file) as fp:
+            parsed_test_data = parse_load_test_txt(fp)
+        checkpoint()
         subtest_seen_map = {
             "preloaded_dlm_100_oovs": False,
             "preloaded_dlm_1000_oovs": False,
@@ -475,35 +523,121 @@ def compare_load_advanced(reports, discard_singleton=False, convert_dict=True):
                     # clear subarray within dictionary
                     res[data_type][subtest] = []
 
-    if convert_dict:
-        #convert dictionaries (stats) on topmost level
-        for test_type in res["stats"]:
-            stat_strs = []
-            for stat in res["stats"][test_type]:
-                stat_strs.append(dict_to_str(stat))
-            res["stats"][test_type] = stat_strs
-        
-        for test_type in res["monitors"]:
-            monitors_strs = []
-            for monitors in res["monitors"][test_type]:
-                single_monitor_str = ""
-                for monitor in monitors:
-                    single_monitor_str += dict_to_str(monitor)
-                    single_monitor_str += "\n "
-                monitors_strs.append(single_monitor_str)
-            res["monitors"][test_type] = monitors_strs
-
-        for test_type in res["errors"]:
-            errs = []
-            for errArr in res["errors"][test_type]:
-                if len(errArr) == 0:
-                    errs.append("No Errors")
-                else:
-                    errJoined = ""
-                    for errStr in errArr:
-                        errJoined += f"{errStr}\n"
-                    errs.append(errJoined)
-            res["errors"][test_type] = errs
-    res["accuracy"] = [report.accuracy for report in reports]
+    if stats is not None:
+        res = select_stats(res, stats)
+    res["accuracy"] = [to_number(report.accuracy) for report in reports]
                     
-    return res
\ No newline at end of file
+    return res
+
+
+def select_stats(res, stats):
+    """
+    Returns the comparison of load tests `res` with only the statistics `stats`
+    """
+    return {
+        **res,
+        "stats": {
+            subtest: [
+                {stat: value for stat, value in test_stats.items() if stat in stats} for test_stats in stats_per_report
+            ]
+            for subtest, stats_per_report in res["stats"].items()
+        },
+    }
+
+
+def get_datapack_type(name):
+    """
+    Returns the datapack name with the version stripped off
+    """
+    # e.g. fra-FRA-GEN-4.0.0 and fra-FRA-GEN-4.1.0 both have the same type: fra-FRA-GEN
+    language, country, topic, version = name.split("-")
+    return f"{language}-{country}-{topic}"
+
+
+def is_same_testing_type(testing_types):
+    """
+    Whether reports of `testing_types` can be compared together
+    """
+    # the travel corpus testing types produce the same result files
+    return len(set(testing_types)) == 1 or all("TravelCorpus" in testing_type for testing_type in testing_types)
+
+
+def check_comparable(reports):
+    """
+    Raises ComparisonError if `reports` do not meet the conditions at the top of this file
+    """
+    if len({get_datapack_type(report.datapack.name) for report in reports}) > 1:
+        raise ComparisonError("The reports are not for the same datapack type")
+    if not is_same_testing_type([report.testing_type.name for report in reports]):
+        raise ComparisonError("The reports are not for the same testing type")
+    missing_file = [report.id for report in reports if not report.file_report]
+    if missing_file:
+        raise ComparisonError(f"Reports without a result file: {missing_file}")
+
+
+def select_fields(result, fields):
+    """
+    Returns the comparison `result` with only the keys `fields` of its dictionaries (top level, or one per report)
+    """
+    if isinstance(result, dict):
+        return {key: value for key, value in result.items() if key in fields}
+    return [select_fields(item, fields) if isinstance(item, dict) else item for item in result]
+
+
+def run_comparison(reports, testing_type):
+    try:
+        COMPARISON_BYTES.observe(
+            sum(os.path.getsize(report.file_report.path) for report in reports), testing_type=testing_type,
+        )
+        # only the comparisons not cached take a slot
+        with admitted("comparison"), time_budget(settings.COMPARISON_TIME_BUDGET, "comparison"):
+            with Timer(COMPARISON_DURATION, testing_type=testing_type), comparison_memory(testing_type):
+                return compare_files(reports, testing_type)
+    except FileNotFoundError as err:
+        raise ComparisonError(f"The result file {os.path.basename(err.filename or '')} is missing", status=404)
+    except MemoryBudgetExceeded as err:
+        raise ComparisonError(f"The comparison needs too much memory ({err}): please compare fewer or smaller files", status=503)
+    except Busy as err:
+        raise ComparisonError(str(err), status=err.status, retry_after=err.retry_after)
+    except TimeBudgetExceeded as err:
+        raise ComparisonError(
+            f"The server is busy: the comparison was stopped ({err}). "
+            "Please try again later, or compare fewer or smaller files",
+            status=503, retry_after=settings.COMPARISON_TIME_BUDGET,
+        )
+
+
+def compare_files(reports, testing_type):
+    # different testing types test different things, and thus produce different result files
+    # this means that the comparison of accuracy test results
+    # is handled differently from the comparison of travel corpus test results
+    if testing_type in ACCURACY_TYPES:
+        return compare_accuracy(reports)
+    if testing_type == "NTE5":
+        return compare_NTE5(reports)
+    if testing_type in TRAVEL_CORPUS_TYPES:
+        return compare_travel_corpus(reports)
+    if testing_type == "load_test":
+        return compare_load_advanced(reports, True)
+    return []
+
+
+def compare_reports(reports, testing_type, stats=None):
+    """
+    Compares `reports` (see the conditions at the top of this file) with the handler of `testing_type`
+
+    `stats` are the statistics of the load tests to keep (all of them if None).
+    Returns [] if the testing type has no comparison.
+
+    The results are cached until one of the reports (or its datapack) is saved: filtering the
+    statistics of a comparison that was displayed does not read the files again. The same comparison
+    requested by several users at once is run once, by all the server processes.
+    """
+    result = cache.cached(
+        "comparison", [cache.datapack(report.datapack_id) for report in reports],
+        lambda: run_comparison(reports, testing_type), settings.COMPARISON_CACHE_TIMEOUT,
+        testing_type, [(report.id, report.file_report.name) for report in reports], coalesce=True,
+    )
+    if stats is not None and testing_type == "load_test":
+        result = select_stats(result, stats)
+    return result
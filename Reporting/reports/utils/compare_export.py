@@ -0,0 +1,145 @@
+import tempfile
+
+from openpyxl import Workbook
+
+from reports.utils.admission import Busy, admitted
+from reports.utils.compare import ACCURACY_TYPES, LOAD_STATS, TRAVEL_CORPUS_TYPES, ComparisonError
+
+# Export of the comparison tables (see templates/reports/compare) as CSV or XLSX.
+#
+# Each table is a generator of rows (lists of cells, the numbers as numbers), so that the rows are
+# written out one by one: the CSV is streamed to the client as it is produced, the XLSX is written
+# with openpyxl's write-only mode, which keeps the rows in a temporary file instead of in memory,
+# and sent once complete. Building a workbook takes a slot of the "export" pool.
+
+TRAVEL_CORPUS_FIELDS = (
+    ("Number of Test Cases", "n_test_cases"),
+    ("Number of Failures", "n_fails"),
+    ("Number of Intent Failures", "n_intent_fails"),
+    ("Failure Rate", "fail_rate"),
+    ("Intent Failure Rate", "intent_fail_rate"),
+)
+LOAD_SUBTESTS = (
+    ("preloaded_dlm_100_oovs", "Preloaded DLM (100 oovs)"),
+    ("preloaded_dlm_1000_oovs", "Preloaded DLM (1000 oovs)"),
+    ("preloaded_dlm_10000_oovs", "Preloaded DLM (10000 oovs)"),
+    ("no_dlm", "No DLM"),
+    ("dynamic_dlm_100_oovs", "Dynamically loaded DLM (100 oovs)"),
+    ("dynamic_dlm_1000_oovs", "Dynamically loaded DLM (1000 oovs)"),
+    ("dynamic_dlm_10000_oovs", "Dynamically loaded DLM (10000 oovs)"),
+)
+LOAD_COUNTS = ("calls", "recognitions", "success", "kryptons")
+
+
+def header_rows(reports, *labels):
+    """
+    The datapacks and the names of the compared reports, after the columns `labels`
+    """
+    blank = [""] * (len(labels) - 1)
+    yield [*labels, *(report.datapack.name for report in reports)]
+    yield ["Report", *blank, *(report.name for report in reports)]
+
+
+def accuracy_rows(reports, result):
+    yield from header_rows(reports, "")
+    yield ["WER Difference (WER w/o DLM - WER w/ DLM)", *result]
+
+
+def travel_corpus_rows(reports, result):
+    yield from header_rows(reports, "")
+    for label, field in TRAVEL_CORPUS_FIELDS:
+        yield [label, *(results[field] for results in result)]
+    n_failures = max((len(results["fails_and_expected"]) for results in result), default=0)
+    for i in range(n_failures):
+        yield [
+            f"Failure {i + 1}",
+            *(
+                "\n".join(results["fails_and_expected"][i]) if i < len(results["fails_and_expected"]) else None
+                for results in result
+            ),
+        ]
+    yield ["Notes", *(report.notes for report in reports)]
+
+
+def NTE5_rows(reports, result):
+    yield from header_rows(reports, "", "")
+    for feature, values in sorted(result["features_and_results"].items()):
+        yield ["Feature", feature, *values]
+    for test_case, values in sorted(result["test_cases_w_diff_results"].items()):
+        yield ["Different results", test_case, *values]
+    for test_case in sorted(result["common_passed_test_cases"]):
+        yield ["Passed by all", test_case]
+    for test_case in sorted(result["common_failed_test_cases"]):
+        yield ["Failed by all", test_case]
+
+
+def load_rows(reports, result):
+    yield from header_rows(reports, "data type", "subtest", "")
+    yield ["accuracy", "", "", *result["accuracy"]]
+    for subtest, label in LOAD_SUBTESTS:
+        stats = result["stats"][subtest]
+        names = [stat for stat in LOAD_STATS if any(stat in test_stats for test_stats in stats)]
+        # and the statistics of the file that are not known
+        names += sorted({stat for test_stats in stats for stat in test_stats} - set(names))
+        for stat in names:
+            yield ["stats", label, stat, *(test_stats.get(stat) for test_stats in stats)]
+    for subtest, label in LOAD_SUBTESTS:
+        monitors = result["monitors"][subtest]
+        for i in range(max((len(test_monitors) for test_monitors in monitors), default=0)):
+            for field in ("host", "cpu", "mem"):
+                yield [
+                    "monitors", label, f"{field} {i + 1}",
+                    *(test_monitors[i][field] if i < len(test_monitors) else None for test_monitors in monitors),
+                ]
+    for data_type in LOAD_COUNTS:
+        for subtest, label in LOAD_SUBTESTS:
+            if result[data_type][subtest]:
+                yield [data_type, label, "", *result[data_type][subtest]]
+    for subtest, label in LOAD_SUBTESTS:
+        if result["errors"][subtest]:
+            yield ["errors", label, "", *("\n".join(errors) or "No Errors" for errors in result["errors"][subtest])]
+
+
+def comparison_rows(reports, testing_type, result):
+    """
+    Returns the rows of the table of the comparison `result` of `reports` (see compare.compare_reports)
+    """
+    if testing_type in ACCURACY_TYPES:
+        return accuracy_rows(reports, result)
+    if testing_type == "NTE5":
+        return NTE5_rows(reports, result)
+    if testing_type in TRAVEL_CORPUS_TYPES:
+        return travel_corpus_rows(reports, result)
+    if testing_type == "load_test":
+        return load_rows(reports, result)
+    return iter([])
+
+
+def write_xlsx(rows, title):
+    """
+    Writes `rows` to a new workbook in a temporary file, and returns the file (at its start)
+
+    The workbook is not streamed: a zip can only be sent once it is complete, so the whole
+    of it is on the disk before the first byte is sent (see admitted_xlsx())
+    """
+    workbook = Workbook(write_only=True)
+    # the title of a sheet is at most 31 characters
+    sheet = workbook.create_sheet(title[:31])
+    for row in rows:
+        sheet.append(row)
+    file = tempfile.TemporaryFile()
+    workbook.save(file)
+    file.seek(0)
+    return file
+
+
+def admitted_xlsx(rows, title):
+    """
+    write_xlsx() in a slot of the "export" pool, like the other exports: raises ComparisonError
+    if there is no free slot within ADMISSION_QUEUE_TIMEOUT
+    """
+    try:
+        with admitted("export"):
+            return write_xlsx(rows, title)
+    except Busy as err:
+        raise ComparisonError(str(err), status=err.status, retry_after=err.retry_after)
@@ -0,0 +1,60 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.views.decorators.http import condition
+
+from reports.utils.cache import get_versions
+
+# Conditional GET (ETag / Last-Modified) for the pages and JSON lists built from the reports
+# and datapacks: a client that already has the current version gets a 304 Not Modified.
+#
+# The validators come from the versions of the data (see cache.py), read from the cache without
+# any query. A version is the time it was last bumped, so it is also the Last-Modified date.
+# The ETag also covers what the page shows besides the data: the user (navbar, Edit/Delete links),
+# the CSRF cookie the forms' tokens are made from, and the templates and static files deployed.
+
+
+def _assets_stamp():
+    stamp = 0
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for top in [os.path.join(app_dir, "templates"), *map(str, settings.STATICFILES_DIRS)]:
+        for directory, dirnames, filenames in os.walk(top):
+            for filename in filenames:
+                stamp = max(stamp, os.stat(os.path.join(directory, filename)).st_mtime_ns)
+    return stamp
+
+
+ASSETS_STAMP = _assets_stamp()
+
+
+def data_etag(request, versions, *parts):
+    user = request.user
+    key = [
+        *get_versions(*versions), ASSETS_STAMP,
+        user.pk if user.is_authenticated else None, request.META.get("CSRF_COOKIE"), *parts,
+    ]
+    return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+
+def data_last_modified(versions):
+    return datetime.fromtimestamp(max(get_versions(*versions)) / 1e9, tz=timezone.utc)
+
+
+def conditional_on(*versions):
+    """
+    View decorator: answers GET/HEAD requests with 304 Not Modified if the data of
+    `versions` (e.g. cache.REPORTS) did not change since the client got the page
+
+    The URL arguments of the view are part of the ETag.
+    """
+    return condition(
+        etag_func=lambda request, *args, **kwargs: data_etag(
+            request, versions, request.get_full_path(), sorted(kwargs.items())
+        ),
+        last_modified_func=lambda request, *args, **kwargs: (
+            # the page also depends on the user: only validated by the ETag
+            None if request.user.is_authenticated else data_last_modified(versions)
+        ),
+    )
@@ -0,0 +1,52 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+
+# Bounded thread pools of the async views (file serving and comparisons, see views.py).
+#
+# The blocking work of these requests (reads of the result files on the NFS share, parsers of the
+# comparisons) runs in a pool of EXECUTOR_THREADS[name] threads, so that the event loop of an ASGI
+# server keeps serving the other requests meanwhile. Each kind of work has its own pool: a flood of
+# slow downloads cannot delay the comparisons, and the other way around. The work beyond the size
+# of a pool waits for a thread.
+#
+# The functions run there must not use the DB: the connections are per thread, and a view's
+# queries belong in its sync_to_async() code.
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # the threads of the parent are not in the child (e.g. a preloaded gunicorn master)
+    _executors.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_executor(name):
+    with _lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = _executors[name] = ThreadPoolExecutor(
+                settings.EXECUTOR_THREADS[name], thread_name_prefix=f"reports-{name}",
+            )
+        return executor
+
+
+async def run_in(name, func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) in the pool `name` and returns its result, in the context of the caller
+    (the profile of the request, the time budget of a comparison)
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        get_executor(name), partial(context.run, func, *args, **kwargs),
+    )
@@ -0,0 +1,110 @@
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Deferred, batched deletion of uploaded files that are no longer referenced.
+#
+# Files are only queued once the transaction that unreferenced them has been committed
+# (a rolled back delete/update never loses its file), and are deleted by a background
+# thread in batches, outside of the request. Right before deleting, one query per batch
+# checks that no report references the file anymore.
+#
+# Anything lost from the queue (e.g. the worker process is killed) is left as an orphan,
+# which `python manage.py reconcile_files` finds and cleans up.
+
+BATCH_SIZE = 100
+# seconds the worker waits for more files before deleting a batch
+BATCH_WAIT = 2.0
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def schedule_delete(name):
+    """
+    Deletes the file `name` (relative to the storage of Report.file_report)
+    once the current transaction is committed
+    """
+    if name:
+        transaction.on_commit(lambda: enqueue(name))
+
+
+def enqueue(name):
+    _queue.put(name)
+    if getattr(settings, "FILE_GC_ASYNC", True):
+        _ensure_worker()
+    else:
+        flush()
+
+
+def flush():
+    """
+    Deletes every queued file now, in the calling thread
+    """
+    while True:
+        batch = _take_batch(block=False)
+        if not batch:
+            return
+        _delete_batch(batch)
+
+
+def _take_batch(block):
+    batch = []
+    try:
+        batch.append(_queue.get(block=block))
+        while len(batch) < BATCH_SIZE:
+            batch.append(_queue.get(timeout=BATCH_WAIT) if block else _queue.get_nowait())
+    except queue.Empty:
+        pass
+    return batch
+
+
+def _delete_batch(batch):
+    # imported here: this module is imported by models.py through signals.py
+    from reports.models import Report
+
+    storage = Report._meta.get_field("file_report").storage
+    still_referenced = set(
+        Report.objects.filter(file_report__in=batch).values_list("file_report", flat=True)
+    )
+    for name in set(batch) - still_referenced:
+        try:
+            storage.delete(name)
+        except OSError as err:
+            logger.warning("Could not delete %s: %s", name, err)
+
+
+def _run():
+    while True:
+        batch = _take_batch(block=True)
+        try:
+            close_old_connections()
+            _delete_batch(batch)
+        except Exception:
+            logger.exception("File garbage collection failed for %d files", len(batch))
+        finally:
+            close_old_connections()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="file-gc", daemon=True)
+            _worker.start()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        # the DB may already be unavailable; reconcile_files handles leftovers
+        pass
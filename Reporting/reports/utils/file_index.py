@@ -0,0 +1,192 @@
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from array import array
+from functools import lru_cache
+
+from django.conf import settings
+
+from reports.utils.profiling import profiled
+
+# Large text result files (e.g. a 200 MB travel corpus console output) are never
+# loaded into memory as a whole. Instead, we build a sparse line-offset index once
+# per file: the byte offset of every CHECKPOINT_EVERY-th line.
+#
+# To show lines [start, start + count), we seek to the closest checkpoint and read
+# forward at most CHECKPOINT_EVERY - 1 lines before the window begins.
+#
+# The index is cached in memory (per worker) and on disk (shared between workers),
+# and is invalidated whenever the size or mtime of the file changes.
+
+CHECKPOINT_EVERY = 1000
+READ_CHUNK_SIZE = 1024 * 1024
+
+# on-disk header: magic, checkpoint interval, file size, file mtime (ns), # of lines
+_HEADER = struct.Struct("<8sQQqQ")
+_MAGIC = b"RPTIDX01"
+
+
+class NotTextFile(ValueError):
+    """
+    The file is binary (e.g. .xlsx, .zip): it has no lines to index
+    """
+
+
+class LineIndex:
+    def __init__(self, path, offsets, n_lines, size, mtime_ns):
+        self.path = path
+        # offsets[i] == byte offset of line (i * CHECKPOINT_EVERY), 0-based lines
+        self.offsets = offsets
+        self.n_lines = n_lines
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @classmethod
+    def build(cls, path):
+        stat = os.stat(path)
+        offsets = array("Q", [0])
+        n_lines = 0
+        position = 0
+        last_byte = b""
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                # text files have no NUL bytes, the binary formats have some in their first block
+                if not position and b"\0" in chunk[:8192]:
+                    raise NotTextFile(f"{os.path.basename(path)} is not a text file")
+                start = 0
+                while True:
+                    newline = chunk.find(b"\n", start)
+                    if newline == -1:
+                        break
+                    n_lines += 1
+                    if n_lines % CHECKPOINT_EVERY == 0:
+                        offsets.append(position + newline + 1)
+                    start = newline + 1
+                position += len(chunk)
+                last_byte = chunk[-1:]
+
+        # a last line without a trailing newline is still a line
+        if position and last_byte != b"\n":
+            n_lines += 1
+        # drop a checkpoint pointing at the very end of the file
+        if len(offsets) > 1 and offsets[-1] >= position:
+            offsets.pop()
+        return cls(path, offsets, n_lines, stat.st_size, stat.st_mtime_ns)
+
+    def is_stale(self, stat):
+        return stat.st_size != self.size or stat.st_mtime_ns != self.mtime_ns
+
+    def to_bytes(self):
+        header = _HEADER.pack(_MAGIC, CHECKPOINT_EVERY, self.size, self.mtime_ns, self.n_lines)
+        return header + self.offsets.tobytes()
+
+    @classmethod
+    def from_bytes(cls, path, data):
+        magic, every, size, mtime_ns, n_lines = _HEADER.unpack_from(data)
+        if magic != _MAGIC or every != CHECKPOINT_EVERY:
+            raise ValueError("Incompatible line index")
+        offsets = array("Q")
+        offsets.frombytes(data[_HEADER.size:])
+        return cls(path, offsets, n_lines, size, mtime_ns)
+
+    @profiled("file")
+    def read_lines(self, start, count):
+        """
+        Returns [(line_number, text), ...] for the 1-based lines [start, start + count)
+        """
+        if count <= 0 or start > self.n_lines:
+            return []
+        start = max(start, 1)
+        checkpoint = (start - 1) // CHECKPOINT_EVERY
+        to_skip = (start - 1) % CHECKPOINT_EVERY
+
+        lines = []
+        with open(self.path, "rb") as f:
+            f.seek(self.offsets[checkpoint])
+            for _ in range(to_skip):
+                if not f.readline():
+                    return []
+            for line_number in range(start, start + count):
+                line = f.readline()
+                if not line:
+                    break
+                lines.append((line_number, line.rstrip(b"\r\n").decode("utf-8", errors="replace")))
+        return lines
+
+    def line_of(self, mm, offset):
+        """
+        Returns the 1-based line number containing the byte at `offset`
+        """
+        checkpoint = bisect.bisect_right(self.offsets, offset) - 1
+        return checkpoint * CHECKPOINT_EVERY + mm[self.offsets[checkpoint]:offset].count(b"\n") + 1
+
+    @profiled("file")
+    def search(self, query, from_line=1):
+        """
+        Returns the 1-based line number of the first line containing the text `query` on or after
+        `from_line`, or None if there is no match.
+
+        The file is memory-mapped, so only the pages between the starting line and the hit are read.
+        Regular expressions are not supported: some patterns take exponential time on a single line.
+        """
+        if not query or self.size == 0 or from_line > self.n_lines:
+            return None
+
+        needle = query.encode("utf-8")
+        from_line = max(from_line, 1)
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            checkpoint = (from_line - 1) // CHECKPOINT_EVERY
+            position = self.offsets[checkpoint]
+            for _ in range((from_line - 1) % CHECKPOINT_EVERY):
+                position = mm.find(b"\n", position) + 1
+
+            hit = mm.find(needle, position)
+            if hit == -1:
+                return None
+            return self.line_of(mm, hit)
+
+
+def _index_cache_path(path):
+    key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+    return os.path.join(settings.FILE_INDEX_CACHE_DIR, f"{key}.idx")
+
+
+@lru_cache(maxsize=64)
+def _get_index(path, size, mtime_ns):
+    cache_path = _index_cache_path(path)
+    try:
+        with open(cache_path, "rb") as f:
+            index = LineIndex.from_bytes(path, f.read())
+        if index.size == size and index.mtime_ns == mtime_ns:
+            return index
+    except (OSError, ValueError, struct.error):
+        pass
+
+    index = LineIndex.build(path)
+    try:
+        os.makedirs(settings.FILE_INDEX_CACHE_DIR, exist_ok=True)
+        # write to a temporary file first so that other workers never read a partial index
+        # (one per thread: the views build the indexes in the "file_io" pool)
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(index.to_bytes())
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # the on-disk cache is an optimization only
+        pass
+    return index
+
+
+@profiled("file")
+def get_line_index(path) -> LineIndex:
+    """
+    Returns the (cached) line index of the file at `path`
+    """
+    stat = os.stat(path)
+    return _get_index(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
@@ -0,0 +1,93 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+
+# ReportListing is a copy of each report with the names of its related objects, for the list pages.
+# A report's row is rebuilt whenever the report is saved; when a datapack, topic, language,
+# environment, testing type or user changes, the copied fields are updated in place
+# (see signals.py). python manage.py rebuild_report_listing rebuilds the whole table.
+
+LISTING_RELATED = ("datapack__topic", "datapack__language", "environment", "testing_type", "tester")
+BATCH_SIZE = 1000
+
+
+def tester_name(user):
+    # e.g. first.last@nuance.com => first.last
+    return user.email[:-11] if user.email else user.username
+
+
+def file_size(report):
+    if not report.file_report:
+        return None
+    try:
+        return os.path.getsize(report.file_report.path)
+    except OSError:
+        return None
+
+
+def make_listing(report, size):
+    # imported here: reports.models imports this package
+    from reports.models import ReportListing
+
+    datapack = report.datapack
+    return ReportListing(
+        report_id=report.id,
+        name=report.name,
+        datapack_id=datapack.id,
+        datapack_name=datapack.name,
+        topic_id=datapack.topic_id,
+        topic_name=datapack.topic.name,
+        language_id=datapack.language_id,
+        language_name=datapack.language.name,
+        environment_id=report.environment_id,
+        environment_name=report.environment.name if report.environment else None,
+        testing_type_id=report.testing_type_id,
+        testing_type_name=report.testing_type.name,
+        tester_id=report.tester_id,
+        tester_name=tester_name(report.tester),
+        status=report.status,
+        accuracy=report.accuracy,
+        date_submit=report.date_submit,
+        date_approve=report.date_approve,
+        approvedBy=report.approvedBy,
+        link_QAServer=report.link_QAServer,
+        notes=report.notes,
+        jira=report.jira,
+        file_name=report.file_report.name or "",
+        file_size=size,
+    )
+
+
+def refresh_listings(report_ids=None, workers=1, after=0):
+    """
+    Rebuilds the listing of the reports `report_ids` (all of them if None) with an id greater than `after`,
+    and returns how many were written
+
+    The file sizes are read with `workers` threads (the storage may be a network share).
+    """
+    from reports.models import Report, ReportListing
+
+    reports = Report.objects.select_related(*LISTING_RELATED).order_by("id")
+    if report_ids is not None:
+        reports = reports.filter(id__in=report_ids)
+
+    written = 0
+    last_id = after
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while True:
+            batch = list(reports.filter(id__gt=last_id)[:BATCH_SIZE])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            sizes = executor.map(file_size, batch) if executor else map(file_size, batch)
+            listings = [make_listing(report, size) for report, size in zip(batch, sizes)]
+            with transaction.atomic():
+                ReportListing.objects.filter(report_id__in=[report.id for report in batch]).delete()
+                ReportListing.objects.bulk_create(listings)
+            written += len(listings)
+    finally:
+        if executor:
+            executor.shutdown()
+    return written
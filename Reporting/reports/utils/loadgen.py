@@ -0,0 +1,474 @@
+import asyncio
+import json
+import os
+import random
+import re
+import tempfile
+import time
+import uuid
+from html.parser import HTMLParser
+from urllib.parse import urlencode, urlsplit
+
+from django.urls import reverse
+
+from reports.utils.benchmark import percentile
+from reports.utils.compare import ACCURACY_TYPES, TRAVEL_CORPUS_TYPES, get_datapack_type
+from reports.utils.synthetic import GENERATORS
+
+# Load generator of the bench_load command: virtual users replaying a mix of the flows of the testers
+# (list, filter, compare, view_file, submit) against a running server, at the same time.
+#
+# Pure Python: the HTTP/1.1 client is written on the asyncio streams, so the generator runs wherever
+# the site runs, without any other package. Each virtual user has its own connection (kept alive when
+# the server allows it) and its own cookies (session, CSRF token).
+
+FLOWS = ("list", "filter", "compare", "view_file", "submit")
+DEFAULT_MIX = {"list": 40, "filter": 25, "compare": 15, "view_file": 15, "submit": 5}
+# filters of the reports page used by the filter flow
+FILTER_FIELDS = ("datapack", "language", "topic", "test_type", "environment")
+# version of the datapacks of the reports submitted: 9.0.<n>
+SUBMIT_VERSION = "9.0"
+
+
+class LoadError(Exception):
+    pass
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json_lines(self):
+        return [json.loads(line) for line in self.body.splitlines() if line]
+
+
+def encode_multipart(data, files):
+    """
+    Returns the body and the content type of a multipart form of the fields `data`
+    and of the `files` ({name: (filename, content)})
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in data.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode() + content + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class HttpClient:
+    """
+    HTTP/1.1 client of a virtual user: one connection, and the cookies of its session
+    """
+    def __init__(self, host, port, timeout=30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.cookies = {}
+        self.reader = self.writer = None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b"", headers=None):
+        try:
+            return await asyncio.wait_for(self.send(method, path, body, headers or {}), self.timeout)
+        except BaseException:
+            # the response may be half read
+            self.close()
+            raise
+
+    async def send(self, method, path, body, headers):
+        reused = self.writer is not None
+        if not reused:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}"]
+        if self.cookies:
+            lines.append("Cookie: " + "; ".join(f"{name}={value}" for name, value in self.cookies.items()))
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        try:
+            await self.writer.drain()
+            status_line = await self.reader.readline()
+        except ConnectionError:
+            status_line = b""
+        if not status_line:
+            self.close()
+            if reused:
+                # the connection kept alive was closed by the server in the meantime
+                return await self.send(method, path, body, headers)
+            raise ConnectionError("Connection closed by the server")
+
+        version, status = status_line.decode("latin-1").split()[:2]
+        status = int(status)
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name, value = name.strip().lower(), value.strip()
+            if name == "set-cookie":
+                self.set_cookie(value)
+            else:
+                response_headers[name] = value
+
+        keep_alive = version == "HTTP/1.1" and response_headers.get("connection", "").lower() != "close"
+        if method == "HEAD" or status in (204, 304) or status < 200:
+            body = b""
+        elif "content-length" in response_headers:
+            body = await self.reader.readexactly(int(response_headers["content-length"]))
+        elif response_headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await self.read_chunked()
+        else:
+            # the end of the body is the end of the connection
+            body = await self.reader.read()
+            keep_alive = False
+        if not keep_alive:
+            self.close()
+        return Response(status, response_headers, body)
+
+    async def read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                # trailers
+                while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+    def set_cookie(self, header):
+        name, _, value = header.split(";")[0].partition("=")
+        if "max-age=0" in header.lower().replace(" ", "") or value == '""':
+            self.cookies.pop(name.strip(), None)
+        else:
+            self.cookies[name.strip()] = value.strip()
+
+    async def get(self, path, params=None):
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        return await self.request("GET", path)
+
+    async def post(self, path, data, files=None, headers=None):
+        """
+        Posts a form (multipart if there are `files`), with the CSRF token of the session
+        """
+        headers = dict(headers or {})
+        if files:
+            body, headers["Content-Type"] = encode_multipart(data, files)
+        else:
+            body, headers["Content-Type"] = urlencode(data, doseq=True).encode(), "application/x-www-form-urlencoded"
+        if "csrftoken" in self.cookies:
+            headers["X-CSRFToken"] = self.cookies["csrftoken"]
+        return await self.request("POST", path, body, headers)
+
+    async def open_session(self, username=None, password=None):
+        """
+        Gets the CSRF cookie (set by the login page), and logs in if a `username` is given
+        """
+        await self.get(reverse("login"))
+        if username is not None:
+            response = await self.post(reverse("login"), {"username": username, "password": password})
+            if response.status != 302:
+                raise LoadError(f"Cannot login as {username}")
+
+
+class SelectParser(HTMLParser):
+    """
+    Collects the options of the <select> of a page: {name: [(value, text)]}
+    """
+    def __init__(self):
+        super().__init__()
+        self.selects = {}
+        self.select = None
+        self.option = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "select":
+            self.select = self.selects.setdefault(attrs.get("name"), [])
+        elif tag == "option" and self.select is not None:
+            self.option = [attrs.get("value") or "", ""]
+            self.select.append(self.option)
+
+    def handle_data(self, data):
+        if self.option is not None:
+            self.option[1] += data.strip()
+
+    def handle_endtag(self, tag):
+        if tag == "select":
+            self.select = None
+        if tag in ("select", "option"):
+            self.option = None
+
+
+def select_options(html):
+    parser = SelectParser()
+    parser.feed(html.decode("utf-8", "replace"))
+    return {name: [(value, text) for value, text in options if value] for name, options in parser.selects.items()}
+
+
+def file_format(testing_type):
+    """
+    Format of the synthetic result file (synthetic.GENERATORS) of a testing type, None if not compared
+    """
+    if testing_type in ACCURACY_TYPES:
+        return "accuracy"
+    if testing_type in TRAVEL_CORPUS_TYPES:
+        return "travel_corpus"
+    return {"NTE5": "NTE5", "load_test": "load_txt"}.get(testing_type)
+
+
+class Targets:
+    """
+    What the flows are run on, found on the site before the load starts
+    """
+    def __init__(self, file_size):
+        self.filters = []
+        self.report_files = []
+        self.compare_pairs = []
+        # submit flow: (testing type id, format of its files), environment id, datapack type
+        self.submit_type = None
+        self.environment = None
+        self.datapack_type = None
+        self.submitted = 0
+        self.file_size = file_size
+
+    def available(self, flow):
+        return {
+            "list": True,
+            "filter": bool(self.filters),
+            "compare": bool(self.compare_pairs),
+            "view_file": bool(self.report_files),
+            "submit": self.submit_type is not None,
+        }[flow]
+
+
+async def submit_report(client, targets, seed):
+    """
+    Submits a report of the next version of the datapack type, with a synthetic result file
+    """
+    testing_type, fmt = targets.submit_type
+    version = f"{SUBMIT_VERSION}.{targets.submitted}"
+    targets.submitted += 1
+    generate, filename = GENERATORS[fmt]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, filename)
+        generate(path, targets.file_size, seed=seed)
+        with open(path, "rb") as f:
+            content = f.read()
+    return await client.post(reverse("submit_report"), {
+        "form-TOTAL_FORMS": 1,
+        "form-INITIAL_FORMS": 0,
+        "form-0-name": f"load generator {version}",
+        "form-0-datapack": f"{targets.datapack_type}-{version}",
+        "form-0-testing_type": testing_type,
+        "form-0-environment": targets.environment,
+        "form-0-accuracy": "n/a",
+    }, files={"form-0-file_report": (filename, content)})
+
+
+def submitted(response):
+    return response.status == 200 and b"Success" in response.body
+
+
+async def discover(client, logged_in, sample, file_size, log):
+    """
+    Finds the filters, the files and the reports to compare of the site. When logged in, two reports
+    with a result file are submitted first, so that there always are reports to compare.
+    """
+    targets = Targets(file_size)
+    page = await client.get(reverse("reports"))
+    options = select_options(page.body)
+    targets.filters = [(field, value) for field in FILTER_FIELDS for value, _ in options.get(field, [])]
+
+    if logged_in:
+        form = select_options((await client.get(reverse("submit_report"))).body)
+        testing_types = [
+            (value, file_format(name)) for value, name in form.get("form-__prefix__-testing_type", [])
+            if file_format(name)
+        ]
+        environments = form.get("form-__prefix__-environment", [])
+        datapacks = options.get("datapack", [])
+        if testing_types and environments and datapacks:
+            targets.submit_type = testing_types[0]
+            targets.environment = environments[0][0]
+            targets.datapack_type = get_datapack_type(datapacks[0][1])
+            for _ in range(2):
+                if not submitted(await submit_report(client, targets, seed=targets.submitted)):
+                    raise LoadError("Cannot submit a report")
+        else:
+            log("No testing type with result files, environment or datapack to submit reports for")
+
+    # the latest reports (in the listing of the reports page), exported from the id the sample starts at
+    listed = [int(report_id) for report_id in re.findall(rb'name="compare-(\d+)"', page.body)]
+    after = max(0, max(listed, default=0) - sample)
+    rows = (await client.get(reverse("export_reports"), {"format": "ndjson", "after": after, "limit": sample})).json_lines()
+
+    groups = {}
+    for row in rows:
+        if row["file_name"]:
+            targets.report_files.append(row["id"])
+            groups.setdefault((get_datapack_type(row["datapack"]), row["testing_type"]), []).append(row["id"])
+    for ids in groups.values():
+        targets.compare_pairs += list(zip(ids, ids[1:]))
+    return targets
+
+
+async def list_flow(client, targets, rng):
+    return await client.get(reverse("reports"))
+
+
+async def filter_flow(client, targets, rng):
+    field, value = rng.choice(targets.filters)
+    return await client.post(reverse("reports"), {field: value})
+
+
+async def compare_flow(client, targets, rng):
+    return await client.post(reverse("reports"), {f"compare-{report_id}": "on" for report_id in rng.choice(targets.compare_pairs)})
+
+
+async def view_file_flow(client, targets, rng):
+    return await client.get(reverse("view_file", args=[rng.choice(targets.report_files)]))
+
+
+async def submit_flow(client, targets, rng):
+    return await submit_report(client, targets, seed=rng.randrange(1 << 30))
+
+
+# {flow: (function sending its request, check of the response)}
+FLOW_FUNCTIONS = {
+    "list": (list_flow, None),
+    "filter": (filter_flow, None),
+    "compare": (compare_flow, None),
+    "view_file": (view_file_flow, None),
+    "submit": (submit_flow, submitted),
+}
+
+
+class Stats:
+    """
+    Latencies and errors of the requests, by flow
+    """
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, flow, latency, error=None):
+        self.latencies.setdefault(flow, []).append(latency)
+        if error is not None:
+            errors = self.errors.setdefault(flow, {})
+            errors[error] = errors.get(error, 0) + 1
+
+    def results(self, seconds):
+        results = []
+        for flow in [*FLOWS, "total"]:
+            if flow == "total":
+                latencies = [latency for values in self.latencies.values() for latency in values]
+                errors = {}
+                for flow_errors in self.errors.values():
+                    for error, count in flow_errors.items():
+                        errors[error] = errors.get(error, 0) + count
+            else:
+                latencies = self.latencies.get(flow, [])
+                errors = self.errors.get(flow, {})
+            if not latencies:
+                continue
+            results.append({
+                "endpoint": flow,
+                "requests": len(latencies),
+                "errors": sum(errors.values()),
+                "error_rate": round(sum(errors.values()) / len(latencies), 4),
+                "errors_by_kind": errors,
+                "throughput_rps": round(len(latencies) / seconds, 2),
+                **{
+                    f"p{p}_ms": round(percentile(latencies, p) * 1000, 2) for p in (50, 90, 95, 99)
+                },
+                "max_ms": round(max(latencies) * 1000, 2),
+            })
+        return results
+
+
+async def run_load(
+    url, users=10, duration=60, requests=None, mix=None, think_time=0.5, warmup=0, timeout=30,
+    username=None, password=None, sample=5000, file_size=100 * 1024, seed=0, log=lambda message: None,
+):
+    """
+    Runs `users` virtual users for `duration` seconds (or until `requests` requests are sent),
+    each one sending the request of a flow drawn from `mix` ({flow: weight}) and waiting a random
+    think time (exponential, of mean `think_time` seconds) before the next one.
+    Returns the results by flow, and the number of seconds measured (after the `warmup` seconds).
+    """
+    address = urlsplit(url)
+    if address.scheme != "http":
+        raise LoadError("Only http:// URLs are supported")
+    host, port = address.hostname, address.port or 80
+    mix = dict(DEFAULT_MIX if mix is None else mix)
+    logged_in = username is not None
+
+    client = HttpClient(host, port, timeout)
+    try:
+        await client.open_session(username, password)
+        targets = await discover(client, logged_in, sample, file_size, log)
+    finally:
+        client.close()
+    for flow in list(mix):
+        if mix[flow] > 0 and not targets.available(flow):
+            log(f"Not running the {flow} flow: " + (
+                "it needs --username and --password" if flow == "submit" and not logged_in else "nothing to run it on"
+            ))
+            mix[flow] = 0
+    flows = [flow for flow in FLOWS if mix.get(flow, 0) > 0]
+    if not flows:
+        raise LoadError("No flow to run")
+    weights = [mix[flow] for flow in flows]
+
+    stats = Stats()
+    start = time.perf_counter()
+    measured_from = start + warmup
+    deadline = measured_from + duration
+    sent = 0
+
+    async def virtual_user(i):
+        nonlocal sent
+        rng = random.Random(seed * 1000 + i)
+        client = HttpClient(host, port, timeout)
+        try:
+            await client.open_session(username, password)
+            while time.perf_counter() < deadline and (requests is None or sent < requests):
+                flow = rng.choices(flows, weights)[0]
+                send, check = FLOW_FUNCTIONS[flow]
+                measured = time.perf_counter() >= measured_from
+                if measured:
+                    sent += 1
+                request_start = time.perf_counter()
+                error = None
+                try:
+                    response = await send(client, targets, rng)
+                    if response.status >= 400:
+                        error = str(response.status)
+                    elif check is not None and not check(response):
+                        error = "invalid response"
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as err:
+                    error = type(err).__name__
+                if measured:
+                    stats.add(flow, time.perf_counter() - request_start, error)
+                if think_time:
+                    await asyncio.sleep(rng.expovariate(1 / think_time))
+        finally:
+            client.close()
+
+    await asyncio.gather(*(virtual_user(i) for i in range(users)))
+    seconds = max(0.0, time.perf_counter() - measured_from)
+    return stats.results(seconds or 1), seconds
@@ -0,0 +1,180 @@
+import logging
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from reports.utils.metrics import SIZE_BUCKETS, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Memory of the comparisons of result files, which read whole files (pandas dataframes of all the
+# NTE5 CSVs, failures of the travel corpus outputs) and can take a worker down.
+#
+# COMPARISON_MEMORY_BUDGET: a comparison whose process grew by more than this (RSS, what the OOM
+# killer looks at, or the memory traced if profiling) is aborted with MemoryBudgetExceeded. The parsers call memory_checkpoint()
+# after each file and regularly while reading one.
+#
+# COMPARISON_MEMORY_PROFILING (opt-in, it slows the parsers down): the allocations of each comparison
+# are traced with tracemalloc, and its peak and top allocation sites (at the checkpoint where the
+# most memory was allocated) are logged and exposed in the metrics.
+#
+# With several threads per process the numbers include the memory of the other requests.
+
+TOP_ALLOCATIONS = 5
+
+PEAK_MEMORY = Histogram(
+    "reports_comparison_peak_memory_bytes", "Peak memory traced during a comparison, by testing type",
+    ("testing_type",), SIZE_BUCKETS,
+)
+ABORTED = Counter(
+    "reports_comparison_memory_aborted_total", "Comparisons aborted over the memory budget, by testing type",
+    ("testing_type",),
+)
+
+_current = ContextVar("memory_run", default=None)
+_lock = threading.Lock()
+_tracing = 0
+# whether the comparisons started the tracing, and stop it (not when someone else traces, e.g. bench_parsers)
+_started = False
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class MemoryBudgetExceeded(Exception):
+    def __init__(self, used, budget):
+        super().__init__(f"{used / 1024 / 1024:.0f}MB used, over the budget of {budget / 1024 / 1024:.0f}MB")
+        self.used = used
+        self.budget = budget
+
+
+def rss():
+    """
+    Resident memory of the process in bytes, None if unknown (not on Linux)
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _start_tracing():
+    """
+    Returns True if this started the tracing: its peak is then the peak since the run started
+    (tracemalloc.reset_peak() is Python 3.9+ only, the image runs 3.8)
+    """
+    global _tracing, _started
+    with _lock:
+        started = _tracing == 0 and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+            _started = True
+        _tracing += 1
+        return started
+
+
+def _stop_tracing():
+    global _tracing, _started
+    with _lock:
+        _tracing -= 1
+        if _tracing == 0 and _started:
+            tracemalloc.stop()
+            _started = False
+
+
+def top_allocations(snapshot, limit=TOP_ALLOCATIONS):
+    """
+    [(file:line, bytes)] of the lines that allocated the most memory
+    """
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    return [
+        (f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", stat.size)
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+
+
+class MemoryRun:
+    def __init__(self, name, budget, profiling, traced_peak=False):
+        self.name = name
+        self.budget = budget
+        self.profiling = profiling
+        # the peak of tracemalloc is that of this run (it started the tracing), else the highest
+        # memory traced at the checkpoints is used
+        self.traced_peak = traced_peak
+        self.start_rss = rss()
+        self.rss_growth = 0
+        self.traced_start = tracemalloc.get_traced_memory()[0] if profiling else 0
+        self.peak = 0
+        self.top_memory = -1
+        self.top = []
+
+    def checkpoint(self):
+        used = 0
+        if self.start_rss is not None:
+            current_rss = rss()
+            if current_rss is not None:
+                self.rss_growth = max(self.rss_growth, current_rss - self.start_rss)
+                used = self.rss_growth
+        if self.profiling:
+            traced = tracemalloc.get_traced_memory()[0] - self.traced_start
+            # the memory freed by the allocator is not always given back: RSS can miss what is allocated
+            used = max(used, traced)
+            self.peak = max(self.peak, traced)
+            if traced > self.top_memory:
+                # where the memory is when the most is allocated
+                self.top_memory = traced
+                self.top = top_allocations(tracemalloc.take_snapshot())
+        if self.budget and used > self.budget:
+            raise MemoryBudgetExceeded(used, self.budget)
+
+    def finish(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, current - self.traced_start)
+        if self.traced_peak:
+            self.peak = max(self.peak, peak - self.traced_start)
+
+
+def memory_checkpoint():
+    """
+    Checks the memory budget of the comparison running, if any
+    """
+    run = _current.get()
+    if run is not None:
+        run.checkpoint()
+
+
+@contextmanager
+def comparison_memory(testing_type):
+    """
+    Guards the memory of a comparison (see the top of this file)
+    """
+    budget = settings.COMPARISON_MEMORY_BUDGET
+    profiling = settings.COMPARISON_MEMORY_PROFILING
+    if not budget and not profiling:
+        yield None
+        return
+
+    traced_peak = _start_tracing() if profiling else False
+    run = MemoryRun(testing_type, budget, profiling, traced_peak)
+    token = _current.set(run)
+    try:
+        yield run
+        run.checkpoint()
+    except MemoryBudgetExceeded as err:
+        ABORTED.inc(testing_type=testing_type)
+        logger.warning("Comparison of %s reports aborted: %s", testing_type, err)
+        raise
+    finally:
+        _current.reset(token)
+        if profiling:
+            run.finish()
+            _stop_tracing()
+            PEAK_MEMORY.observe(run.peak, testing_type=testing_type)
+            logger.info(
+                "Comparison of %s reports: peak %.1fMB traced, RSS +%.1fMB, top allocations: %s",
+                testing_type, run.peak / 1024 / 1024, run.rss_growth / 1024 / 1024,
+                ", ".join(f"{site} {size / 1024 / 1024:.1f}MB" for site, size in run.top),
+            )
@@ -0,0 +1,388 @@
+import asyncio
+import atexit
+import fcntl
+import ipaddress
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.deprecation import MiddlewareMixin
+
+from reports.utils.executors import run_in
+from reports.utils.queries import observe_queries
+
+# Metrics of the site in the Prometheus text format, served on /metrics.
+#
+# Each process of the server (gunicorn workers) counts in memory, and writes its values to
+# METRICS_DIR/<pid>-<start time>.json at most every FLUSH_INTERVAL seconds (and when it exits).
+# /metrics adds up the files of all the processes, so whichever worker answers, the totals are those
+# of the site. The files of the processes that are gone are merged into archive.json rather than
+# deleted: the counters of a restarted worker must not go backwards. The start time of the process
+# is in the name of its file: a new process given the pid of a process gone is not mistaken for it.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 1KB to 1GB
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(11))
+FLUSH_INTERVAL = 1
+# the files of the processes gone are looked for at most this often, by each process
+ARCHIVE_INTERVAL = 60
+ARCHIVE = "archive.json"
+HAS_PROC = os.path.isdir("/proc/self")
+
+_lock = threading.Lock()
+# {(name, labels): value of a counter, or [counts of the buckets..., sum, count] of a histogram}
+_values = {}
+_pid = None
+_file_name = None
+_last_flush = 0.0
+_last_archive = 0.0
+REGISTRY = {}
+
+
+def _process_start(pid):
+    """
+    Start time of the process `pid` (clock ticks after the boot, 0 without /proc), None if it is gone
+    """
+    if not HAS_PROC:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return None
+        except PermissionError:
+            pass
+        return 0
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # the command may contain spaces: the fields after it
+            return int(f.read().rsplit(")", 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def file_name(pid, start):
+    return f"{pid}-{start}.json"
+
+
+def _parse_file_name(name):
+    """
+    (pid, start time) of the process of the file `name`, None if it is not the file of a process
+    """
+    pid, _, start = name[:-len(".json")].partition("-")
+    if not (pid.isdigit() and start.isdigit()):
+        return None
+    return int(pid), int(start)
+
+
+def _reset_after_fork():
+    # a process forked from one that already counted (e.g. preloaded gunicorn master)
+    # starts from zero: its parent's values are in the parent's file
+    global _pid, _file_name, _last_flush, _last_archive
+    if os.getpid() != _pid:
+        _pid = os.getpid()
+        _file_name = file_name(_pid, _process_start(_pid) or 0)
+        _values.clear()
+        _last_flush = _last_archive = 0.0
+
+
+_reset_after_fork()
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        REGISTRY[name] = self
+
+    def key(self, labels):
+        return self.name, tuple(str(labels[label]) for label in self.labels)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with _lock:
+            _reset_after_fork()
+            _values[key] = _values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with _lock:
+            _reset_after_fork()
+            values = _values.get(key)
+            if values is None:
+                values = _values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values[i] += 1
+                    # the counts are made cumulative when exposed
+                    break
+            values[-2] += value
+            values[-1] += 1
+
+
+class Timer:
+    """
+    with Timer(histogram, label=...): observes the seconds of the block
+    """
+    def __init__(self, histogram, **labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+REQUEST_DURATION = Histogram(
+    "reports_request_duration_seconds", "Time of the views, by URL name", ("view", "method"),
+)
+REQUESTS = Counter("reports_requests_total", "Requests, by URL name and status code", ("view", "status"))
+DB_QUERIES = Counter("reports_db_queries_total", "SQL queries run by the views, by URL name", ("view",))
+COMPARISON_DURATION = Histogram(
+    "reports_comparison_duration_seconds", "Time of the comparisons of result files, by testing type",
+    ("testing_type",),
+)
+COMPARISON_BYTES = Histogram(
+    "reports_comparison_parsed_bytes", "Size of the result files read by a comparison, by testing type",
+    ("testing_type",), SIZE_BUCKETS,
+)
+UPLOAD_SIZE = Histogram(
+    "reports_upload_size_bytes", "Size of the result files uploaded, by way of uploading", ("method",), SIZE_BUCKETS,
+)
+FILE_SERVED_BYTES = Counter(
+    "reports_file_served_bytes_total", "Bytes of the result files sent, by URL name", ("view",),
+)
+CACHE_REQUESTS = Counter(
+    "reports_cache_requests_total", "Reads of the cached tables and comparisons, by kind and result (hit/miss/coalesced)",
+    ("prefix", "result"),
+)
+
+
+def _path(name):
+    return os.path.join(settings.METRICS_DIR, name)
+
+
+def _dump(values):
+    return [[name, list(labels), value] for (name, labels), value in values.items()]
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return {(name, tuple(labels)): value for name, labels, value in json.load(f)}
+    except (OSError, ValueError):
+        return {}
+
+
+def _add(total, values):
+    for key, value in values.items():
+        if isinstance(value, list):
+            current = total.setdefault(key, [0] * len(value))
+            if len(current) == len(value):
+                for i, item in enumerate(value):
+                    current[i] += item
+        else:
+            total[key] = total.get(key, 0) + value
+
+
+def _write(path, values):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(_dump(values), f)
+    os.replace(tmp_path, path)
+
+
+def flush_due():
+    return time.monotonic() - _last_flush >= FLUSH_INTERVAL
+
+
+def flush(force=False):
+    """
+    Writes the values of this process to its file (at most every FLUSH_INTERVAL seconds unless `force`)
+    """
+    global _last_flush
+    if not force and not flush_due():
+        return
+    with _lock:
+        _reset_after_fork()
+        if not _values:
+            return
+        values = {key: list(value) if isinstance(value, list) else value for key, value in _values.items()}
+        _last_flush = time.monotonic()
+        name = _file_name
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    _write(_path(name), values)
+
+
+atexit.register(lambda: flush(force=True))
+
+
+def _is_gone(name):
+    process = _parse_file_name(name)
+    if process is None:
+        return False
+    pid, start = process
+    current = _process_start(pid)
+    # without the start time (0), only whether the pid is still used
+    return current is None or (start != 0 and current != start)
+
+
+def _archive_dead_processes(names):
+    """
+    Merges the files of the processes that are gone into the archive, returns the names of these files
+    """
+    dead = [name for name in names if _is_gone(name)]
+    if not dead:
+        return []
+    with open(_path("archive.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = _load(_path(ARCHIVE))
+        merged = []
+        for name in dead:
+            if os.path.exists(_path(name)):
+                _add(archive, _load(_path(name)))
+                merged.append(name)
+        _write(_path(ARCHIVE), archive)
+        for name in merged:
+            os.remove(_path(name))
+    return dead
+
+
+def collect():
+    """
+    Returns the values of all the processes, added up
+    """
+    global _last_archive
+    flush(force=True)
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    names = [name for name in os.listdir(settings.METRICS_DIR) if name.endswith(".json")]
+    if time.monotonic() - _last_archive >= ARCHIVE_INTERVAL:
+        _last_archive = time.monotonic()
+        archived = _archive_dead_processes([name for name in names if name != ARCHIVE])
+        if archived:
+            # their values are in the archive now
+            names = [name for name in names if name not in archived and name != ARCHIVE] + [ARCHIVE]
+    total = {}
+    for name in names:
+        _add(total, _load(_path(name)))
+    return total
+
+
+def is_allowed(request):
+    """
+    Whether the request may read the metrics: staff users, and the addresses of METRICS_ALLOWED_IPS
+    """
+    if request.user.is_staff:
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_IPS)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(values=None):
+    """
+    The metrics in the Prometheus text format
+    """
+    values = collect() if values is None else values
+    lines = []
+    for metric in REGISTRY.values():
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        series = sorted((labels, value) for (name, labels), value in values.items() if name == metric.name)
+        for labels, value in series:
+            if metric.type == "counter":
+                lines.append(f"{metric.name}{_format_labels(metric.labels, labels)} {_format_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip((*metric.buckets, float("inf")), value[:-2] + [value[-1] - sum(value[:-2])]):
+                cumulative += count
+                le = _format_labels(metric.labels, labels, [("le", _format_number(bound))])
+                lines.append(f"{metric.name}_bucket{le} {cumulative}")
+            lines.append(f"{metric.name}_sum{_format_labels(metric.labels, labels)} {_format_number(value[-2])}")
+            lines.append(f"{metric.name}_count{_format_labels(metric.labels, labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    # sync and async (ASGI server) like the middlewares of Django
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with observe_queries(queries):
+            response = self.get_response(request)
+        self.record(request, response, queries, time.perf_counter() - start)
+        flush()
+        return response
+
+    async def __acall__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with observe_queries(queries):
+            response = await self.get_response(request)
+        self.record(request, response, queries, time.perf_counter() - start)
+        # the file is written in a thread, not in the event loop
+        if flush_due():
+            await run_in("file_io", flush)
+        return response
+
+    def record(self, request, response, queries, seconds):
+        match = request.resolver_match
+        # the URL names only: the paths have ids
+        view = match.url_name if match is not None and match.url_name else "other"
+        REQUEST_DURATION.observe(seconds, view=view, method=request.method)
+        REQUESTS.inc(view=view, status=response.status_code)
+        if queries.count:
+            DB_QUERIES.inc(queries.count, view=view)
@@ -0,0 +1,195 @@
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# The Parameter*.used file of a test run is somewhere under the run folder on the
+# network share that link_QAServer points to. Walking that tree on every submission is
+# slow, so it is done in the background after the report is saved, with:
+# - a cached index per run folder of the listing of every directory, reused as long as
+#   the mtime of the directory is unchanged (i.e. nothing was added to or removed from it)
+# - copies named after the SHA-256 of the content, so a run is copied only once,
+#   and the hash of a source file is only computed again if its size or mtime changed
+# - a hard time budget, after which the harvest gives up (the index built so far is kept,
+#   so the next harvest of the same run folder resumes from there)
+
+PARAMETER_FILE_PATTERN = "Parameter*.used"
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="param-harvest")
+
+
+class HarvestTimeout(Exception):
+    pass
+
+
+def get_run_folder(link_QAServer):
+    """
+    Returns the path of the run folder on the mounted share, e.g.
+    \\\\mt-nas02.nuance.com\\...\\EMEA\\... => /media/datapack/DP_Test_Results/EMEA/...
+    """
+    path = link_QAServer.replace("\\", "/")
+    # remove mt-nas02.nuance.com from link
+    end_path = re.search(r"EMEA.*$", path)
+    if not end_path:
+        return None
+    # add mounted drive to link
+    return os.path.join(settings.DP_TEST_RESULTS_ROOT, end_path.group())
+
+
+def _index_path(run_folder):
+    key = hashlib.sha1(run_folder.encode("utf-8")).hexdigest()
+    return os.path.join(settings.PARAMETER_INDEX_DIR, f"{key}.json")
+
+
+def _load_index(run_folder):
+    try:
+        with open(_index_path(run_folder)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"directories": {}, "hashes": {}}
+
+
+def _save_index(run_folder, index):
+    os.makedirs(settings.PARAMETER_INDEX_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=settings.PARAMETER_INDEX_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, _index_path(run_folder))
+
+
+def find_parameter_file(run_folder, index, deadline):
+    """
+    Returns the path of the last Parameter*.used file under `run_folder`, or None
+
+    Directories whose mtime did not change since they were indexed are not listed again.
+    """
+    directories = index["directories"]
+    found = None
+    to_visit = [run_folder]
+    while to_visit:
+        if time.monotonic() > deadline:
+            raise HarvestTimeout(run_folder)
+        directory = to_visit.pop()
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            directories.pop(directory, None)
+            continue
+
+        cached = directories.get(directory)
+        if not cached or cached["mtime"] != mtime:
+            subdirectories, files = [], []
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        subdirectories.append(entry.name)
+                    elif fnmatch.fnmatch(entry.name, PARAMETER_FILE_PATTERN):
+                        files.append(entry.name)
+            cached = directories[directory] = {
+                "mtime": mtime, "subdirectories": sorted(subdirectories), "files": sorted(files),
+            }
+
+        if cached["files"]:
+            found = os.path.join(directory, cached["files"][-1])
+        to_visit.extend(os.path.join(directory, name) for name in reversed(cached["subdirectories"]))
+    return found
+
+
+def copy_parameter_file(path, index, deadline):
+    """
+    Copies `path` to PARAMETERS_INI_DIR under the hash of its content, unless it was already copied,
+    and returns the URL of the copy
+    """
+    stat = os.stat(path)
+    signature = [stat.st_size, stat.st_mtime]
+    known = index["hashes"].get(path)
+    if known and known["signature"] == signature:
+        filename = f"{known['sha256']}.txt"
+        if os.path.exists(os.path.join(settings.PARAMETERS_INI_DIR, filename)):
+            return settings.PARAMETERS_INI_URL + filename
+
+    # hash while copying, so that the share is read only once
+    os.makedirs(settings.PARAMETERS_INI_DIR, exist_ok=True)
+    sha256 = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=settings.PARAMETERS_INI_DIR, suffix=".tmp")
+    try:
+        with open(path, "rb") as src, os.fdopen(fd, "wb") as dst:
+            while True:
+                if time.monotonic() > deadline:
+                    raise HarvestTimeout(path)
+                chunk = src.read(1024 * 1024)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                dst.write(chunk)
+        filename = f"{sha256.hexdigest()}.txt"
+        destination = os.path.join(settings.PARAMETERS_INI_DIR, filename)
+        if os.path.exists(destination):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, destination)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    index["hashes"][path] = {"signature": signature, "sha256": sha256.hexdigest()}
+    return settings.PARAMETERS_INI_URL + filename
+
+
+def harvest_parameter_file(link_QAServer, time_budget=None):
+    """
+    Returns the URL of the copy of the Parameter*.used file of the run at `link_QAServer`,
+    or None if there is none
+
+    Raises HarvestTimeout if this takes more than `time_budget` seconds.
+    """
+    if time_budget is None:
+        time_budget = settings.PARAMETER_HARVEST_TIME_BUDGET
+    deadline = time.monotonic() + time_budget
+
+    run_folder = get_run_folder(link_QAServer)
+    if not run_folder:
+        return None
+    index = _load_index(run_folder)
+    try:
+        parameter_file = find_parameter_file(run_folder, index, deadline)
+        return copy_parameter_file(parameter_file, index, deadline) if parameter_file else None
+    finally:
+        _save_index(run_folder, index)
+
+
+def _harvest_for_report(report_id, link_QAServer):
+    # imported here: reports.models imports this package
+    from reports.models import Report
+
+    try:
+        url = harvest_parameter_file(link_QAServer)
+        if url:
+            close_old_connections()
+            Report.objects.filter(pk=report_id).update(parameters=url)
+    except HarvestTimeout:
+        logger.warning("Parameter file harvest of report %s timed out (%s)", report_id, link_QAServer)
+    except Exception:
+        logger.exception("Parameter file harvest of report %s failed (%s)", report_id, link_QAServer)
+    finally:
+        close_old_connections()
+
+
+def schedule_parameter_harvest(report):
+    """
+    Harvests the parameter file of `report` in the background, once the report is committed
+    """
+    if report.link_QAServer:
+        report_id, link = report.pk, report.link_QAServer
+        transaction.on_commit(lambda: _executor.submit(_harvest_for_report, report_id, link))
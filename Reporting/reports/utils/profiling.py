@@ -0,0 +1,187 @@
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.deprecation import MiddlewareMixin
+
+from reports.utils.queries import observe_queries
+
+# Profiling of the requests: where the time of a request goes.
+#
+# A profiled request gets a Server-Timing header (shown by the network tab of the browsers) with
+#   total: the time of the view and of the middlewares after this one
+#   db: the time of the SQL queries, and their number
+#   file: the time of the file I/O wrapped in timed("file")
+#   parse_<parser>: the time of each parser of compare.py (reading its file included)
+# and if it is slower than PROFILING_SLOW_MS it is kept, with its slowest SQL statements, in a ring
+# buffer of the PROFILING_RING_SIZE latest slow requests shown to the admins on /profiling/.
+# The ring is in the cache, shared by the processes of the server.
+#
+# A fraction PROFILING_SAMPLE_RATE of the requests is profiled. With 0 (the default) the middleware
+# is not used at all, and timed() only reads a context variable: the cost is negligible.
+
+_current = ContextVar("profile", default=None)
+SLOWEST_QUERIES = 5
+RING_TIMEOUT = 7 * 24 * 3600
+_RING_NEXT = "profiling:slow:next"
+
+
+def _ring_key(slot):
+    return f"profiling:slow:{slot}"
+
+
+class Profile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.seconds = None
+        # {name: [seconds, count]}
+        self.timings = {}
+        # (seconds, sql) of the queries
+        self.queries = []
+
+    def add(self, name, seconds):
+        timing = self.timings.setdefault(name, [0.0, 0])
+        timing[0] += seconds
+        timing[1] += 1
+
+    def __call__(self, execute, sql, params, many, context):
+        # DB execute wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - start, sql))
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self.start
+
+    def server_timing(self):
+        metrics = [
+            f"total;dur={self.seconds * 1000:.1f}",
+            f'db;dur={sum(seconds for seconds, _ in self.queries) * 1000:.1f};desc="{len(self.queries)} queries"',
+        ]
+        for name, (seconds, count) in self.timings.items():
+            metrics.append(f'{name};dur={seconds * 1000:.1f};desc="{count}x"')
+        return ", ".join(metrics)
+
+    def summary(self, request, response):
+        return {
+            "date": datetime.now(timezone.utc),
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "user": request.user.username if getattr(request, "user", None) and request.user.is_authenticated else None,
+            "total_ms": round(self.seconds * 1000, 1),
+            "queries": len(self.queries),
+            "db_ms": round(sum(seconds for seconds, _ in self.queries) * 1000, 1),
+            "timings": {name: (round(seconds * 1000, 1), count) for name, (seconds, count) in self.timings.items()},
+            "slowest_queries": [
+                (round(seconds * 1000, 1), sql)
+                for seconds, sql in sorted(self.queries, key=lambda query: query[0], reverse=True)[:SLOWEST_QUERIES]
+            ],
+        }
+
+
+@contextmanager
+def timed(name):
+    """
+    Adds the time of the block to `name` in the profile of the current request, if it is profiled
+    """
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - start)
+
+
+def profiled(name):
+    """
+    Decorator adding the time of the function to `name` in the profile of the current request
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_slow_request(summary):
+    # a race between processes can overwrite a slot: one sample lost
+    cache.add(_RING_NEXT, 0, timeout=None)
+    try:
+        slot = cache.incr(_RING_NEXT) % settings.PROFILING_RING_SIZE
+    except ValueError:
+        # culled meanwhile
+        slot = 0
+    cache.set(_ring_key(slot), summary, timeout=RING_TIMEOUT)
+
+
+def slow_requests():
+    """
+    The slow requests of the ring buffer, the latest first
+    """
+    samples = cache.get_many([_ring_key(slot) for slot in range(settings.PROFILING_RING_SIZE)]).values()
+    return sorted(samples, key=lambda sample: sample["date"], reverse=True)
+
+
+def clear_slow_requests():
+    cache.delete_many([_RING_NEXT, *(_ring_key(slot) for slot in range(settings.PROFILING_RING_SIZE))])
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    # sync and async (ASGI server) like the middlewares of Django
+    def __init__(self, get_response):
+        if not settings.PROFILING_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = Profile()
+        token = _current.set(profile)
+        try:
+            with observe_queries(profile):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+            profile.stop()
+        return self.record(request, response, profile)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        profile = Profile()
+        token = _current.set(profile)
+        try:
+            with observe_queries(profile):
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+            profile.stop()
+        # the summary may load the user from the DB, and the ring buffer is in the file cache
+        return await sync_to_async(self.record)(request, response, profile)
+
+    def record(self, request, response, profile):
+        response["Server-Timing"] = profile.server_timing()
+        if profile.seconds * 1000 >= settings.PROFILING_SLOW_MS:
+            record_slow_request(profile.summary(request, response))
+        return response
@@ -0,0 +1,39 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+# Observers of the SQL queries of a request (the QueryCounter of the metrics, the Profile of the
+# profiling): execute wrappers, see https://docs.djangoproject.com/en/4.0/topics/db/instrumentation/
+#
+# connection.execute_wrapper() only sees the queries of the connection of the current thread, and
+# under an ASGI server the views do not run in the thread of the middlewares. Instead execute() is
+# installed on every connection when it is opened (see apps.py) and calls the observers of the
+# context of the query: the context of a request is passed on to the threads running its sync code.
+
+_observers = ContextVar("query_observers", default=())
+
+
+@contextmanager
+def observe_queries(observer):
+    """
+    Calls observer(execute, sql, params, many, context) for the queries of the block, wherever they run
+    """
+    token = _observers.set((*_observers.get(), observer))
+    try:
+        yield observer
+    finally:
+        _observers.reset(token)
+
+
+def execute(execute, sql, params, many, context):
+    for observer in reversed(_observers.get()):
+        execute = partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def install(sender, connection, **kwargs):
+    """
+    connection_created receiver
+    """
+    if execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute)
@@ -0,0 +1,143 @@
+import random
+import string
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from reports.utils import cache
+from reports.utils.compare import ACCURACY_TYPES, TRAVEL_CORPUS_TYPES
+from reports.utils.listing import refresh_listings
+
+# Fills the DB with a synthetic dataset of a realistic shape, to measure the views on a DB as large
+# as (or larger than) production: see the seed_benchmark and bench_views commands.
+#
+# seed_database only creates what is missing to reach the numbers asked for, so it can grow a dataset
+# (e.g. 1k, then 10k, then 100k reports) or be run again.
+
+BATCH_SIZE = 5000
+TESTING_TYPES = (*ACCURACY_TYPES, *TRAVEL_CORPUS_TYPES, "NTE5", "load_test")
+# testing types run for the datapacks of a topic (Topic.tests_run)
+TESTS_PER_TOPIC = 10
+REPORT_STATUSES = (("Pass", 6), ("Fail", 1), ("Pending Approval", 3))
+
+
+def letters(i, n, alphabet=string.ascii_lowercase):
+    """
+    The `i`th word of `n` letters: aaa, aab, aac, ...
+    """
+    word = ""
+    for _ in range(n):
+        i, rest = divmod(i, len(alphabet))
+        word = alphabet[rest] + word
+    return word
+
+
+def language_name(i):
+    # e.g. aab-AAB
+    return f"{letters(i, 3)}-{letters(i, 3, string.ascii_uppercase)}"
+
+
+def topic_name(i):
+    return f"T{letters(i, 3, string.ascii_uppercase)}"
+
+
+def testing_type_name(i):
+    return TESTING_TYPES[i] if i < len(TESTING_TYPES) else f"testing_type_{i:03d}"
+
+
+def create_missing(model, count, make, log):
+    """
+    Creates the objects `make(i)` for i from the number of `model` objects up to `count`,
+    and returns all the objects of `model`
+    """
+    existing = model.objects.count()
+    if existing < count:
+        for start in range(existing, count, BATCH_SIZE):
+            model.objects.bulk_create([make(i) for i in range(start, min(count, start + BATCH_SIZE))])
+        log(f"{model.__name__}: created {count - existing}")
+    return list(model.objects.order_by("id"))
+
+
+def seed_database(
+    reports=100000, datapacks=5000, testing_types=40, topics=30, languages=60, environments=8, users=50,
+    seed=0, log=lambda message: None,
+):
+    """
+    Creates the objects missing for the DB to have (at least) these numbers of each,
+    and returns the number of reports created
+    """
+    from reports.models import DataPack, Environment, Language, Report, TestingType, Topic
+
+    rng = random.Random(seed)
+    User = get_user_model()
+
+    with transaction.atomic():
+        testing_type_objects = create_missing(
+            TestingType, testing_types, lambda i: TestingType(name=testing_type_name(i)), log,
+        )
+        topic_objects = create_missing(Topic, topics, lambda i: Topic(name=topic_name(i)), log)
+        for topic in topic_objects:
+            if not topic.tests_run.exists():
+                topic.tests_run.set(rng.sample(testing_type_objects, min(TESTS_PER_TOPIC, len(testing_type_objects))))
+        language_objects = create_missing(Language, languages, lambda i: Language(name=language_name(i)), log)
+        environment_objects = create_missing(
+            Environment, environments, lambda i: Environment(name=f"environment_{i + 1}"), log,
+        )
+
+        def make_user(i):
+            user = User(username=f"tester{i:03d}", email=f"tester{i:03d}@nuance.com")
+            # no password hashing: the testers of the benchmark do not log in
+            user.set_unusable_password()
+            return user
+
+        user_objects = create_missing(User, users, make_user, log)
+
+        def make_datapack(i):
+            language = language_objects[i % len(language_objects)]
+            topic = topic_objects[i // len(language_objects) % len(topic_objects)]
+            version = f"{1 + i // 1000}.{i % 1000 // 10}.{i % 10}"
+            return DataPack(
+                name=f"{language.name}-{topic.name}-{version}", language=language, topic=topic, version=version,
+                status=rng.choice(("In Progress", "Completed", "Not Released")),
+            )
+
+        datapack_objects = create_missing(DataPack, datapacks, make_datapack, log)
+        tests_run = {
+            topic.id: list(topic.tests_run.all()) for topic in topic_objects
+        }
+
+        last_id = Report.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        existing = Report.objects.count()
+        statuses, weights = zip(*REPORT_STATUSES)
+        # the latest datapacks have more reports
+        datapack_weights = list(accumulate(range(1, len(datapack_objects) + 1)))
+        for start in range(existing, reports, BATCH_SIZE):
+            batch = []
+            end = min(reports, start + BATCH_SIZE)
+            report_datapacks = rng.choices(datapack_objects, cum_weights=datapack_weights, k=end - start)
+            report_statuses = rng.choices(statuses, weights, k=end - start)
+            for i, datapack, status in zip(range(start, end), report_datapacks, report_statuses):
+                batch.append(Report(
+                    name=f"report {i + 1}",
+                    datapack=datapack,
+                    testing_type=rng.choice(tests_run[datapack.topic_id] or testing_type_objects),
+                    environment=rng.choice(environment_objects),
+                    tester=rng.choice(user_objects),
+                    status=status,
+                    accuracy=rng.choice(("n/a", "nadp", "ndp")),
+                    approvedBy=None if status == "Pending Approval" else rng.choice(user_objects).username,
+                    link_QAServer=f"http://qa-server/runs/{i + 1}",
+                    notes=rng.choice(("", "", "rerun after fix", "known issue")),
+                ))
+            # no signals: the listing is built below
+            Report.objects.bulk_create(batch)
+            log(f"Report: {end}/{reports}")
+        created = max(0, reports - existing)
+
+    if created:
+        # the ids are read back from the DB: MySQL does not return them from bulk_create
+        refresh_listings(after=last_id)
+    # what the cached tables and rows were rendered from changed
+    cache.bump_version(cache.REPORTS, cache.DATAPACKS, *[cache.datapack(datapack.id) for datapack in datapack_objects])
+    return created
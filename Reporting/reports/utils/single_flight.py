@@ -0,0 +1,49 @@
+import fcntl
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Single flight of the computations of cached values (see cache.cached): when several requests
+# miss the same entry at once (e.g. testers opening the same comparison after a regression was
+# found), one computes it and the others wait for it, then read it from the cache instead of
+# computing it again.
+#
+# The lock of a key is a lock (flock) on one of SINGLE_FLIGHT_STRIPES files of SINGLE_FLIGHT_DIR,
+# shared by all the processes of the server and released by the system if the process holding it
+# dies. A fixed number of files rather than one per key: they never have to be deleted (which
+# would race with the processes waiting on them), and two keys sharing a file only wait for each other.
+#
+# A request waits at most SINGLE_FLIGHT_TIMEOUT seconds, then computes the value itself. If the
+# computation fails (e.g. over a budget) nothing is cached, and the next request waiting computes it.
+
+POLL_INTERVAL = 0.05
+
+
+def _lock_path(key):
+    stripe = int(hashlib.sha1(key.encode("utf-8")).hexdigest(), 16) % settings.SINGLE_FLIGHT_STRIPES
+    return os.path.join(settings.SINGLE_FLIGHT_DIR, f"{stripe}.lock")
+
+
+@contextmanager
+def single_flight(key):
+    """
+    Runs the block holding the lock of `key`, once the other holders are done.
+    Yields False if it was not acquired within SINGLE_FLIGHT_TIMEOUT seconds (the block runs anyway)
+    """
+    os.makedirs(settings.SINGLE_FLIGHT_DIR, exist_ok=True)
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_TIMEOUT
+    with open(_lock_path(key), "a") as lock:
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    yield False
+                    return
+                time.sleep(POLL_INTERVAL)
+        # closing the file releases the lock
+        yield True
@@ -0,0 +1,171 @@
+import random
+
+from openpyxl import Workbook
+
+# Generators of synthetic result files, in the formats read by compare.py, for the benchmarks
+# (see the bench_parsers command) and to fill a test database (see seed_benchmark).
+#
+# Each generator writes a file of about `size` bytes (of text: an XLSX file is smaller, compressed)
+# made from a random.Random(seed), so the same arguments always give the same file, and returns
+# the number of rows written: lines of the text files (test cases of the travel corpus output),
+# rows of the XLSX file.
+
+WORDS = (
+    "navigate", "to", "the", "nearest", "gas", "station", "call", "mom", "play", "some", "jazz", "music",
+    "set", "a", "timer", "for", "ten", "minutes", "what", "is", "weather", "like", "tomorrow", "in", "paris",
+    "send", "message", "john", "turn", "on", "radio", "find", "restaurant", "near", "me", "open", "settings",
+)
+INTENTS = ("NAV_DESTINATION", "PHONE_CALL", "MEDIA_PLAY", "CLOCK_TIMER", "WEATHER_FORECAST", "SMS_SEND")
+FEATURES = (
+    "formatting_scheme_date", "formatting_scheme_time", "opt_censor_full_words_censor_profanities",
+    "itn_numbers", "itn_currency", "punctuation", "capitalization", "dictation_commands", "spoken_emoji",
+)
+NTE5_HEADER = "TestCase,Verdict,Description,WorkProduct,TestType,TestMethod,Tags,TestInput,TestOutput,TestClass\n"
+# header of the tests of a load test file, and the subtest of compare.get_subtest_type it is for
+LOAD_SUBTESTS = (
+    "100_oov", "1000_oov", "10000_oov", "noDLM", "100_oov_dynamic", "1000_oov_dynamic", "10000_oov_dynamic",
+)
+LOAD_ERRORS = ("NO_MATCH", "TIMEOUT", "CONNECTION_RESET", "BAD_AUDIO")
+
+
+def sentence(rng, n_words=(3, 9)):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(*n_words)))
+
+
+def write_accuracy_result(path, size, seed=0):
+    """
+    result.txt of an accuracy test: the WER without and with DLM and their difference (3rd line),
+    followed by the results of the utterances
+    """
+    rng = random.Random(seed)
+    wer_without, wer_with = rng.uniform(8, 15), rng.uniform(5, 12)
+    rows = 0
+    with open(path, "w") as f:
+        written = f.write(
+            f"WER w/o DLM: {wer_without:.2f}\n"
+            f"WER w/ DLM: {wer_with:.2f}\n"
+            f"WER difference (WER w/o DLM - WER w/ DLM): {wer_without - wer_with:.2f}\n"
+        )
+        while written < size:
+            rows += 1
+            ref = sentence(rng)
+            hyp = ref if rng.random() < 0.9 else sentence(rng)
+            written += f.write(f"utt_{rows:08d} ref: {ref} | hyp: {hyp} | errors: {0 if hyp == ref else rng.randint(1, 4)}\n")
+    return rows
+
+
+def write_travel_corpus_output(path, size, seed=0, fail_rate=0.05, intent_fail_rate=0.3):
+    """
+    console_output_Obfuscated.txt of a travel corpus test: one block per test case,
+    with the expected (mine) and actual (yours) results of the failed ones
+    """
+    rng = random.Random(seed)
+    rows = 0
+    written = 0
+    with open(path, "w") as f:
+        while written < size:
+            rows += 1
+            request = sentence(rng)
+            block = f"test case {rows}\nrequest: {request}\nresponse: {request}\n"
+            if rng.random() < fail_rate:
+                expected = sentence(rng)
+                if rng.random() < intent_fail_rate:
+                    expected = f"{rng.choice(INTENTS)} {expected}"
+                block += f"mine : {expected}\nyours: {request}\n"
+            written += f.write(block + "\n")
+    return rows
+
+
+def write_NTE5_csv(path, size, seed=0, fail_rate=0.1):
+    """
+    CSV of an NTE5 test: one line per test case, named after the feature it tests
+    """
+    rng = random.Random(seed)
+    rows = 0
+    with open(path, "w") as f:
+        written = f.write(NTE5_HEADER)
+        while written < size:
+            rows += 1
+            feature = rng.choice(FEATURES)
+            # the two formats of names of compare_NTE5
+            if rng.random() < 0.5:
+                test_case = f"test{rows:06d}_{rng.randint(1, 9)}_{feature}"
+            else:
+                test_case = f"test_exp_{rows}_{rng.randint(1, 9)}_{rng.randint(1, 9)}_1_{feature}"
+            verdict = "Pass" if rng.random() >= fail_rate else rng.choice(("Fail", "Error"))
+            written += f.write(
+                f"{test_case}, {verdict},, , Functional, Automated,, , , test_dp_{feature}.DatapackTest\n"
+            )
+    return rows
+
+
+def write_load_test_txt(path, size, seed=0, hosts=(4, 20)):
+    """
+    Text output of a load test: tests cycling through the subtests, each with its counts, errors,
+    statistics and the CPU/memory of `hosts` kryptons
+    """
+    rng = random.Random(seed)
+    rows = 0
+    tests = 0
+    written = 0
+    with open(path, "w") as f:
+        while written < size:
+            subtest = LOAD_SUBTESTS[tests % len(LOAD_SUBTESTS)]
+            tests += 1
+            n_hosts = rng.randint(*hosts)
+            calls = rng.randint(500, 5000)
+            recognitions = calls - rng.randint(0, 10)
+            errors = {error: rng.randint(0, 5) for error in rng.sample(LOAD_ERRORS, rng.randint(0, 3))}
+            lines = [
+                f"loadTest{subtest}-20221129-{tests:06d}-{n_hosts}ch:",
+                f"  {calls} calls",
+                f"  {recognitions} recognitions:",
+                f"  {recognitions - sum(errors.values())} Success",
+                *(f"  {count} {error}" for error, count in errors.items()),
+                "  stats:",
+                *(f"  {stat} {rng.uniform(0, 2):.3f}" for stat in ("audio", "audiotx", "lag", "rec", "conf")),
+                f"  latency {rng.uniform(0.2, 0.5):.3f}, 95% {rng.uniform(0.5, 1):.3f}",
+                f"  cpl {rng.uniform(1, 2):.3f}, 95% {rng.uniform(2, 4):.3f}",
+                "  monitors:",
+                "  cpu mem host",
+                *(f"  {rng.uniform(5, 95):.1f} {rng.uniform(10, 90):.1f} krypton{host:03d}" for host in range(n_hosts)),
+            ]
+            written += f.write("\n".join(lines) + "\n")
+            rows += len(lines)
+    return rows
+
+
+def write_load_test_xlsx(path, size, seed=0):
+    """
+    Excel summary of a load test: the distribution of the kryptons (first cell read by compare_load),
+    followed by the latencies of the calls
+    """
+    rng = random.Random(seed)
+    dynamic = [rng.randint(1, 6) for _ in range(4)]
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("load test")
+    sheet.append(["Load test summary"])
+    distribution = (
+        f"krypton distribution:   sequential preloaded ({rng.randint(10, 25)} kryptons) - parallel noDLM/dynamic  "
+        f"({sum(dynamic)} kryptons - i.e. {'/'.join(map(str, dynamic))} kr)"
+    )
+    sheet.append([distribution])
+    written = len(distribution)
+    rows = 0
+    while written < size:
+        rows += 1
+        row = [f"call_{rows:08d}", rng.choice(LOAD_SUBTESTS), round(rng.uniform(0.2, 1), 3), round(rng.uniform(1, 4), 3)]
+        sheet.append(row)
+        written += sum(len(str(value)) for value in row)
+    workbook.save(path)
+    return rows
+
+
+# {format: (generator, name of the file)}
+GENERATORS = {
+    "accuracy": (write_accuracy_result, "result.txt"),
+    "travel_corpus": (write_travel_corpus_output, "console_output_Obfuscated.txt"),
+    "NTE5": (write_NTE5_csv, "result.csv"),
+    "load_txt": (write_load_test_txt, "load_test.txt"),
+    "load_xlsx": (write_load_test_xlsx, "load_test.xlsx"),
+}
@@ -1,43 +1,108 @@
+import csv
 import json
 
-from django.shortcuts import render
-
 
 def date_handler(obj):
     return obj.isoformat() if hasattr(obj, "isoformat") else obj
 
 
-def get_reports_json(reports) -> str:
-    list = []
-    for report in reports:
-        approvedate = str(report.date_approve)
-        if approvedate == "None":
-            approvedate = ""
-
-        try:
-            testing_type = report.testing_type.name
-        except:
-            testing_type = ""
-
-        raw = {
-            "reportid": report.id,
-            "ReportName": report.name,
-            "Environment": report.environment.name,
-            "Topic": report.datapack.topic.name,
-            "Language": report.datapack.language.name,
-            "Tester": report.tester.name,
-            "Status": report.status,
-            "SubmittedDate": str(report.date_submit),
-            "ApprovedDate": approvedate,
-            "Path": report.link_QAServer,
-            "Notes": report.notes,
-            "JIRA": report.jira,
-            "Accuracy": report.accuracy,
-            "Datapack": report.datapack.name,
-            "ApprovedBy": report.approvedBy,
-            "TestingType": testing_type,
-            "Parameters": report.parameters,
-        }
-
-        list.append(raw)
-    return json.dumps(list, default=date_handler)
+# Streaming export of the reports (see views.export_reports), read from ReportListing:
+# {name in the export: field of ReportListing}
+EXPORT_FIELDS = {
+    "id": "report_id",
+    "name": "name",
+    "datapack": "datapack_name",
+    "topic": "topic_name",
+    "language": "language_name",
+    "environment": "environment_name",
+    "testing_type": "testing_type_name",
+    "tester": "tester_name",
+    "status": "status",
+    "accuracy": "accuracy",
+    "date_submit": "date_submit",
+    "date_approve": "date_approve",
+    "approved_by": "approvedBy",
+    "link_QAServer": "link_QAServer",
+    "notes": "notes",
+    "jira": "jira",
+    "file_name": "file_name",
+    "file_size": "file_size",
+}
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def iter_export_rows(listings, after=0, limit=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields the reports of the ReportListing queryset `listings` with an id greater than `after`,
+    as tuples of the values of EXPORT_FIELDS, in the order of their ids
+
+    The reports are read in pages of `chunk_size` (keyset pagination on the id), each one consumed
+    with .iterator(), so that the memory used does not depend on the number of reports, whatever the
+    DB driver (MySQLdb fetches the whole result of a query).
+    """
+    fields = list(EXPORT_FIELDS.values())
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_size = chunk_size if remaining is None else min(chunk_size, remaining)
+        page = listings.filter(report_id__gt=after).order_by("report_id").values_list(*fields)[:page_size]
+        count = 0
+        for row in page.iterator(chunk_size=page_size):
+            count += 1
+            after = row[0]
+            yield row
+        if remaining is not None:
+            remaining -= count
+        if count < page_size:
+            break
+
+
+def stream_ndjson(rows):
+    """
+    One JSON object per line
+    """
+    names = list(EXPORT_FIELDS)
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), default=date_handler) + "\n"
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """
+    Each row as a line of CSV
+    """
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_csv(rows):
+    yield from csv_lines([list(EXPORT_FIELDS)])
+    yield from csv_lines([date_handler(value) for value in row] for row in rows)
+
+
+def buffered(chunks, size=64 * 1024):
+    """
+    Groups the small chunks of text of `chunks` into chunks of about `size` characters,
+    except the first one, which is sent right away
+    """
+    chunks = iter(chunks)
+    for chunk in chunks:
+        yield chunk
+        break
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer)
@@ -0,0 +1,51 @@
+import logging
+import os
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+# Warm-up of the production server (see gunicorn.conf.py), run once in the gunicorn master after the
+# app is loaded and before the workers are forked: what it loads is shared by the workers, copy-on-write,
+# instead of being loaded by each one on its first requests.
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+# pages whose tables are rendered in the (shared) file cache, if they are not already
+CACHED_PAGES = ("reports", "dptracking")
+
+
+def warm_up(log=logger.info):
+    # the modules loaded on the first comparison (pandas is already loaded by compare.py)
+    import openpyxl  # noqa: F401
+    from reports.utils import compare_export  # noqa: F401
+
+    # the URL patterns
+    reverse("reports")
+
+    # the compiled templates (kept by the cached template loader, when DEBUG is off)
+    templates = 0
+    for root, _, names in os.walk(TEMPLATES_DIR):
+        for name in names:
+            if name.endswith(".html"):
+                get_template(os.path.relpath(os.path.join(root, name), TEMPLATES_DIR))
+                templates += 1
+
+    # the tables of the list pages, for anonymous users
+    from reports.views import DatapacksView, ReportsView
+    views = {"reports": ReportsView.as_view(), "dptracking": DatapacksView.as_view()}
+    try:
+        for name in CACHED_PAGES:
+            request = RequestFactory().get(reverse(name))
+            request.user = AnonymousUser()
+            views[name](request)
+    except Exception:
+        # e.g. the DB is not migrated yet: the workers will render them
+        logger.exception("The tables of the list pages could not be cached")
+    finally:
+        # the workers must not share the DB connections of the master
+        connections.close_all()
+    log(f"Warmed up: {templates} templates, tables of {', '.join(CACHED_PAGES)}")
@@ -0,0 +1,149 @@
+import io
+import json
+import os
+import time
+import zipfile
+
+from reports.utils.listing import tester_name
+
+# Streams a zip archive to the client while it is being generated:
+# - no temporary archive is written to disk
+# - each member is read and compressed in chunks, so memory use does not depend
+#   on the size or the number of the archived files
+#
+# zipfile supports writing to unseekable streams: sizes and CRCs of each member
+# are written in a data descriptor after the member's data.
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+# deflating these again only costs CPU
+ALREADY_COMPRESSED_EXTENSIONS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar",
+    ".xlsx", ".xlsm", ".docx", ".pptx",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp",
+    ".mp3", ".ogg", ".flac",
+}
+
+
+class _ZipSink(io.RawIOBase):
+    """
+    Unseekable file object collecting the bytes written by ZipFile until they are drained
+    """
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def compress_type_for(filename):
+    _, extension = os.path.splitext(filename)
+    if extension.lower() in ALREADY_COMPRESSED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def stream_zip(members):
+    """
+    Generates the bytes of a zip archive
+
+    `members` is an iterable of (arcname, source) tuples, where source is either
+    the path of a file, or an iterable of bytes chunks (e.g. a generated manifest).
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as archive:
+        for arcname, source in members:
+            if isinstance(source, (str, os.PathLike)):
+                zinfo = zipfile.ZipInfo.from_file(source, arcname)
+                zinfo.compress_type = compress_type_for(arcname)
+                with open(source, "rb") as src, archive.open(zinfo, "w") as dst:
+                    while True:
+                        chunk = src.read(READ_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            else:
+                zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+                # size unknown up front: reserve zip64 fields in case the generated member is large
+                with archive.open(zinfo, "w", force_zip64=True) as dst:
+                    for chunk in source:
+                        dst.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # central directory
+    yield sink.drain()
+
+
+def report_metadata(report):
+    return {
+        "id": report.id,
+        "name": report.name,
+        "datapack": report.datapack.name,
+        "testing_type": report.testing_type.name,
+        "environment": report.environment.name if report.environment else None,
+        # the name shown on the list pages, not the email address
+        "tester": tester_name(report.tester),
+        "status": report.status,
+        "accuracy": report.accuracy,
+        "date_submit": report.date_submit.isoformat() if report.date_submit else None,
+        "date_approve": report.date_approve.isoformat() if report.date_approve else None,
+        "approvedBy": report.approvedBy,
+        "link_QAServer": report.link_QAServer,
+        "jira": report.jira,
+        "notes": report.notes,
+        "file": None,
+    }
+
+
+def report_arcname(report):
+    return f"{report.testing_type.name}/{report.id}_{os.path.basename(report.file_report.name)}"
+
+
+def stream_reports_zip(reports, chunk_size=200):
+    """
+    Generates a zip archive of the result files of `reports` (a queryset),
+    with a "manifest.json" describing every report.
+
+    The queryset is consumed twice with .iterator(), once for the manifest
+    and once for the files, so that no list of reports is kept in memory.
+    """
+    reports = reports.select_related("datapack", "testing_type", "environment", "tester").order_by("id")
+
+    def manifest():
+        yield b"[\n"
+        first = True
+        for report in reports.iterator(chunk_size=chunk_size):
+            entry = report_metadata(report)
+            if report.file_report:
+                entry["file"] = report_arcname(report)
+                entry["file_missing"] = not os.path.isfile(report.file_report.path)
+            yield ("" if first else ",\n").encode("utf-8") + json.dumps(entry).encode("utf-8")
+            first = False
+        yield b"\n]\n"
+
+    def members():
+        yield "manifest.json", manifest()
+        for report in reports.exclude(file_report="").exclude(file_report__isnull=True).iterator(chunk_size=chunk_size):
+            path = report.file_report.path
+            if os.path.isfile(path):
+                yield report_arcname(report), path
+
+    return stream_zip(members())
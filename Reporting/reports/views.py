@@ -2,37 +2,115 @@ import copy
 import json
 import os
 import re
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.utils.functional import cached_property
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse, FileResponse, Http404
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotAllowed, FileResponse, Http404, StreamingHttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from django.utils.decorators import method_decorator
 from django.views.generic import CreateView, DetailView, UpdateView, DeleteView
 from django.views import View
 
-import reports.utils.backend as backend
 from reports.utils.forms import (
     ReportFiltersForm,
     SubmitreportForm,
     DatapackFiltersForm
 )
-from reports.models import Report, TestingType, Environment, DataPack
+from reports.models import Report, ReportListing, TestingType, Environment, DataPack
 from reports.utils.forms import SubmitreportFormSet, UpdateReportForm, UpdateDatapackForm
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from datetime import datetime
 from django.db.utils import DataError
-from reports.utils.compare import compare_accuracy, compare_travel_corpus, compare_NTE5, compare_load, compare_load_advanced, dict_to_str
+from reports.utils.compare import (
+    LOAD_STATS, ComparisonError, check_comparable, compare_reports, get_datapack_type,
+    is_same_testing_type, select_fields,
+)
+from reports.utils.compare_export import admitted_xlsx, comparison_rows
+from reports.utils.file_index import NotTextFile, get_line_index
+from reports.utils.zip_stream import stream_reports_zip
+from reports.utils.param_harvest import schedule_parameter_harvest
+from reports.utils.chunked_upload import UploadError, create_upload, get_upload, append_chunk, finalize_upload, attach_upload
+from reports.utils import cache, metrics
+from reports.utils.admission import AdmittedStream, Busy, acquire
+from reports.utils.executors import run_in
+from reports.utils.cache import cached_render
+from reports.utils.views_helpers import (
+    EXPORT_CONTENT_TYPES, buffered, csv_lines, iter_export_rows, stream_csv, stream_ndjson
+)
+from reports.utils.conditional import conditional_on
+from reports.utils.profiling import clear_slow_requests, slow_requests, timed
+
+
+def get_filters(filter_form):
+    """
+    Returns the values submitted for the fields of `filter_form`, to key the cached tables
+    """
+    return {name: filter_form.data.get(name) for name in filter_form.fields}
+
+
+def render_filter_fields(request, filter_form, name):
+    """
+    Returns the rendered drop-downs of `filter_form`, cached until a report or a datapack is changed
+    """
+    return cached_render(
+        request, "reports/filter_fields.html", lambda: {"filter_form": filter_form},
+        f"{name}_filters", (cache.REPORTS, cache.DATAPACKS), get_filters(filter_form),
+    )
+
+
+def render_reports_table(request, reports, name, filters=None):
+    """
+    Returns the rendered table of `reports`, cached until a report or a datapack is changed
+
+    `reports` is only queried if the table is not cached.
+    """
+    return cached_render(
+        request, "reports/reports_table.html", lambda: {"reports": reports},
+        name, (cache.REPORTS, cache.DATAPACKS), filters or {},
+    )
+
+
+# field of ReportListing filtered by each field of ReportFiltersForm
+LISTING_FILTERS = {
+    "datapack": "datapack",
+    "language": "language",
+    "topic": "topic",
+    "test_type": "testing_type",
+    "environment": "environment",
+    "tester": "tester",
+}
+
+
+def filter_listings(listings, filter_form):
+    """
+    Filters the ReportListing queryset `listings` with the choices of `filter_form` (ReportFiltersForm)
+    """
+    if filter_form.is_valid():
+        for changedata in filter_form.changed_data:
+            listings = listings.filter(**{LISTING_FILTERS[changedata]: filter_form.cleaned_data[changedata]})
+    return listings
+
 
 class ReportsView(View):
+    @method_decorator(conditional_on(cache.REPORTS, cache.DATAPACKS))
     def get(self, request):
         """
         Displays the 100 latest reports
         """
-        reports = Report.objects.order_by("-id")[:100]
+        reports = ReportListing.objects.order_by("-report")[:100]
         filter_form = ReportFiltersForm()
         return render(
             request, "reports/reports.html", {
                 "reports": reports,
+                "reports_table": render_reports_table(request, reports, "latest_reports"),
                 "filter_form": filter_form,
+                "filter_fields": render_filter_fields(request, filter_form, "reports"),
                 "compare": False,
             }
         )
@@ -43,33 +121,11 @@ class ReportsView(View):
         """
         # filter reports by the selected filters
         filter_form = ReportFiltersForm(request.POST)
-        reports = Report.objects.all().order_by("-id")
-        if filter_form.is_valid():
-            for changedata in filter_form.changed_data:
-                if changedata == "topic":
-                    reports = reports.filter(
-                        datapack__topic=filter_form.cleaned_data["topic"]
-                    )
-                if changedata == "language":
-                    reports = reports.filter(
-                        datapack__language=filter_form.cleaned_data["language"]
-                    )
-                if changedata == "datapack":
-                    reports = reports.filter(
-                        datapack=filter_form.cleaned_data["datapack"]
-                    )
-                if changedata == "tester":
-                    reports = reports.filter(
-                        tester=filter_form.cleaned_data["tester"]
-                    )
-                if changedata == "test_type":
-                    reports = reports.filter(
-                        testing_type=filter_form.cleaned_data["test_type"]
-                    )
-                if changedata == "environment":
-                    reports = reports.filter(
-                        environment=filter_form.cleaned_data["environment"]
-                    )
+        reports = filter_listings(ReportListing.objects.order_by("-report"), filter_form)
+        reports_table = render_reports_table(
+            request, reports, "reports", get_filters(filter_form)
+        )
+        filter_fields = render_filter_fields(request, filter_form, "reports")
 
         # get the reports that the user selected (selected checkboxes)
         to_compare = []
@@ -84,13 +140,6 @@ class ReportsView(View):
 
         # determines if the user wants to do a comparison (reports were selected for comparison)
         if to_compare:
-            def get_datapack_type(name):
-                """
-                Returns the datapack name with the version stripped off
-                """
-                language, country, topic, version = name.split("-")
-                return f"{language}-{country}-{topic}"
-
             # e.g. fra-FRA-GEN-4.0.0 and fra-FRA-GEN-4.1.0 both have the same type: fra-FRA-GEN
             unique_datapack_types = set([get_datapack_type(report.datapack.name) for report in to_compare])
             # check if all the reports are for the same datapack type
@@ -101,7 +150,9 @@ class ReportsView(View):
                 return render(
                     request, "reports/reports.html", {
                         "reports": reports,
+                        "reports_table": reports_table,
                         "filter_form": filter_form,
+                        "filter_fields": filter_fields,
                         "same_datapack_type": False,
                     }
                 )
@@ -109,19 +160,15 @@ class ReportsView(View):
             # check if all the reports are for the same testing type
             # e.g. cannot compare an accuracy test result with a travel corpus test result
             types_arr = [report.testing_type.name for report in to_compare]
-            is_travel_corpus_comp = True
-            for tt in types_arr:
-                if "TravelCorpus" not in tt:
-                    is_travel_corpus_comp = False
-                    break
-
             unique_testing_types = set(types_arr)
-            same_testing_type = True if len(unique_testing_types) == 1 or is_travel_corpus_comp else False
+            same_testing_type = is_same_testing_type(types_arr)
             if not same_testing_type:
                 return render(
                     request, "reports/reports.html", {
                         "reports": reports,
+                        "reports_table": reports_table,
                         "filter_form": filter_form,
+                        "filter_fields": filter_fields,
                         "same_testing_type": False,
                     }
                 )
@@ -139,7 +186,9 @@ class ReportsView(View):
                 return render(
                     request, "reports/reports.html", {
                         "reports": reports,
+                        "reports_table": reports_table,
                         "filter_form": filter_form,
+                        "filter_fields": filter_fields,
                         "reports_missing_file": reports_missing_file,
                     }
                 )
@@ -149,46 +198,46 @@ class ReportsView(View):
             # 2. all the selected reports are for the same testing type (e.g. accuracy 8k)
             # 3. all the selected reports have a test result file that was uploaded during submission
 
-            comparison_result = []
             # get the testing type
             testing_type = unique_testing_types.pop()
             table_title = testing_type
             if len(set(types_arr)) > 1:
                 table_title = f"{types_arr[0]} vs. {types_arr[1]}"
-            # different testing types test different things, and thus produce different result files
-            # this means that the comparison of accuracy test results
-            # is handled differently from the comparison of travel corpus test results
             # please refer to utils/compare.py to see how all the different comparisons are handled
-            if testing_type == "MIX_accuracy_test_8k" or testing_type == "MIX_accuracy_test_16k" or testing_type == "NES_accuracy_test_8k":
-                comparison_result = compare_accuracy(to_compare)
-            if testing_type == "NTE5":
-                comparison_result = compare_NTE5(to_compare)
-            if (
-                    testing_type == "FAST_DNN_TravelCorpus" or
-                    testing_type == "DNN_TravelCorpus" or
-                    testing_type == "MIX_TravelCorpus_2.15" or
-                    testing_type == "MIX_TravelCorpus_2.22" or
-                    testing_type == "NLE_NES_TravelCorpus"
-            ):
-                comparison_result = compare_travel_corpus(to_compare)
-            if testing_type == "load_test":
-                comparison_result = compare_load_advanced(to_compare, True)
+            try:
+                comparison_result = compare_reports(to_compare, testing_type)
+            except ComparisonError as err:
+                # e.g. over the memory or time budget, or the server is busy
+                return retry_later(render(
+                    request, "reports/reports.html", {
+                        "reports": reports,
+                        "reports_table": reports_table,
+                        "filter_form": filter_form,
+                        "filter_fields": filter_fields,
+                        "comparison_error": str(err),
+                    }, status=err.status,
+                ), err)
 
             return render(
                 request, "reports/reports.html", {
                     "reports": reports,
+                    "reports_table": reports_table,
                     "filter_form": filter_form,
+                    "filter_fields": filter_fields,
                     "testing_type": testing_type,
                     "table_title": table_title,
                     "comparison_result": comparison_result,
                     "to_compare": to_compare,
+                    "compare_ids": ",".join(str(report.id) for report in to_compare),
                 }
             )
 
         return render(
             request, "reports/reports.html", {
                 "reports": reports,
+                "reports_table": reports_table,
                 "filter_form": filter_form,
+                "filter_fields": filter_fields,
                 "compare": False,
             }
         )
@@ -226,6 +275,8 @@ class ReportCreateView(LoginRequiredMixin, CreateView):
                 "environments": environments,
             }
             context["formset"] = SubmitreportFormSet()
+            # files bigger than this are uploaded in chunks before the form is submitted
+            context["chunk_size"] = settings.CHUNKED_UPLOAD_CHUNK_SIZE
         return context
 
     def post(self, request, *args, **kwargs) -> HttpResponse:
@@ -240,10 +291,21 @@ class ReportCreateView(LoginRequiredMixin, CreateView):
             for i in range(total_form):
                 report = Report.create_new_report(data, prefix=f"form-{i}-")
                 if type(report) == Report:
+                    # id of a file uploaded in chunks before the form was submitted
+                    upload_id = data.get(f"form-{i}-upload_id")
                     try:
-                        report.save()
+                        if upload_id:
+                            attach_upload(report, upload_id, request.user)
+                        else:
+                            report.save()
+                        if report.file_report:
+                            metrics.UPLOAD_SIZE.observe(report.file_report.size, method="chunked" if upload_id else "form")
+                        schedule_parameter_harvest(report)
                     except DataError:
                         pass # ignore the "Data too long for column 'file_report'" error and continue
+                    except UploadError as err:
+                        saved_reports.append({"report": report.name, "status": str(err)})
+                        continue
                     saved_reports.append({"report": report.name, "status": "Success"})
                 else:
                     saved_reports.append(
@@ -266,14 +328,14 @@ def submit_report_api(request):
         try:
             data = copy.deepcopy(json.loads(request.body))
             data["file_report"] = request.FILES.get("file")
-            try:
-                data["parameters"] = backend.getParameterINI(data.get("link_QAServer"))
-            except:
-                data["parameters"] = ""
 
             report = Report.create_new_report(data)
             if type(report) == Report:
                 report.save()
+                if report.file_report:
+                    metrics.UPLOAD_SIZE.observe(report.file_report.size, method="api")
+                # the parameter file is looked up on the share after the response is sent
+                schedule_parameter_harvest(report)
                 res = HttpResponse("Upload Successful! ", report)
             else:
                 res = HttpResponse(report.get("error"))
@@ -283,6 +345,221 @@ def submit_report_api(request):
         finally:
             return res
 
+
+@require_GET
+@conditional_on(cache.REPORTS, cache.DATAPACKS)
+def export_reports(request):
+    """
+    Streams the reports matching the filters of ReportFiltersForm, given as ids (e.g. ?topic=3&test_type=5),
+    in the order of their ids, as NDJSON (default) or CSV (?format=csv)
+
+    ?after=<id> only exports the reports after the report <id> (keyset cursor: pass the last id received),
+    ?limit=<n> at most n reports.
+    """
+    export_format = request.GET.get("format", "ndjson")
+    if export_format not in EXPORT_CONTENT_TYPES:
+        return JsonResponse({"error": f"Unknown format {export_format}"}, status=400)
+    filter_form = ReportFiltersForm(request.GET)
+    if not filter_form.is_valid():
+        return JsonResponse({"error": filter_form.errors}, status=400)
+    try:
+        after = int(request.GET.get("after", 0))
+        limit = int(request.GET["limit"]) if "limit" in request.GET else None
+    except ValueError:
+        return JsonResponse({"error": "after and limit must be numbers"}, status=400)
+
+    try:
+        slot = acquire("export")
+    except Busy as err:
+        return retry_later(JsonResponse({"error": str(err)}, status=err.status), err)
+    rows = iter_export_rows(filter_listings(ReportListing.objects.all(), filter_form), after=after, limit=limit)
+    stream = stream_csv(rows) if export_format == "csv" else stream_ndjson(rows)
+    response = StreamingHttpResponse(
+        AdmittedStream(slot, buffered(stream)), content_type=EXPORT_CONTENT_TYPES[export_format],
+    )
+    if export_format == "csv":
+        response["Content-Disposition"] = 'attachment; filename="reports.csv"'
+    return response
+
+
+def get_list_param(params, name):
+    return [value for value in params.get(name, "").split(",") if value]
+
+
+def get_reports_to_compare(request):
+    """
+    The reports ?reports=<id>,<id>,... to compare like the reports page
+
+    ?stats=<stat>,... only keeps these statistics of the load tests (see LOAD_STATS).
+    Returns the reports, their testing type and the statistics, or raises ComparisonError.
+    """
+    try:
+        report_ids = [int(report_id) for report_id in get_list_param(request.GET, "reports")]
+    except ValueError:
+        raise ComparisonError("reports must be a list of report ids")
+    if not report_ids:
+        raise ComparisonError("No reports to compare")
+    reports = Report.objects.select_related("datapack", "testing_type").in_bulk(report_ids)
+    missing = [report_id for report_id in report_ids if report_id not in reports]
+    if missing:
+        raise ComparisonError(f"Unknown reports: {missing}", status=404)
+    # in the order requested
+    to_compare = [reports[report_id] for report_id in report_ids]
+    check_comparable(to_compare)
+    stats = get_list_param(request.GET, "stats") or None
+    if stats and set(stats) - set(LOAD_STATS):
+        raise ComparisonError(f"Unknown stats, available: {', '.join(LOAD_STATS)}")
+    return to_compare, to_compare[0].testing_type.name, stats
+
+
+async def get_comparison(request):
+    """
+    Compares the reports of the request (see get_reports_to_compare) in the "comparison" pool
+
+    Returns the reports, their testing type and the results, or raises ComparisonError.
+    """
+    to_compare, testing_type, stats = await sync_to_async(get_reports_to_compare)(request)
+    result = await run_in("comparison", compare_reports, to_compare, testing_type, stats)
+    return to_compare, testing_type, result
+
+
+def retry_later(response, err):
+    """
+    Adds the Retry-After header of an error due to the load of the server (Busy, ComparisonError)
+    """
+    if getattr(err, "retry_after", None):
+        response["Retry-After"] = str(err.retry_after)
+    return response
+
+
+def comparison_view(view):
+    """
+    Comparison endpoints (async GET views): errors are returned as JSON
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # require_GET of Django 4.0 only wraps sync views
+        if request.method != "GET":
+            return HttpResponseNotAllowed(["GET"])
+        try:
+            return await view(request, *args, **kwargs)
+        except ComparisonError as err:
+            return retry_later(JsonResponse({"error": str(err)}, status=err.status), err)
+    return wrapper
+
+
+@comparison_view
+async def compare_reports_api(request):
+    """
+    Returns the results of the comparison of the reports (see get_comparison) as JSON numbers
+
+    ?fields=<field>,... only returns these fields of the results (e.g. ?fields=calls,success for load tests)
+    """
+    to_compare, testing_type, result = await get_comparison(request)
+    fields = get_list_param(request.GET, "fields")
+    if fields:
+        result = select_fields(result, fields)
+    return JsonResponse({
+        "testing_type": testing_type,
+        "reports": [
+            {"id": report.id, "name": report.name, "datapack": report.datapack.name} for report in to_compare
+        ],
+        "result": result,
+    })
+
+
+@comparison_view
+async def export_comparison(request):
+    """
+    Downloads the table of the comparison of the reports (see get_comparison) as CSV (default) or XLSX (?format=xlsx)
+
+    The CSV is streamed, the XLSX is written whole before it is sent, in a slot of the "export" pool.
+    """
+    export_format = request.GET.get("format", "csv")
+    if export_format not in ("csv", "xlsx"):
+        raise ComparisonError(f"Unknown format {export_format}")
+    to_compare, testing_type, result = await get_comparison(request)
+    rows = comparison_rows(to_compare, testing_type, result)
+    filename = f"comparison-{'-'.join(str(report.id) for report in to_compare)}.{export_format}"
+    if export_format == "xlsx":
+        xlsx = await run_in("comparison", admitted_xlsx, rows, testing_type)
+        return FileResponse(xlsx, as_attachment=True, filename=filename)
+    response = StreamingHttpResponse(buffered(csv_lines(rows)), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def upload_response(upload):
+    return JsonResponse({
+        "upload_id": upload.upload_id,
+        "filename": upload.filename,
+        "size": upload.size,
+        "offset": upload.offset,
+        "completed": upload.completed,
+        "sha256": upload.sha256,
+    })
+
+
+def upload_view(view):
+    """
+    Chunked upload endpoints: only for logged in users, errors are returned as JSON
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Please login to upload a file"}, status=403)
+        try:
+            return view(request, *args, **kwargs)
+        except UploadError as err:
+            return JsonResponse({"error": str(err)}, status=err.status)
+    return wrapper
+
+
+@require_POST
+@upload_view
+def upload_init(request):
+    """
+    Starts the chunked upload of a file: POST filename, size
+    """
+    upload = create_upload(request.user, request.POST.get("filename"), request.POST.get("size"))
+    response = upload_response(upload)
+    response["Location"] = reverse("upload_status", args=[upload.upload_id])
+    return response
+
+
+@require_GET
+@upload_view
+def upload_status(request, upload_id):
+    """
+    Returns the number of bytes received so far, to resume an interrupted upload
+    """
+    return upload_response(get_upload(upload_id, request.user))
+
+
+@require_POST
+@upload_view
+def upload_append(request, upload_id):
+    """
+    Appends the body of the request (raw bytes) at ?offset= of the upload
+    """
+    try:
+        offset = int(request.GET.get("offset", ""))
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        raise UploadError("Missing offset")
+    # the body is streamed to the staging file, never loaded in memory
+    return upload_response(append_chunk(upload_id, request.user, offset, request, length))
+
+
+@require_POST
+@upload_view
+def upload_finalize(request, upload_id):
+    """
+    Completes the upload, optionally checking the SHA-256 of the file: POST sha256
+    """
+    return upload_response(finalize_upload(upload_id, request.user, request.POST.get("sha256")))
+
+
 class UpdateReportView(LoginRequiredMixin, UpdateView):
     model = Report
     form_class = UpdateReportForm
@@ -340,7 +617,56 @@ class DeleteReportView(LoginRequiredMixin, DeleteView):
     login_url = reverse_lazy("login")
     template_name = "reports/report_confirm_delete.html"
 
+class DatapackRow:
+    """
+    A row of the tracking table: a datapack and its reports, by testing type
+
+    The row is rendered once and cached under the version of its datapack (see dptracking/body.html),
+    so its reports are only queried when the row is rendered.
+    """
+    def __init__(self, datapack, version, testing_types):
+        self.datapack = datapack
+        self.version = version
+        self.testing_types = testing_types
+
+    @cached_property
+    def reports_by_testing_type(self):
+        """
+        {testing_type_1: [report_1, report_2, ...], testing_type_2: None, ...}
+        """
+        reports = {}
+        for report in self.datapack.report_set.order_by("id"):
+            reports.setdefault(report.testing_type_id, []).append(report)
+        return {testing_type.name: reports.get(testing_type.id) for testing_type in self.testing_types}
+
+
+def get_datapack_rows(datapacks, testing_types):
+    versions = cache.get_versions(*[cache.datapack(datapack.id) for datapack in datapacks])
+    return [DatapackRow(datapack, version, testing_types) for datapack, version in zip(datapacks, versions)]
+
+
+def render_datapacks_table(request, datapacks, testing_types, name, filters=None):
+    """
+    Returns the rendered tracking table, cached until a report or a datapack is changed
+    """
+    def get_context():
+        columns = list(testing_types)
+        return {
+            "datapack_rows": get_datapack_rows(list(datapacks), columns),
+            "testing_types": columns,
+            # the cached rows depend on the columns
+            "testing_types_key": ",".join(str(testing_type.id) for testing_type in columns),
+            "row_cache_timeout": settings.TABLE_CACHE_TIMEOUT,
+        }
+
+    return cached_render(
+        request, "reports/dptracking/body.html", get_context,
+        name, (cache.REPORTS, cache.DATAPACKS), filters or {},
+    )
+
+
 class DatapacksView(View):
+    @method_decorator(conditional_on(cache.REPORTS, cache.DATAPACKS))
     def get(self, request):
         """
         Displays the 100 latest datapacks and their reports
@@ -350,48 +676,11 @@ class DatapacksView(View):
         testing_types = TestingType.objects.all()
         datapacks = DataPack.objects.order_by("-id")[:100]
 
-        datapacks_and_reports = []
-        # datapacks_and_reports = [
-        #    (
-        #       datapack_1, {
-        #       testing_type_1: [report_1, report_2, ...],
-        #       testing_type_2: [report_1, report_2, ...],
-        #       ...
-        #       }
-        #    ),
-        #    (
-        #       datapack_2, {
-        #       testing_type_1: [report_1, report_2, ...],
-        #       testing_type_2: [report_1, report_2, ...],
-        #       ...
-        #       }
-        #    ),
-        #    (
-        #       datapack_3, {
-        #       testing_type_1: [report_1, report_2, ...],
-        #       testing_type_2: [report_1, report_2, ...],
-        #       ...
-        #       }
-        #    ),
-        #    ...
-        # ]
-        for datapack in datapacks:
-            reports = {}
-            # get all reports for this datapack
-            datapack_reports = datapack.report_set.all()
-            for testing_type in testing_types:
-                report_w_testing_type_exists = datapack_reports.filter(testing_type=testing_type)
-                if report_w_testing_type_exists:
-                    reports[testing_type.name] = list(report_w_testing_type_exists)
-                else:
-                    reports[testing_type.name] = None
-            datapacks_and_reports.append((datapack, reports))
-
         return render(
             request, "reports/dptracking/tracking.html", {
-                "datapacks_and_reports": datapacks_and_reports,
+                "datapacks_table": render_datapacks_table(request, datapacks, testing_types, "latest_datapacks"),
                 "filter_form": filter_form,
-                "testing_types": testing_types
+                "filter_fields": render_filter_fields(request, filter_form, "datapacks"),
             }
         )
 
@@ -429,23 +718,13 @@ class DatapacksView(View):
         else:
             testing_types = topic.tests_run.all()
 
-        datapacks_and_reports = []
-        for datapack in datapacks:
-            reports = {}
-            datapack_reports = datapack.report_set.all()
-            for testing_type in testing_types:
-                report_w_testing_type_exists = datapack_reports.filter(testing_type=testing_type)
-                if report_w_testing_type_exists:
-                    reports[testing_type.name] = list(report_w_testing_type_exists)
-                else:
-                    reports[testing_type.name] = None
-            datapacks_and_reports.append((datapack, reports))
-
         return render(
             request, "reports/dptracking/tracking.html", {
-                "datapacks_and_reports": datapacks_and_reports,
+                "datapacks_table": render_datapacks_table(
+                    request, datapacks, testing_types, "datapacks", get_filters(filter_form)
+                ),
                 "filter_form": filter_form,
-                "testing_types": testing_types,
+                "filter_fields": render_filter_fields(request, filter_form, "datapacks"),
             }
         )
 
@@ -458,28 +737,162 @@ class UpdateDatapackView(LoginRequiredMixin, UpdateView):
     login_url = reverse_lazy("login")
 
 
-def view_file(request, report_id):
-    report = Report.objects.get(pk=report_id)
-    file_path = report.file_report.path
-    response = FileResponse(open(file_path, 'rb'))
-    response['Content-Disposition'] = 'inline; filename=' + os.path.basename(file_path)
+def get_report_file_path(report):
+    """
+    Returns the path of the file of a report,
+    raises Http404 if the report has no file or its file does not exist anymore
+    """
+    with timed("file"):
+        exists = bool(report.file_report) and os.path.isfile(report.file_report.path)
+    if not exists:
+        raise Http404("The file of this report does not exist")
+    return report.file_report.path
+
+
+def report_file_response(report, disposition):
+    """
+    FileResponse of the file of a report, `disposition` "inline" or "attachment"
+    """
+    file_path = get_report_file_path(report)
+    with timed("file"):
+        response = FileResponse(open(file_path, 'rb'))
+    response['Content-Disposition'] = f'{disposition}; filename=' + os.path.basename(file_path)
+    return response
+
+
+async def serve_report_file(request, report_id, disposition):
+    # the file system calls in the "file_io" pool: a slow NFS share does not hold the event loop
+    report = await sync_to_async(get_object_or_404)(Report, pk=report_id)
+    response = await run_in("file_io", report_file_response, report, disposition)
+    metrics.FILE_SERVED_BYTES.inc(int(response.get("Content-Length", 0)), view=request.resolver_match.url_name)
     return response
 
 
-def download_file(request, report_id):
-    report = Report.objects.get(pk=report_id)
-    file_path = report.file_report.path
-    response = FileResponse(open(file_path, 'rb'))
-    response['Content-Disposition'] = 'attachment; filename=' + os.path.basename(file_path)
+async def view_file(request, report_id):
+    return await serve_report_file(request, report_id, "inline")
+
+
+async def download_file(request, report_id):
+    return await serve_report_file(request, report_id, "attachment")
+
+
+def zip_response(reports, filename):
+    try:
+        slot = acquire("export")
+    except Busy as err:
+        return retry_later(HttpResponse(str(err), status=err.status), err)
+    response = StreamingHttpResponse(AdmittedStream(slot, stream_reports_zip(reports)), content_type="application/zip")
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
+def download_datapack_files(request, datapack_name):
+    """
+    Streams a zip of the result files of all the reports of a datapack, with a manifest of the reports
+    """
+    reports = Report.objects.filter(datapack__name=datapack_name.strip())
+    if not reports.exists():
+        raise Http404("No reports for this datapack")
+    return zip_response(reports, f"{datapack_name.strip()}.zip")
+
+
+def download_report_files(request):
+    """
+    Streams a zip of the result files of the selected reports, with a manifest of the reports
+
+    The reports are selected either with ?ids=1,2,3
+    or with the "compare-{{ report.id }}" checkboxes of the reports page
+    """
+    report_ids = []
+    if request.method == "POST":
+        for field in request.POST:
+            if field.startswith("compare-"):
+                _, report_id = field.split("-")
+                report_ids.append(report_id)
+    else:
+        report_ids = [report_id for report_id in request.GET.get("ids", "").split(",") if report_id]
+
+    if not report_ids or not all(report_id.isdigit() for report_id in report_ids):
+        return HttpResponse("Please select at least one report", status=400)
+    return zip_response(Report.objects.filter(id__in=report_ids), "reports.zip")
+
+
+# number of lines shown per page by the file viewer
+FILE_VIEWER_DEFAULT_LINES = 200
+FILE_VIEWER_MAX_LINES = 2000
+
+
+def read_file_window(report, line, count, query, search_from):
+    """
+    Returns the line index of the file of a report, the first line of the window (the search hit
+    if `query` is found) and its lines
+    """
+    index = get_line_index(get_report_file_path(report))
+    hit = index.search(query, from_line=search_from) if query else None
+    if hit:
+        line = hit
+    return index, line, hit, index.read_lines(line, count)
+
+
+async def view_file_window(request, report_id):
+    """
+    Displays a window of lines of a (possibly very large) text result file.
+
+    GET parameters:
+        line:  first line of the window (1-based), defaults to 1
+        count: number of lines in the window
+        q:     text to search for, starting from `line`
+        last_q: the query whose hit is shown at `line`; if it is `q`, the search is repeated
+                and starts from the line after `line`
+
+    The file is never read as a whole: a cached line-offset index is used
+    to seek straight to the requested line or search hit.
+    """
+    report = await sync_to_async(get_object_or_404)(Report, pk=report_id)
+
+    def get_int(name, default):
+        try:
+            return int(request.GET.get(name, default))
+        except (TypeError, ValueError):
+            return default
+
+    count = min(max(get_int("count", FILE_VIEWER_DEFAULT_LINES), 1), FILE_VIEWER_MAX_LINES)
+    line = max(get_int("line", 1), 1)
+    query = request.GET.get("q", "")
+    # "Find next" on the hit of the same query moves on to the next one, a new query may match `line`
+    search_from = line + 1 if query and request.GET.get("last_q") == query else line
+
+    # the index and the search read the file: in the "file_io" pool, like the files served
+    try:
+        index, line, hit, lines = await run_in(
+            "file_io", read_file_window, report, line, count, query, search_from,
+        )
+    except NotTextFile as err:
+        return HttpResponse(str(err), status=415)
+
+    return await sync_to_async(render)(
+        request, "reports/file_viewer.html", {
+            "report": report,
+            "lines": lines,
+            "line": line,
+            "count": count,
+            "n_lines": index.n_lines,
+            "query": query,
+            "hit": hit,
+            "search_from": search_from,
+            "not_found": bool(query) and not hit,
+            "prev_line": max(line - count, 1) if line > 1 else None,
+            "next_line": line + count if line + count <= index.n_lines else None,
+            "last_line": max(index.n_lines - count + 1, 1),
+        }
+    )
+
+
 # An endpoint to use for viewing and downloading files
 class DownloadReportView(View):
     # Endpoint to allow users to view and download files within the application
     def get(self, request, report_id, download=False):
-        report = Report.objects.get(pk=report_id)
-        file_path = report.file_report.path
+        file_path = get_report_file_path(get_object_or_404(Report, pk=report_id))
         response = FileResponse(open(file_path, 'rb'))
         if download:
             response['Content-Disposition'] = 'attachment; filename=' + os.path.basename(file_path)
@@ -490,107 +903,79 @@ class DownloadReportView(View):
 
 # An endpoint to view the history of all reports belonging to the same datapack
 class DatapackHistoryView(View):
+    @method_decorator(conditional_on(cache.REPORTS, cache.DATAPACKS))
     def get(self, request, datapack_name):
         template_name = "reports/dptracking/dphistory.html"
-        all_reports = Report.objects.all()
-        reports = []
-
-        for report in all_reports:
-            field_name = 'datapack'
-            field_value = getattr(report, field_name)
-            if str(field_value) == datapack_name.strip():
-                reports.append(report)
+        reports = ReportListing.objects.filter(datapack_name=datapack_name.strip()).order_by("report")
+        reports_table = cached_render(
+            request, "reports/dptracking/history_table.html", lambda: {"reports": reports},
+            "datapack_history", (cache.REPORTS, cache.DATAPACKS), datapack_name.strip(),
+        )
         return render(
             request, template_name, {
                 "dpname": datapack_name,
-                "reports": reports,
+                "reports_table": reports_table,
             }
         )
 
 
+@require_POST
 def filter_stats(request):
-  stats = []
-  reports = []
-  new_reports = []
-  comparison = []
-  # map choice label to actual statistic
-  choice_to_stat_map = {
-      "choice_0": "audio",
-      "choice_1": "audiotx",
-      "choice_2": "lag",
-      "choice_3": "rec",
-      "choice_4": "conf",
-      "choice_5": "avg_latency",
-      "choice_6": "95%_latency",
-      "choice_7": "avg_cpl",
-      "choice_8": "95%_cpl"
-  }
-
-  if request.method == 'POST':
-    selected_choices = request.POST.getlist('choice')
-    to_compare = request.POST.get('to_compare')
-
-    for choice in selected_choices:
-        stats.append(choice_to_stat_map[choice])
-
-    reports = to_compare[2:-2].split(",")
-    new_reports = []
-    for report in reports:
-        new_reports.append(report.replace("Report:", "").replace("<", "").replace(">", "").strip())
-    
-    # query the db for the reports with names in array new_reports
-    report_objects = []
-    for name in new_reports:
-        #report = Report.objects.get(name=name)
-        report = Report.objects.filter(name=name).first()
-        report_objects.append(report)
-    
-    to_compare = [report for report in report_objects]
-
-    comparison = compare_load_advanced(to_compare, False, False)
-
-    # filter the desired stats from the comparison dict above
-    selected_stats = set(stats)
-    for dlm_key in comparison["stats"]:
-        filtered_list = []
-        for stat_dict in comparison["stats"][dlm_key]:
-            filtered_dict = {}
-            for stat_key in stat_dict:
-                if stat_key in selected_stats:
-                    filtered_dict[stat_key] = stat_dict[stat_key]
-            filtered_list.append(filtered_dict)
-        comparison["stats"][dlm_key] = filtered_list
-        
-    # convert all dictionaries back to strings
-    for test_type in comparison["stats"]:
-            stat_strs = []
-            for stat in comparison["stats"][test_type]:
-                stat_strs.append(dict_to_str(stat))
-            comparison["stats"][test_type] = stat_strs
-        
-    for test_type in comparison["monitors"]:
-        monitors_strs = []
-        for monitors in comparison["monitors"][test_type]:
-            single_monitor_str = ""
-            for monitor in monitors:
-                single_monitor_str += dict_to_str(monitor)
-                single_monitor_str += "\n "
-            monitors_strs.append(single_monitor_str)
-        comparison["monitors"][test_type] = monitors_strs
-
-    for test_type in comparison["errors"]:
-        errs = []
-        for errArr in comparison["errors"][test_type]:
-            if len(errArr) == 0:
-                errs.append("No Errors")
-            else:
-                errJoined = ""
-                for errStr in errArr:
-                    errJoined += f"{errStr}\n"
-                errs.append(errJoined)
-        comparison["errors"][test_type] = errs
-
-  return render(request, 'reports/compare/compare_filtered.html', {
-      "comparison_result": comparison,
-      "to_compare": to_compare,
-  })
+    """
+    Filters the statistics of the comparison of load tests of the reports page:
+    POST reports (ids), choice (choice_<i> for the i-th statistic of LOAD_STATS)
+
+    The comparison is the one cached when the page was displayed: the files are not read again.
+    Returns the table only when requested by the script of the page.
+    """
+    try:
+        report_ids = [int(report_id) for report_id in get_list_param(request.POST, "reports")]
+        stats = [LOAD_STATS[int(choice.split("_")[1])] for choice in request.POST.getlist("choice")]
+    except (ValueError, IndexError):
+        return HttpResponse("Invalid reports or statistics", status=400)
+    reports = Report.objects.select_related("datapack", "testing_type").in_bulk(report_ids)
+    to_compare = [reports[report_id] for report_id in report_ids if report_id in reports]
+    if not to_compare or any(report.testing_type.name != "load_test" for report in to_compare):
+        return HttpResponse("Not a comparison of load tests", status=400)
+    try:
+        check_comparable(to_compare)
+    except ComparisonError as err:
+        return HttpResponse(str(err), status=err.status)
+
+    # only the desired stats
+    try:
+        comparison = compare_reports(to_compare, "load_test", stats)
+    except ComparisonError as err:
+        return retry_later(HttpResponse(str(err), status=err.status), err)
+    template_name = "reports/compare/compare_filtered.html"
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        template_name = "reports/compare/load_table.html"
+    return render(request, template_name, {
+        "comparison_result": comparison,
+        "to_compare": to_compare,
+    })
+
+
+@staff_member_required
+def profiling_view(request):
+    """
+    The slow requests sampled by the profiling middleware (see utils/profiling.py), for the admins
+    """
+    if request.method == "POST":
+        clear_slow_requests()
+        return redirect("profiling")
+    return render(request, "reports/profiling.html", {
+        "samples": slow_requests(),
+        "sample_rate": settings.PROFILING_SAMPLE_RATE,
+        "slow_ms": settings.PROFILING_SLOW_MS,
+    })
+
+
+@require_GET
+def metrics_view(request):
+    """
+    The metrics of all the processes of the server, in the Prometheus text format
+    """
+    if not metrics.is_allowed(request):
+        return HttpResponseForbidden("The metrics are only served to the staff and METRICS_ALLOWED_IPS")
+    return HttpResponse(metrics.render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -32,10 +32,9 @@ now=$(date +"%Y-%m-%d")
 
 docker exec qa-web-framework-db-1 mysqldump -uroot -proot reporting > ~/qa-web-framework-db-backup/"backup_db_$now.sql"
 
-docker exec qa-web-framework-db-1 mysqldump -uroot -proot reporting > /shared-drive/entrd_qa/LanguageQA/qa-web-framework-db_and_reports-backups/MySQL-db-backup/"backup_db_$now.sql"
-
-zip -r /shared-drive/entrd_qa/LanguageQA/qa-web-framework-db_and_reports-backups/uploaded-reports-backup/"uploaded_reports_$now.zip" /root/mnt/qa-web-framework/reports
+# incremental snapshot of the uploaded reports (only new files are copied) and compressed DB dump,
+# kept in $SHARED_DRIVE_REPORTS_BACKUP_DIR (mounted at /backups in the web container)
+# restore with: docker exec -w /code qa-web-framework-web-1 python Reporting/manage.py restore latest [--db]
+docker exec -w /code -e BUILD_TYPE=PROD -e BACKUP_ROOT=/backups qa-web-framework-web-1 python Reporting/manage.py backup --keep 5 || exit 1
 
 (cd ~/qa-web-framework-db-backup && ls -t | tail -n +6 | xargs -I {} rm -- {})
-(cd $SHARED_DRIVE_MYSQL_BACKUP_DIR && ls -t | tail -n +6 | xargs -I {} rm -- {})
-(cd $SHARED_DRIVE_REPORTS_BACKUP_DIR && ls -t | tail -n +6 | xargs -I {} rm -- {})